@@ -3,106 +3,36 @@ import sys
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD
-import rawpy
-import imageio
-from moviepy import VideoFileClip, AudioFileClip
 import subprocess
 import platform
-from threading import Thread
+import itertools
+import multiprocessing
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from media_converter import (IMAGE_EXTS, VIDEO_EXTS, AUDIO_EXTS, IMAGE_FORMATS, AUDIO_FORMATS,
+                             NO_AUDIO, BatchManifest, BatchStats, ConversionCache, ConversionResult, JobGroup,
+                             JobScheduler, configure_logging, configure_metrics, find_unfinished, job_result)
+from media_converter.common import output_conflicts, conflict_message
+from media_converter.manifest import new_manifest_path
+from media_converter.probe import DEFAULT_PROBE_WORKERS, ProbeIndex, describe_info, job_cost
+from media_converter.dedup import split_duplicates, replicate_result
+from media_converter.imageops import COLOR_SPACES, parse_ops
+from media_converter.renditions import parse_outputs
+from media_converter.audio import DEFAULT_LOUDNESS, resolve_audio_encode
+from media_converter.frames import DEFAULT_FRAME_COUNT, resolve_frames
+from media_converter.encoding import (VIDEO_CODECS, VIDEO_PROFILES, PROFILE_LABELS, SPEED_PRESETS,
+                                      DEFAULT_PROFILE, available_video_codecs, describe_estimate)
 
 # 日志配置
-logging.basicConfig(filename='media_converter.log', level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+configure_logging('media_converter.log')
+# 设置了环境变量 MEDIA_CONVERTER_METRICS 时同时导出 JSON lines 统计
+configure_metrics()
 
-# ------------------ 转换/操作函数 ------------------ #
-
-def convert_image(input_file_path, output_format='jpeg', output_dir=None):
-    """
-    将各类图片/RAW 文件转换为指定格式。
-    """
-    try:
-        filename = os.path.basename(input_file_path)
-        name_wo_ext, ext = os.path.splitext(filename)
-        # 判断是否是 RAW
-        if ext.lower() in ['.cr2', '.nef', '.arw', '.raw', '.raf', '.rw2', '.orf', '.dng']:
-            with rawpy.imread(input_file_path) as raw:
-                rgb = raw.postprocess()
-        else:
-            rgb = imageio.imread(input_file_path)
-
-        # 输出路径
-        output_path = (os.path.join(output_dir, f"{name_wo_ext}.{output_format}")
-                       if output_dir else f"{os.path.splitext(input_file_path)[0]}.{output_format}")
-        imageio.imsave(output_path, rgb)
-        logging.info(f"图片转换成功: {input_file_path} -> {output_path}")
-        return output_path
-    except Exception as e:
-        logging.error(f"图片转换失败: {input_file_path}, 错误: {e}")
-        messagebox.showerror("错误", f"图片转换失败：{e}")
-        return None
-
-def separate_audio_from_video(video_path, output_dir=None, export_only_audio=False,
-                              audio_format='mp3', video_format='mp4'):
-    """
-    使用 moviepy 分离音频。
-      - export_only_audio = True 则不输出“无声视频”。
-      - audio_format / video_format 分别指定音频和视频封装格式（如 mp3、wav，mp4、mov 等）
-    注意：如果要“保持原视频编码”，可以改用 ffmpeg 命令行完成拷贝模式(-c copy)。
-    """
-    try:
-        clip = VideoFileClip(video_path)
-        base_name = os.path.splitext(os.path.basename(video_path))[0]
-
-        audio_out = (os.path.join(output_dir, f"{base_name}_extracted_audio.{audio_format}")
-                     if output_dir else f"{os.path.splitext(video_path)[0]}_extracted_audio.{audio_format}")
-        video_out = (os.path.join(output_dir, f"{base_name}_no_audio.{video_format}")
-                     if output_dir else f"{os.path.splitext(video_path)[0]}_no_audio.{video_format}")
-
-        if clip.audio:
-            # 导出音频
-            if audio_format.lower() == 'wav':
-                clip.audio.write_audiofile(audio_out, codec="pcm_s16le")
-            else:
-                clip.audio.write_audiofile(audio_out, codec=audio_format.lower())
-
-        else:
-            audio_out = "无音频"
-
-        # 如仅要音频，则不输出无声视频
-        if not export_only_audio:
-            clip_no_audio = clip.without_audio()
-            clip_no_audio.write_videofile(video_out, codec="libx264", audio=False)
-            clip_no_audio.close()
-
-        clip.close()
-        logging.info(f"分离音频成功: {video_path} -> {audio_out}, {video_out}")
-        return video_out if not export_only_audio else None, audio_out
-    except Exception as e:
-        logging.error(f"分离音频失败: {video_path}, 错误: {e}")
-        messagebox.showerror("错误", f"分离音频失败：{e}")
-        return None, None
-
-def convert_audio_format(audio_path, output_format='mp3', output_dir=None):
-    """
-    使用 moviepy 对音频重新编码，例如转mp3、wav等。
-    """
-    try:
-        audio = AudioFileClip(audio_path)
-        name_wo_ext = os.path.splitext(os.path.basename(audio_path))[0]
-        output_file = (os.path.join(output_dir, f"{name_wo_ext}.{output_format}")
-                       if output_dir else f"{os.path.splitext(audio_path)[0]}.{output_format}")
-
-        # 根据目标格式，确定编码器
-        codec = 'pcm_s16le' if output_format.lower() == 'wav' else output_format.lower()
-        audio.write_audiofile(output_file, codec=codec)
-        audio.close()
-        logging.info(f"音频转换成功: {audio_path} -> {output_file}")
-        return output_file
-    except Exception as e:
-        logging.error(f"音频转换失败: {audio_path}, 错误: {e}")
-        messagebox.showerror("错误", f"音频转换失败：{e}")
-        return None
+# ------------------ 操作函数 ------------------ #
 
 def open_path(path, open_folder=False):
     """
@@ -128,6 +58,273 @@ def open_path(path, open_folder=False):
     except Exception as e:
         messagebox.showerror("错误", f"无法打开路径：{e}")
 
+# ------------------ 线程安全的界面更新通道 ------------------ #
+
+class UiChannel:
+    """
+    工作线程 -> Tk 主线程的事件通道。
+    工作线程只把事件放进队列（不直接操作控件），主线程用 after 定时取出：
+    同一轮内的结果一次性插入，进度条每轮只按最新值刷新一次，
+    因此界面开销与文件完成的速度无关。
+    """
+    def __init__(self, widget, interval_ms=100, budget_ms=50):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.budget = budget_ms / 1000
+        self._events = queue.SimpleQueue()
+        self._progress = {}
+        self._lock = threading.Lock()
+        self.widget.after(self.interval_ms, self._drain)
+
+    def call(self, fn, *args):
+        """在主线程中执行 fn(*args)（可在任意线程调用）。"""
+        self._events.put((fn, args))
+
+    def progress(self, bar, value):
+        """记录进度条的最新值，下一轮统一刷新（可在任意线程调用）。"""
+        with self._lock:
+            self._progress[bar] = value
+
+    def _drain(self):
+        deadline = time.monotonic() + self.budget
+        try:
+            # 每轮最多占用 budget_ms，剩余事件留到下一轮，保证界面能及时响应
+            while time.monotonic() < deadline:
+                try:
+                    fn, args = self._events.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    fn(*args)
+                except Exception as e:
+                    logging.error(f"界面更新出错: {e}")
+            with self._lock:
+                progress, self._progress = self._progress, {}
+            for bar, value in progress.items():
+                bar['value'] = value
+        finally:
+            try:
+                self.widget.after(self.interval_ms, self._drain)
+            except tk.TclError:
+                pass  # 窗口已关闭
+
+# ------------------ 文件表与虚拟列表 ------------------ #
+
+class FileList:
+    """
+    选项卡的文件表，文件列表和转换结果两个视图共用：
+      - paths: 按添加顺序保存的路径；states: 每行一个字节的状态（未转换 / 排队中 / 完成 / 失败）；
+      - info / results: 探测信息、转换结果，只为有内容的行保存（行号 -> 值）；
+      - 另用 dict 记录 规范化路径 -> 行号，判断是否已添加、查找行号都不需要遍历列表。
+    每次修改 version 加一，视图据此判断是否需要重新过滤。
+    """
+    PENDING, QUEUED, DONE, FAILED = range(4)
+
+    def __init__(self):
+        self.paths = []
+        self.states = bytearray()
+        self.info = {}       # 行号 -> 探测信息文字
+        self.unreadable = set()
+        self.results = {}    # 行号 -> (结果文字, 输出文件列表)
+        self.version = 0
+        self._index = {}
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def add(self, path):
+        """添加文件；已在列表中（包括同一文件的不同写法）时返回 False。"""
+        key = self._key(path)
+        if key in self._index:
+            return False
+        self._index[key] = len(self.paths)
+        self.paths.append(path)
+        self.states.append(self.PENDING)
+        self.version += 1
+        return True
+
+    def index(self, path):
+        """path 所在的行号，不在列表中时返回 None。"""
+        return self._index.get(self._key(path))
+
+    def set_info(self, row, text, unreadable=False):
+        self.info[row] = text
+        if unreadable:
+            self.unreadable.add(row)
+        self.version += 1
+
+    def start_batch(self):
+        """整个列表开始转换：全部标记为排队中，清空上一批的结果。"""
+        self.states[:] = bytes([self.QUEUED]) * len(self.paths)
+        self.results.clear()
+        self.version += 1
+
+    def set_result(self, row, ok, text, outputs=()):
+        self.states[row] = self.DONE if ok else self.FAILED
+        self.results[row] = (text, list(outputs))
+        self.version += 1
+
+    def rows_with(self, states):
+        """状态属于 states 的行号列表。"""
+        return [i for i, state in enumerate(self.states) if state in states]
+
+    def clear(self):
+        self.paths.clear()
+        self.states.clear()
+        self.info.clear()
+        self.unreadable.clear()
+        self.results.clear()
+        self._index.clear()
+        self.version += 1
+
+    def __contains__(self, path):
+        return self._key(path) in self._index
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        return iter(self.paths)
+
+
+# 结果列表的过滤条件 -> 显示哪些状态的文件
+RESULT_FILTERS = {
+    "全部": {FileList.QUEUED, FileList.DONE, FileList.FAILED},
+    "待处理": {FileList.QUEUED},
+    "失败": {FileList.FAILED},
+    "已完成": {FileList.DONE},
+}
+# 添加文件后每组探测的文件数（每组写一次探测索引、刷新一次列表）
+PROBE_CHUNK = 256
+# 音频选项卡的编码选项，第一项表示保持源文件的设置
+AUDIO_BITRATES = ["默认", "96k", "128k", "192k", "256k", "320k"]
+AUDIO_SAMPLE_RATES = ["保持", "22050", "44100", "48000"]
+AUDIO_CHANNELS = {"保持": None, "单声道": 1, "立体声": 2}
+# 视频选项卡的抽帧方式
+FRAME_MODE_LABELS = {"均匀抽取 N 帧": 'count', "每隔 N 秒一帧": 'interval', "只取关键帧（最多 N 帧）": 'keyframes'}
+# 一个结果的输出文件多于此数（如抽帧）时，“打开文件”只打开最后一个（抽帧时为联系表）
+MAX_OPEN_OUTPUTS = 4
+
+
+class VirtualTable(ttk.Frame):
+    """
+    虚拟列表：Treeview 中只保留当前可见的几十行，滚动时改写这些行的内容，数据全部在 FileList 中。
+    10 万行时添加、清空、滚动和刷新的开销都只与可见行数有关。
+      - columns: [(标题, 宽度)]；row_values(行号) -> 各列文字
+      - states: 只显示这些状态的行（过滤），None 表示显示全部
+    无法读取或转换失败的行显示为红色。
+    """
+    def __init__(self, parent, files, columns, row_values, states=None, height=5):
+        super().__init__(parent)
+        self.files = files
+        self.row_values = row_values
+        self.states = states
+        self.top = 0
+        self.visible = height
+        self.selected = None        # 选中的行号
+        self._rows = None           # 过滤后的行号
+        self._rows_version = None
+        self._shown = []            # Treeview 中各项对应的行号
+        self._scheduled = False
+        self.tree = ttk.Treeview(self, columns=[c for c, _w in columns], show='headings',
+                                 height=height, selectmode='browse')
+        for col, width in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width)
+        self.tree.tag_configure('error', foreground='red')
+        scrollbar = ttk.Scrollbar(self, orient='vertical', command=self._on_scroll)
+        scrollbar.pack(side='right', fill='y')
+        self.tree.pack(side='left', fill='both', expand=True)
+        self.scrollbar = scrollbar
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+
+    def set_states(self, states):
+        """更换过滤条件并回到顶部。"""
+        self.states = states
+        self._rows_version = None
+        self.top = 0
+        self.refresh()
+
+    def refresh(self):
+        """数据有变化：在空闲时重新绘制一次（多次调用只绘制一次）。"""
+        if not self._scheduled:
+            self._scheduled = True
+            self.after_idle(self._render)
+
+    def scroll(self, delta):
+        self.top += delta
+        self._render()
+
+    def _rows_shown(self):
+        if self.states is None:
+            return range(len(self.files))
+        if self._rows_version != self.files.version:
+            self._rows = self.files.rows_with(self.states)
+            self._rows_version = self.files.version
+        return self._rows
+
+    def _render(self):
+        self._scheduled = False
+        rows = self._rows_shown()
+        total = len(rows)
+        self.top = max(0, min(self.top, total - self.visible))
+        shown = rows[self.top:self.top + self.visible]
+        items = self.tree.get_children()
+        for iid in items[len(shown):]:
+            self.tree.delete(iid)
+        for k, row in enumerate(shown):
+            tags = ('error',) if row in self.files.unreadable or \
+                self.files.states[row] == FileList.FAILED else ()
+            if k < len(items):
+                self.tree.item(items[k], values=self.row_values(row), tags=tags)
+            else:
+                self.tree.insert('', 'end', values=self.row_values(row), tags=tags)
+        self._shown = list(shown)
+        items = self.tree.get_children()
+        keep = [iid for iid, row in zip(items, self._shown) if row == self.selected]
+        if tuple(keep) != self.tree.selection():
+            # 选中的行滚出可见范围时取消 Treeview 中的选择，但仍记住选中的行号
+            if keep:
+                self.tree.selection_set(keep[0])
+            else:
+                self.tree.selection_remove(self.tree.selection())
+        if total:
+            self.scrollbar.set(self.top / total, (self.top + len(shown)) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _on_scroll(self, action, amount, unit=None):
+        total = len(self._rows_shown())
+        if action == 'moveto':
+            self.top = int(float(amount) * total)
+        else:
+            self.top += int(amount) * (self.visible if unit == 'pages' else 1)
+        self._render()
+
+    def _on_resize(self, event):
+        # 按第一行的位置和高度换算可以显示的行数
+        items = self.tree.get_children()
+        bbox = self.tree.bbox(items[0]) if items else None
+        header, row_height = (bbox[1], bbox[3]) if bbox else (25, 20)
+        visible = max(1, (event.height - header) // max(1, row_height))
+        if visible != self.visible:
+            self.visible = visible
+            self.refresh()
+
+    def _on_select(self, event):
+        selection = self.tree.selection()
+        items = self.tree.get_children()
+        if selection and selection[0] in items:
+            i = items.index(selection[0])
+            if i < len(self._shown):
+                self.selected = self._shown[i]
+
+
 # ------------------ 主界面 ------------------ #
 
 class MediaConverterApp(TkinterDnD.Tk):
@@ -150,19 +347,53 @@ class MediaConverterApp(TkinterDnD.Tk):
         self.notebook.add(self.audio_tab, text='音频转换')
 
         # 用于存放不同分类的文件
-        self.image_files = []
-        self.video_files = []
-        self.audio_files = []
+        self.image_files = FileList()
+        self.video_files = FileList()
+        self.audio_files = FileList()
 
         # 输出目录（分别记录）
         self.image_specify_dir = ""
         self.video_specify_dir = ""
         self.audio_specify_dir = ""
 
+        # 转换缓存（三个选项卡共用，首次使用时再打开）
+        self.use_cache = tk.BooleanVar(value=True)
+        # 同一批中内容相同的文件只转换一次（三个选项卡共用）
+        self.use_dedup = tk.BooleanVar(value=True)
+        self._cache = None
+
+        # 添加文件时在后台只读文件头探测（时长、编码、分辨率等），结果显示在文件列表中
+        self._probe_index = None
+        self.probe_pool = ThreadPoolExecutor(DEFAULT_PROBE_WORKERS, thread_name_prefix='probe')
+
+        # 所有选项卡的任务都交给同一个调度器（CPU 通道 + I/O 通道），每个选项卡记录当前批次
+        self.scheduler = JobScheduler()
+        self.batches = {'image': None, 'video': None, 'audio': None}
+
+        # CPU 通道的并行任务数：调度器由三个选项卡共用，所以放在选项卡外面，修改后立即生效
+        cpu_bar = ttk.Frame(self)
+        cpu_bar.pack(fill='x', padx=10, pady=(10, 0), before=self.notebook)
+        ttk.Label(cpu_bar, text="CPU 并行任务数（所有选项卡共用）:").pack(side='left', padx=5)
+        self.cpu_workers = tk.IntVar(value=self.scheduler.limits['cpu'])
+        ttk.Spinbox(cpu_bar, from_=1, to=max(os.cpu_count() or 1, 1) * 2, width=5,
+                    textvariable=self.cpu_workers).pack(side='left', padx=5)
+        self.cpu_workers.trace('w', lambda *args: self.apply_cpu_workers())
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # 工作线程通过该通道更新界面
+        self.ui = UiChannel(self)
+
+        # 当前 ffmpeg 可用的视频编码（需要运行一次 ffmpeg 查询，在后台进行，不推迟窗口显示）
+        self.video_codecs = None
+
         # 创建三个选项卡的界面
         self.create_image_tab()
         self.create_video_tab()
         self.create_audio_tab()
+        threading.Thread(target=self.detect_video_codecs, daemon=True, name='codecs').start()
+
+        # 上次退出时还有未完成的批次，询问是否重新加入列表
+        self.after(500, self.offer_resume)
 
     # ------------------ 通用小工具函数 ------------------ #
     def toggle_dir_button(self, var, button):
@@ -184,38 +415,244 @@ class MediaConverterApp(TkinterDnD.Tk):
             elif tab_type == 'audio':
                 self.audio_specify_dir = directory
 
-    def add_files(self, filetypes, store_list, listbox):
+    def get_cache(self):
+        """勾选了“跳过已转换的文件”时返回共用的转换缓存，否则返回 None。"""
+        if not self.use_cache.get():
+            return None
+        if self._cache is None:
+            try:
+                self._cache = ConversionCache()
+            except Exception as e:
+                logging.warning(f"无法打开转换缓存: {e}")
+                return None
+        return self._cache
+
+    def apply_cpu_workers(self):
+        """按设置调整调度器 CPU 通道的并发上限（输入框内容不完整时忽略）。"""
+        try:
+            workers = int(self.cpu_workers.get())
+        except (tk.TclError, ValueError):
+            return
+        if workers > 0:
+            self.scheduler.set_limits(cpu_workers=workers)
+
+    def get_probe_index(self):
+        """共用的探测索引（首次使用时打开），无法打开时返回 None。"""
+        if self._probe_index is None:
+            try:
+                self._probe_index = ProbeIndex()
+            except Exception as e:
+                logging.warning(f"无法打开探测索引: {e}")
+                self._probe_index = False
+        return self._probe_index or None
+
+    def probe_info(self, path):
+        """path 的探测结果（只查索引，文件改动过或尚未探测完时返回 None）。"""
+        index = self.get_probe_index()
+        return index.lookup(path) if index else None
+
+    def on_close(self):
+        """关闭窗口时取消排队中的任务，不等待正在执行的任务。"""
+        self.probe_pool.shutdown(wait=False, cancel_futures=True)
+        self.scheduler.shutdown(wait=False, cancel_pending=True)
+        self.destroy()
+
+    def run_batch(self, tab, files, progress, submit, on_result, on_finish, output_dir=None):
+        """
+        把一批文件交给调度器：
+          - submit(文件, group, callback) 提交单个任务；
+          - on_result(result) 在每个文件完成时调用；
+          - on_finish(group) 在整批完成（或取消）后调用。
+        on_result / on_finish 都经由 UiChannel 在主线程中执行。
+        勾选了“相同内容只转换一次”时按内容找出重复文件，每组只提交第一个，
+        完成后把转换结果复制到其余文件的输出文件名（output_dir 为本选项卡的输出目录）。
+        写批次清单、去重、排序和提交都在后台线程中进行，文件很多时界面也不会卡住。
+        """
+        progress['maximum'] = len(files)
+        progress['value'] = 0
+        counter = itertools.count(1)
+        stats = BatchStats(tab)
+        dedup = self.use_dedup.get()
+        cache = self.get_cache()
+        copies = {}
+        manifest = None
+
+        def record(result):
+            stats.add(result)
+            if manifest:
+                manifest.record(result)
+            self.ui.call(on_result, result)
+            self.ui.progress(progress, next(counter))
+
+        def on_done(job):
+            result = job_result(job, tab)
+            record(result)
+            for d in copies.get(result.input_path, ()):
+                record(replicate_result(result, d, output_dir, 'copy'))
+
+        def on_group_done(group):
+            stats.report()
+            if manifest:
+                manifest.close()
+                # 全部成功时删除清单；有失败或取消时保留
+                if manifest.finished:
+                    os.remove(manifest.path)
+            self.ui.call(on_finish, group)
+
+        group = JobGroup(tab, on_done=on_group_done)
+        self.batches[tab] = group
+
+        def submit_all(todo):
+            nonlocal manifest
+            try:
+                # 输出文件名相同的文件（如 a.png、a.jpg 都输出 a.jpeg）只转换第一个，其余报告为失败
+                conflicts = output_conflicts(todo, output_dir)
+                for f, owner in conflicts.items():
+                    record(ConversionResult(f, tab, error=conflict_message(owner)))
+                todo = [f for f in todo if f not in conflicts]
+                # 批次清单：程序中途退出后，下次启动时可以把未完成的文件重新加入列表
+                try:
+                    manifest = BatchManifest.open(new_manifest_path(f'gui-{tab}'), {'gui_tab': tab},
+                                                  [(os.path.abspath(f), tab) for f in todo])
+                except OSError as e:
+                    logging.warning(f"无法创建批次清单: {e}")
+                if dedup:
+                    todo, found = split_duplicates(todo, cache)
+                    copies.update(found)
+                # 预计耗时长的文件先开始，避免最后只剩一个大文件在单独运行
+                todo = sorted(todo, key=lambda f: job_cost(self.probe_info(f)), reverse=True)
+                for f in todo:
+                    submit(f, group, on_done)
+            finally:
+                group.seal()
+
+        threading.Thread(target=submit_all, args=(files,), daemon=True, name=f"{tab}-submit").start()
+
+    def offer_resume(self):
+        """把上次未完成的界面批次中的文件重新加入对应选项卡的列表。"""
+        manifests = [m for m in find_unfinished() if m.options.get('gui_tab')]
+        if not manifests:
+            return
+        remaining = [(m.options['gui_tab'], p) for m in manifests for p, _k in m.remaining()
+                     if os.path.isfile(p)]
+        if remaining and messagebox.askyesno(
+                "未完成的批次", f"上次有 {len(remaining)} 个文件没有转换完成，是否重新加入文件列表？"):
+            lists = {'image': (self.image_files, self.image_listbox),
+                     'video': (self.video_files, self.video_listbox),
+                     'audio': (self.audio_files, self.audio_listbox)}
+            for tab, (files, view) in lists.items():
+                self.queue_files([p for t, p in remaining if t == tab], files, view)
+        # 文件已重新加入（或用户放弃），旧清单不再需要
+        for m in manifests:
+            try:
+                os.remove(m.path)
+            except OSError:
+                pass
+
+    def batch_running(self, tab):
+        """该选项卡上一批任务尚未结束时提示用户并返回 True。"""
+        batch = self.batches[tab]
+        if batch is not None and not batch.finished:
+            messagebox.showinfo("信息", "当前批次仍在处理中，可先点击“取消”。")
+            return True
+        return False
+
+    def cancel_batch(self, tab):
+        """取消某个选项卡排队中的任务（正在执行的任务会继续完成）。"""
+        batch = self.batches[tab]
+        if batch is not None and not batch.finished:
+            batch.cancel()
+
+    def queue_files(self, paths, files, view):
+        """
+        把文件加入列表，并在后台分组探测文件头，每组完成后在列表中显示时长、编码等信息。
+        """
+        added = [p for p in paths if files.add(p)]
+        if not added:
+            return
+        view.refresh()
+        index = self.get_probe_index()
+        if not index:
+            return
+        for start in range(0, len(added), PROBE_CHUNK):
+            chunk = added[start:start + PROBE_CHUNK]
+
+            def done(future):
+                if not future.cancelled() and future.exception() is None:
+                    self.ui.call(self.show_probe_info, future.result(), files, view)
+            # 每组只写一次索引，界面也只刷新一次
+            self.probe_pool.submit(index.probe_many, chunk, 1).add_done_callback(done)
+
+    def show_probe_info(self, infos, files, view):
+        """在文件列表中显示一组探测结果；无法读取的文件标红。"""
+        for path, info in infos.items():
+            row = files.index(path)
+            if row is not None:  # 列表可能已清空
+                files.set_info(row, describe_info(info), bool(info.get('error')))
+        view.refresh()
+
+    def add_files(self, filetypes, files, view):
         """通用的添加文件函数。"""
-        files = filedialog.askopenfilenames(title="选择文件", filetypes=filetypes)
-        for f in files:
-            if f not in store_list:
-                store_list.append(f)
-                listbox.insert(tk.END, f)
-
-    def drop_files(self, event, store_list, listbox, supported_exts):
-        """通用的拖放文件函数。"""
-        for f in self.split_filenames(event.data):
-            if os.path.isfile(f) and f not in store_list:
-                if os.path.splitext(f)[1].lower() in supported_exts:
-                    store_list.append(f)
-                    listbox.insert(tk.END, f)
-                else:
-                    messagebox.showwarning("警告", f"不支持的文件类型：{f}")
-
-    def clear_files(self, store_list, listbox):
-        store_list.clear()
-        listbox.delete(0, tk.END)
-
-    def open_selected_file(self, tree, is_folder=False):
-        """从 TreeView 里打开文件或所在文件夹。"""
-        sel = tree.selection()
-        if not sel:
+        self.queue_files(filedialog.askopenfilenames(title="选择文件", filetypes=filetypes), files, view)
+
+    def drop_files(self, event, files, view, supported_exts):
+        """通用的拖放文件函数（不支持的文件汇总成一次提示）。"""
+        paths = [f for f in self.split_filenames(event.data) if os.path.isfile(f)]
+        unsupported = [f for f in paths if os.path.splitext(f)[1].lower() not in supported_exts]
+        self.queue_files([f for f in paths if os.path.splitext(f)[1].lower() in supported_exts], files, view)
+        if unsupported:
+            shown = "\n".join(unsupported[:10]) + (f"\n等 {len(unsupported)} 个" if len(unsupported) > 10 else "")
+            messagebox.showwarning("警告", f"不支持的文件类型：\n{shown}")
+
+    def clear_files(self, files, view):
+        files.clear()
+        view.refresh()
+
+    def make_file_view(self, parent, files):
+        """文件列表：路径和探测信息。"""
+        return VirtualTable(parent, files, [("文件", 520), ("信息", 300)],
+                            lambda row: (files.paths[row], files.info.get(row, "")))
+
+    def make_result_view(self, parent, files):
+        """转换结果：只显示参与过转换的文件，可按 全部 / 待处理 / 失败 / 已完成 过滤。"""
+        bar = ttk.Frame(parent)
+        bar.pack(fill='x', padx=5, pady=(5, 0))
+        view = VirtualTable(parent, files, [("原文件", 420), ("输出文件", 400)],
+                            lambda row: (files.paths[row], files.results.get(row, ("等待中",))[0]),
+                            states=RESULT_FILTERS["全部"], height=8)
+        choice = tk.StringVar(value="全部")
+        ttk.Label(bar, text="显示:").pack(side='left')
+        cb = ttk.Combobox(bar, textvariable=choice, values=list(RESULT_FILTERS), state='readonly', width=8)
+        cb.pack(side='left', padx=5)
+        cb.bind('<<ComboboxSelected>>', lambda e: view.set_states(RESULT_FILTERS[choice.get()]))
+        view.pack(fill='both', expand=True, padx=5, pady=5)
+        return view
+
+    def show_result(self, view, result, text):
+        """把一个文件的转换结果写入文件表并刷新结果列表。"""
+        row = view.files.index(result.input_path)
+        if row is not None:
+            view.files.set_result(row, result.ok, text, result.outputs)
+            view.refresh()
+
+    def start_results(self, view):
+        """新一批开始：整个文件表标记为排队中，结果列表回到顶部。"""
+        view.files.start_batch()
+        view.set_states(view.states)
+
+    def open_selected_file(self, view, is_folder=False):
+        """从结果列表里打开文件或所在文件夹。"""
+        if view.selected is None or view.selected not in view.files.results:
             messagebox.showinfo("信息", "请选择一个转换结果。")
             return
-        item = tree.item(sel[0])  # 只处理第一个被选中的
-        outputs = str(item['values'][1]).split('\n')
+        outputs = view.files.results[view.selected][1] or [NO_AUDIO]
+        if is_folder:
+            # 多个输出在同一目录时只打开一次
+            outputs = list({os.path.dirname(os.path.abspath(p)): p for p in outputs}.values())
+        elif len(outputs) > MAX_OPEN_OUTPUTS:
+            outputs = outputs[-1:]
         for out in outputs:
-            if out != "无音频" and os.path.exists(out):
+            if out != NO_AUDIO and os.path.exists(out):
                 open_path(out, open_folder=is_folder)
             else:
                 messagebox.showwarning("警告", f"输出文件不存在或无效：{out}")
@@ -228,11 +665,8 @@ class MediaConverterApp(TkinterDnD.Tk):
         # 1) 文件选择
         file_frame = ttk.LabelFrame(frame, text="选择图片文件")
         file_frame.pack(fill='x', pady=5)
-        self.image_listbox = tk.Listbox(file_frame, selectmode=tk.MULTIPLE, height=5)
-        self.image_listbox.pack(side='left', fill='both', expand=True, padx=(5, 0), pady=5)
-        scrollbar = ttk.Scrollbar(file_frame, orient="vertical", command=self.image_listbox.yview)
-        scrollbar.pack(side='right', fill='y')
-        self.image_listbox.config(yscrollcommand=scrollbar.set)
+        self.image_listbox = self.make_file_view(file_frame, self.image_files)
+        self.image_listbox.pack(fill='both', expand=True, padx=5, pady=5)
 
         btns_frame = ttk.Frame(frame)
         btns_frame.pack(fill='x', pady=5)
@@ -248,11 +682,9 @@ class MediaConverterApp(TkinterDnD.Tk):
                    ).pack(side='left', padx=5)
 
         # 拖放
-        self.image_listbox.drop_target_register(DND_FILES)
-        self.image_listbox.dnd_bind('<<Drop>>',
-            lambda e: self.drop_files(e, self.image_files, self.image_listbox,
-                                      ['.cr2','.nef','.arw','.raw','.raf','.rw2','.orf','.dng',
-                                       '.jpeg','.jpg','.png','.tiff','.bmp','.gif','.webp']))
+        self.image_listbox.tree.drop_target_register(DND_FILES)
+        self.image_listbox.tree.dnd_bind('<<Drop>>',
+            lambda e: self.drop_files(e, self.image_files, self.image_listbox, IMAGE_EXTS))
 
         # 2) 输出格式
         fmt_frame = ttk.LabelFrame(frame, text="输出格式")
@@ -260,10 +692,47 @@ class MediaConverterApp(TkinterDnD.Tk):
         self.output_format = tk.StringVar(value="jpeg")
         ttk.Label(fmt_frame, text="选择格式:").pack(side='left', padx=5)
         self.format_combobox = ttk.Combobox(fmt_frame, textvariable=self.output_format, state='readonly',
-                                            values=("jpeg", "png", "tiff", "bmp", "gif", "webp"))
+                                            values=IMAGE_FORMATS)
         self.format_combobox.pack(side='left', padx=5)
         self.format_combobox.current(0)
 
+        # 质量与尺寸：快速预览模式下 RAW 优先使用内嵌缩略图
+        quality_frame = ttk.LabelFrame(frame, text="质量与尺寸")
+        quality_frame.pack(fill='x', pady=5)
+        self.image_quality = tk.StringVar(value="full")
+        for val, txt in [("full", "完整解码"), ("proxy", "快速预览（RAW 使用内嵌缩略图）")]:
+            ttk.Radiobutton(quality_frame, text=txt, variable=self.image_quality, value=val).pack(side='left', padx=5)
+        ttk.Label(quality_frame, text="长边像素（留空为原尺寸）:").pack(side='left', padx=5)
+        self.image_max_size = tk.StringVar(value="")
+        ttk.Entry(quality_frame, textvariable=self.image_max_size, width=8).pack(side='left', padx=5)
+        ttk.Label(quality_frame, text="单任务内存上限(MB):").pack(side='left', padx=5)
+        self.image_memory_limit = tk.StringVar(value="")
+        ttk.Entry(quality_frame, textvariable=self.image_memory_limit, width=8).pack(side='left', padx=5)
+
+        # 同一次解码额外写出的输出（如不同格式、缩略图）
+        extra_frame = ttk.Frame(frame)
+        extra_frame.pack(fill='x', pady=5)
+        ttk.Label(extra_frame, text="同时输出（用 ; 分隔，格式[:长边][:q质量][:后缀]）:").pack(side='left', padx=5)
+        self.image_extra_outputs = tk.StringVar(value="")
+        ttk.Entry(extra_frame, textvariable=self.image_extra_outputs, width=36).pack(side='left', padx=5)
+        ttk.Label(extra_frame, text="如 webp:1600:q80; png:256:_thumb", foreground='gray').pack(side='left', padx=5)
+
+        # 转换时一并完成的处理，不需要再用其他工具处理一遍输出
+        ops_frame = ttk.LabelFrame(frame, text="图片处理（转换时一并完成）")
+        ops_frame.pack(fill='x', pady=5)
+        ttk.Label(ops_frame, text="裁剪 左,上,宽,高:").pack(side='left', padx=5)
+        self.image_crop = tk.StringVar(value="")
+        ttk.Entry(ops_frame, textvariable=self.image_crop, width=16).pack(side='left', padx=5)
+        ttk.Label(ops_frame, text="源色彩空间转 sRGB:").pack(side='left', padx=5)
+        self.image_color_space = tk.StringVar(value="不转换")
+        ttk.Combobox(ops_frame, textvariable=self.image_color_space, state='readonly', width=10,
+                     values=["不转换", *COLOR_SPACES]).pack(side='left', padx=5)
+        self.image_to_8bit = tk.BooleanVar(value=False)
+        ttk.Checkbutton(ops_frame, text="转为 8 位", variable=self.image_to_8bit).pack(side='left', padx=5)
+        self.image_strip_alpha = tk.BooleanVar(value=False)
+        ttk.Checkbutton(ops_frame, text="去除透明通道（白底）",
+                        variable=self.image_strip_alpha).pack(side='left', padx=5)
+
         # 3) 输出目录
         out_dir_frame = ttk.LabelFrame(frame, text="输出目录")
         out_dir_frame.pack(fill='x', pady=5)
@@ -272,22 +741,24 @@ class MediaConverterApp(TkinterDnD.Tk):
             ttk.Radiobutton(out_dir_frame, text=txt, variable=self.image_output_dir_option, value=val).pack(side='left', padx=5)
         btn_dir = ttk.Button(out_dir_frame, text="选择目录", command=lambda: self.choose_output_dir('image'))
         btn_dir.pack(side='left', padx=5)
+        ttk.Checkbutton(out_dir_frame, text="跳过已转换的文件", variable=self.use_cache).pack(side='left', padx=5)
+        ttk.Checkbutton(out_dir_frame, text="相同内容只转换一次", variable=self.use_dedup).pack(side='left', padx=5)
         btn_dir.config(state='disabled')
         self.image_output_dir_option.trace('w',
             lambda *args: self.toggle_dir_button(self.image_output_dir_option, btn_dir))
 
         # 4) 转换 & 进度
-        ttk.Button(frame, text="开始转换", command=self.start_convert_images).pack(pady=10)
+        run_btns = ttk.Frame(frame)
+        run_btns.pack(pady=10)
+        ttk.Button(run_btns, text="开始转换", command=self.start_convert_images).pack(side='left', padx=5)
+        ttk.Button(run_btns, text="取消", command=lambda: self.cancel_batch('image')).pack(side='left', padx=5)
         self.image_progress = ttk.Progressbar(frame, orient='horizontal', mode='determinate')
         self.image_progress.pack(fill='x', padx=5, pady=5)
 
         # 5) 结果列表
         result_frame = ttk.LabelFrame(frame, text="转换结果")
         result_frame.pack(fill='both', expand=True, pady=5)
-        self.image_results = ttk.Treeview(result_frame, columns=("原文件", "输出文件"), show='headings')
-        for col in ("原文件", "输出文件"):
-            self.image_results.heading(col, text=col)
-        self.image_results.pack(fill='both', expand=True, padx=5, pady=5)
+        self.image_results = self.make_result_view(result_frame, self.image_files)
 
         # 6) 打开文件/文件夹
         open_btns = ttk.Frame(frame)
@@ -303,24 +774,70 @@ class MediaConverterApp(TkinterDnD.Tk):
         if not self.image_files:
             messagebox.showinfo("信息", "请先添加图片文件。")
             return
-        for i in self.image_results.get_children():
-            self.image_results.delete(i)
-        Thread(target=self.convert_images_thread, daemon=True).start()
+        if self.batch_running('image'):
+            return
+        self.start_results(self.image_results)
 
-    def convert_images_thread(self):
-        total = len(self.image_files)
-        self.image_progress['maximum'] = total
         out_fmt = self.output_format.get()
         out_dir = self.image_specify_dir if self.image_output_dir_option.get() == "specify" else None
+        max_size = self.image_max_size.get().strip()
+        max_size = int(max_size) if max_size.isdigit() and int(max_size) > 0 else None
+        memory_limit = self.image_memory_limit.get().strip()
+        memory_limit = int(memory_limit) << 20 if memory_limit.isdigit() and int(memory_limit) > 0 else None
+        quality = self.image_quality.get()
+        ops = []
+        if self.image_crop.get().strip():
+            ops.append(f"crop={self.image_crop.get().strip()}")
+        if self.image_color_space.get() in COLOR_SPACES:
+            ops.append(f"srgb={self.image_color_space.get()}")
+        if self.image_to_8bit.get():
+            ops.append("8bit")
+        if self.image_strip_alpha.get():
+            ops.append("strip_alpha")
+        outputs = None
+        extra = self.image_extra_outputs.get().strip()
+        try:
+            parse_ops(ops)
+            if extra:
+                # 选择的格式和长边作为第一份输出，其余的由同一次解码写出
+                outputs = parse_outputs([{'format': out_fmt, 'max_size': max_size, 'suffix': ''},
+                                         *extra.split(';')])
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        cache = self.get_cache()
+
+        failed = []
 
-        for idx, f in enumerate(self.image_files, start=1):
-            res = convert_image(f, out_fmt, out_dir)
-            if res:
-                self.image_results.insert("", "end", values=(f, res))
-            self.image_progress['value'] = idx
-            self.update_idletasks()
+        def submit(f, group, callback):
+            self.scheduler.submit_image(f, out_fmt, out_dir, cache=cache, group=group, callback=callback,
+                                        info=self.probe_info(f), quality=quality, max_size=max_size, memory_limit=memory_limit,
+                                        ops=ops, outputs=outputs)
 
-        messagebox.showinfo("完成", "图片转换完成。")
+        def on_result(r):
+            if r.ok:
+                self.show_result(self.image_results, r, "; ".join(r.outputs))
+            else:
+                failed.append(r.input_path)
+                self.show_result(self.image_results, r, f"出错：{r.error}")
+
+        def on_finish(group):
+            self.show_batch_summary("图片转换完成", group, failed)
+
+        self.run_batch('image', list(self.image_files), self.image_progress, submit, on_result, on_finish,
+                       output_dir=out_dir)
+
+    def show_batch_summary(self, title, group, failed):
+        """整批结束后的提示：列出失败与取消的数量。"""
+        notes = []
+        if failed:
+            notes.append(f"{len(failed)} 个文件失败，详见结果列表")
+        if group.cancelled:
+            notes.append(f"{group.cancelled} 个文件已取消")
+        if notes:
+            messagebox.showwarning("完成", f"{title}，其中" + "，".join(notes) + "。")
+        else:
+            messagebox.showinfo("完成", f"{title}。")
 
     # ------------------ 视频选项卡 ------------------ #
     def create_video_tab(self):
@@ -330,11 +847,8 @@ class MediaConverterApp(TkinterDnD.Tk):
         # 1) 文件选择
         file_frame = ttk.LabelFrame(frame, text="选择视频文件")
         file_frame.pack(fill='x', pady=5)
-        self.video_listbox = tk.Listbox(file_frame, selectmode=tk.MULTIPLE, height=5)
-        self.video_listbox.pack(side='left', fill='both', expand=True, padx=(5,0), pady=5)
-        scrollbar = ttk.Scrollbar(file_frame, orient="vertical", command=self.video_listbox.yview)
-        scrollbar.pack(side='right', fill='y')
-        self.video_listbox.config(yscrollcommand=scrollbar.set)
+        self.video_listbox = self.make_file_view(file_frame, self.video_files)
+        self.video_listbox.pack(fill='both', expand=True, padx=5, pady=5)
 
         btns_frame = ttk.Frame(frame)
         btns_frame.pack(fill='x', pady=5)
@@ -349,10 +863,9 @@ class MediaConverterApp(TkinterDnD.Tk):
                    command=lambda: self.clear_files(self.video_files, self.video_listbox)
                    ).pack(side='left', padx=5)
 
-        self.video_listbox.drop_target_register(DND_FILES)
-        self.video_listbox.dnd_bind('<<Drop>>',
-            lambda e: self.drop_files(e, self.video_files, self.video_listbox,
-                                      ['.mp4','.mov','.avi','.mkv','.flv','.wmv']))
+        self.video_listbox.tree.drop_target_register(DND_FILES)
+        self.video_listbox.tree.dnd_bind('<<Drop>>',
+            lambda e: self.drop_files(e, self.video_files, self.video_listbox, VIDEO_EXTS))
 
         # 2) 输出目录
         out_dir_frame = ttk.LabelFrame(frame, text="输出目录")
@@ -362,6 +875,8 @@ class MediaConverterApp(TkinterDnD.Tk):
             ttk.Radiobutton(out_dir_frame, text=txt, variable=self.video_output_dir_option, value=val).pack(side='left', padx=5)
         btn_dir = ttk.Button(out_dir_frame, text="选择目录", command=lambda: self.choose_output_dir('video'))
         btn_dir.pack(side='left', padx=5)
+        ttk.Checkbutton(out_dir_frame, text="跳过已转换的文件", variable=self.use_cache).pack(side='left', padx=5)
+        ttk.Checkbutton(out_dir_frame, text="相同内容只转换一次", variable=self.use_dedup).pack(side='left', padx=5)
         btn_dir.config(state='disabled')
         self.video_output_dir_option.trace('w',
             lambda *args: self.toggle_dir_button(self.video_output_dir_option, btn_dir))
@@ -377,10 +892,68 @@ class MediaConverterApp(TkinterDnD.Tk):
         self.video_audio_format = tk.StringVar(value="mp3")
         ttk.Label(audio_fmt_frame, text="音频格式:").pack(side='left', padx=5)
         cb_audio = ttk.Combobox(audio_fmt_frame, textvariable=self.video_audio_format,
-                                values=["mp3","wav","aac","flac","ogg","m4a"], state='readonly')
+                                values=AUDIO_FORMATS, state='readonly')
         cb_audio.pack(side='left', padx=5)
         cb_audio.current(0)
 
+        # 无声视频需要重新编码时（不能流拷贝）使用的编码参数
+        encode_frame = ttk.LabelFrame(frame, text="视频编码（需要重新编码时）")
+        encode_frame.pack(fill='x', pady=5)
+        self.video_profile = tk.StringVar(value=PROFILE_LABELS[DEFAULT_PROFILE])
+        self.video_codec = tk.StringVar()
+        self.video_preset = tk.StringVar()
+        self.video_crf = tk.StringVar()
+        self.video_bitrate = tk.StringVar()
+        self.video_threads = tk.IntVar(value=0)
+        row1 = ttk.Frame(encode_frame)
+        row1.pack(fill='x')
+        ttk.Label(row1, text="编码组合:").pack(side='left', padx=5)
+        ttk.Combobox(row1, textvariable=self.video_profile, values=list(PROFILE_LABELS.values()),
+                     state='readonly', width=28).pack(side='left', padx=5)
+        ttk.Label(row1, text="编码:").pack(side='left', padx=5)
+        self.video_codec_box = ttk.Combobox(row1, textvariable=self.video_codec, values=list(VIDEO_CODECS),
+                                            state='readonly', width=6)
+        self.video_codec_box.pack(side='left', padx=5)
+        ttk.Label(row1, text="速度预设:").pack(side='left', padx=5)
+        ttk.Combobox(row1, textvariable=self.video_preset, values=list(SPEED_PRESETS),
+                     state='readonly', width=10).pack(side='left', padx=5)
+        row2 = ttk.Frame(encode_frame)
+        row2.pack(fill='x')
+        ttk.Label(row2, text="CRF:").pack(side='left', padx=5)
+        ttk.Entry(row2, textvariable=self.video_crf, width=5).pack(side='left', padx=5)
+        ttk.Label(row2, text="或目标码率(如 4M):").pack(side='left', padx=5)
+        ttk.Entry(row2, textvariable=self.video_bitrate, width=8).pack(side='left', padx=5)
+        ttk.Label(row2, text="线程数(0 自动):").pack(side='left', padx=5)
+        ttk.Spinbox(row2, from_=0, to=64, textvariable=self.video_threads, width=5).pack(side='left', padx=5)
+        self.video_segmented = tk.BooleanVar(value=False)
+        ttk.Checkbutton(row2, text="长视频分段并行编码", variable=self.video_segmented).pack(side='left', padx=5)
+        self.video_estimate = tk.StringVar()
+        ttk.Label(encode_frame, textvariable=self.video_estimate, foreground='gray').pack(anchor='w', padx=5)
+        self.apply_video_profile()
+        self.video_profile.trace('w', lambda *args: self.apply_video_profile())
+        for var in (self.video_codec, self.video_preset, self.video_crf, self.video_bitrate):
+            var.trace('w', lambda *args: self.update_encode_estimate())
+
+        # 抽帧：勾选后代替分离音频，按时间点定位解码，不解码整段视频
+        frames_frame = ttk.LabelFrame(frame, text="抽帧（生成缩略图 / 联系表）")
+        frames_frame.pack(fill='x', pady=5)
+        self.frames_enabled = tk.BooleanVar(value=False)
+        self.frames_mode = tk.StringVar(value=next(iter(FRAME_MODE_LABELS)))
+        self.frames_value = tk.StringVar(value=str(DEFAULT_FRAME_COUNT))
+        self.frames_format = tk.StringVar(value=IMAGE_FORMATS[0])
+        self.frames_size = tk.StringVar(value="320")
+        self.frames_sheet = tk.BooleanVar(value=True)
+        ttk.Checkbutton(frames_frame, text="抽帧代替分离音频", variable=self.frames_enabled).pack(side='left', padx=5)
+        ttk.Combobox(frames_frame, textvariable=self.frames_mode, values=list(FRAME_MODE_LABELS),
+                     state='readonly', width=20).pack(side='left', padx=5)
+        ttk.Label(frames_frame, text="N:").pack(side='left')
+        ttk.Entry(frames_frame, textvariable=self.frames_value, width=6).pack(side='left', padx=5)
+        ttk.Combobox(frames_frame, textvariable=self.frames_format, values=IMAGE_FORMATS,
+                     state='readonly', width=6).pack(side='left', padx=5)
+        ttk.Label(frames_frame, text="长边(空为原尺寸):").pack(side='left')
+        ttk.Entry(frames_frame, textvariable=self.frames_size, width=6).pack(side='left', padx=5)
+        ttk.Checkbutton(frames_frame, text="联系表", variable=self.frames_sheet).pack(side='left', padx=5)
+
         # ★ 如果不需要改视频格式，可以把下面这些删除或注释。
         # 这里先演示“保留原视频扩展名”做无声视频输出。
         """
@@ -395,17 +968,17 @@ class MediaConverterApp(TkinterDnD.Tk):
         """
 
         # 4) 转换按钮 & 进度
-        ttk.Button(frame, text="开始转换", command=self.start_convert_videos).pack(pady=10)
+        run_btns = ttk.Frame(frame)
+        run_btns.pack(pady=10)
+        ttk.Button(run_btns, text="开始转换", command=self.start_convert_videos).pack(side='left', padx=5)
+        ttk.Button(run_btns, text="取消", command=lambda: self.cancel_batch('video')).pack(side='left', padx=5)
         self.video_progress = ttk.Progressbar(frame, orient='horizontal', mode='determinate')
         self.video_progress.pack(fill='x', padx=5, pady=5)
 
         # 5) 结果
         result_frame = ttk.LabelFrame(frame, text="转换结果")
         result_frame.pack(fill='both', expand=True, pady=5)
-        self.video_results = ttk.Treeview(result_frame, columns=("原文件", "输出文件"), show='headings')
-        for col in ("原文件", "输出文件"):
-            self.video_results.heading(col, text=col)
-        self.video_results.pack(fill='both', expand=True, padx=5, pady=5)
+        self.video_results = self.make_result_view(result_frame, self.video_files)
 
         open_btns = ttk.Frame(frame)
         open_btns.pack(pady=5)
@@ -416,68 +989,121 @@ class MediaConverterApp(TkinterDnD.Tk):
                    command=lambda: self.open_selected_file(self.video_results, is_folder=True)
                    ).pack(side='left', padx=5)
 
+    def apply_video_profile(self):
+        """选择编码组合后，把组合中的编码、速度预设和 CRF 填到各个选项上。"""
+        profile = next(k for k, v in PROFILE_LABELS.items() if v == self.video_profile.get())
+        settings = VIDEO_PROFILES[profile]
+        self.video_codec.set(settings['codec'])
+        self.video_preset.set(settings['preset'])
+        self.video_crf.set(str(settings['crf']))
+        self.video_bitrate.set("")
+        self.update_encode_estimate()
+
+    def get_video_encode(self):
+        """界面上的视频编码参数（dict，见 media_converter.encoding）。"""
+        crf = self.video_crf.get().strip()
+        try:
+            threads = max(0, int(self.video_threads.get()))
+        except (tk.TclError, ValueError):
+            threads = 0
+        return {'codec': self.video_codec.get(), 'preset': self.video_preset.get(),
+                'crf': int(crf) if crf.isdigit() else None,
+                'bitrate': self.video_bitrate.get().strip() or None, 'threads': threads}
+
+    def detect_video_codecs(self):
+        """后台线程：查询 ffmpeg 可用的视频编码，完成后更新视频选项卡。"""
+        codecs = available_video_codecs()
+        self.ui.call(self.show_video_codecs, codecs)
+
+    def show_video_codecs(self, codecs):
+        self.video_codecs = codecs
+        self.video_codec_box.config(values=codecs)
+        self.update_encode_estimate()
+
+    def update_encode_estimate(self):
+        if self.video_codecs is None:
+            # 估计值依赖可用的编码器，查询完成前不在主线程中运行 ffmpeg
+            self.video_estimate.set("正在检测可用的视频编码…")
+            return
+        try:
+            self.video_estimate.set(describe_estimate(self.get_video_encode()))
+        except ValueError as e:
+            self.video_estimate.set(str(e))
+
+    def get_video_frames(self):
+        """界面上的抽帧参数 (frames, output)，见 extract_video_frames；不合法时抛出 ValueError。"""
+        value = self.frames_value.get().strip()
+        frames = resolve_frames({'mode': FRAME_MODE_LABELS[self.frames_mode.get()],
+                                 'value': None if value in ('', '0') else value,
+                                 'sheet': 0 if self.frames_sheet.get() else None})
+        size = self.frames_size.get().strip()
+        if size and not size.isdigit():
+            raise ValueError(f"长边像素应为整数: {size}")
+        output = {'format': self.frames_format.get(), 'max_size': int(size) if size else None}
+        parse_outputs([output])
+        return frames, output
+
     def start_convert_videos(self):
         """开始转换（或提取）音频"""
         if not self.video_files:
             messagebox.showinfo("信息", "请先添加视频文件。")
             return
+        if self.batch_running('video'):
+            return
+        frames = output = None
+        if self.frames_enabled.get():
+            try:
+                frames, output = self.get_video_frames()
+            except ValueError as e:
+                messagebox.showerror("错误", str(e))
+                return
         # 清空旧结果
-        for i in self.video_results.get_children():
-            self.video_results.delete(i)
-        Thread(target=self.convert_videos_thread, daemon=True).start()
+        self.start_results(self.video_results)
 
-    def convert_videos_thread(self):
-        total = len(self.video_files)
-        self.video_progress['maximum'] = total
         out_dir = self.video_specify_dir if self.video_output_dir_option.get() == "specify" else None
-
         audio_fmt = self.video_audio_format.get()   # 用户在下拉框里选的音频格式
         only_audio = self.audio_only_var.get()
+        cache = self.get_cache()
+        video_encode = self.get_video_encode()
+        # 分段时使用全部 CPU 核心
+        segment_workers = 0 if self.video_segmented.get() else None
+
+        failed = []
+
+        def submit(f, group, callback):
+            if frames:
+                self.scheduler.submit_frames(f, out_dir, frames, output, cache=cache, group=group,
+                                             callback=callback, info=self.probe_info(f))
+                return
+            # 音频直接一次写成目标格式（源编码兼容时流拷贝），不再经过中间 wav；
+            # 无声视频保留原视频后缀。只需流拷贝的任务由调度器放到 I/O 通道
+            self.scheduler.submit_video(f, out_dir, audio_only=only_audio, audio_format=audio_fmt,
+                                        cache=cache, group=group, callback=callback,
+                                        video_encode=video_encode, segment_workers=segment_workers,
+                                        info=self.probe_info(f))
+
+        def on_result(r):
+            # 将结果插入 Treeview
+            f = r.input_path
+            if not r.ok:
+                failed.append(f)
+                self.show_result(self.video_results, r, f"出错：{r.error}")
+            elif frames:
+                sheet = "（含联系表）" if frames['sheet'] is not None else ""
+                self.show_result(self.video_results, r, f"{len(r.outputs)} 个文件{sheet}：{r.outputs[0]} …")
+            elif r.outputs:
+                self.show_result(self.video_results, r, "; ".join(r.outputs))
+            elif only_audio:
+                # 仅要音频
+                self.show_result(self.video_results, r, "无音频轨")
+            else:
+                self.show_result(self.video_results, r, "无音频且无输出文件")
 
-        for idx, f in enumerate(self.video_files, start=1):
-            try:
-                # 先提取音频：这里为了更灵活，统一先提取成 wav，再用 convert_audio_format() 转目标格式
-                original_ext = os.path.splitext(f)[1]  # e.g. ".mp4"
-                v_out, a_out = separate_audio_from_video(
-                    video_path       = f,
-                    output_dir       = out_dir,
-                    export_only_audio= only_audio,
-                    audio_format     = "wav",   # 先提取成 wav
-                    video_format     = original_ext.lstrip('.')  # 保留原视频后缀
-                )
-
-                # 如果分离出了音频，且不是“无音频”，再调用音频转换函数
-                final_audio_path = None
-                if a_out and a_out != "无音频":
-                    final_audio_path = convert_audio_format(a_out, output_format=audio_fmt, output_dir=out_dir)
-
-                # 将结果插入 Treeview
-                if only_audio:
-                    # 仅要音频
-                    if final_audio_path:
-                        self.video_results.insert("", "end", values=(f, final_audio_path))
-                    else:
-                        self.video_results.insert("", "end", values=(f, "无音频轨"))
-                else:
-                    # 分离音频 + 无声视频
-                    if v_out and final_audio_path:
-                        self.video_results.insert("", "end",
-                                                  values=(f, f"{v_out}\n{final_audio_path}"))
-                    elif v_out:
-                        self.video_results.insert("", "end", values=(f, v_out))
-                    elif final_audio_path:
-                        self.video_results.insert("", "end", values=(f, final_audio_path))
-                    else:
-                        self.video_results.insert("", "end", values=(f, "无音频且无输出文件"))
-
-            except Exception as e:
-                logging.error(f"处理视频出错: {f}, 错误: {e}")
-                self.video_results.insert("", "end", values=(f, f"出错：{e}"))
-
-            self.video_progress['value'] = idx
-            self.update_idletasks()
+        def on_finish(group):
+            self.show_batch_summary("视频处理完成", group, failed)
 
-        messagebox.showinfo("完成", "视频处理完成。")
+        self.run_batch('video', list(self.video_files), self.video_progress, submit, on_result, on_finish,
+                       output_dir=out_dir)
 
     # ------------------ 音频选项卡 ------------------ #
     def create_audio_tab(self):
@@ -486,11 +1112,8 @@ class MediaConverterApp(TkinterDnD.Tk):
 
         file_frame = ttk.LabelFrame(frame, text="选择音频文件")
         file_frame.pack(fill='x', pady=5)
-        self.audio_listbox = tk.Listbox(file_frame, selectmode=tk.MULTIPLE, height=5)
-        self.audio_listbox.pack(side='left', fill='both', expand=True, padx=(5, 0), pady=5)
-        scrollbar = ttk.Scrollbar(file_frame, orient="vertical", command=self.audio_listbox.yview)
-        scrollbar.pack(side='right', fill='y')
-        self.audio_listbox.config(yscrollcommand=scrollbar.set)
+        self.audio_listbox = self.make_file_view(file_frame, self.audio_files)
+        self.audio_listbox.pack(fill='both', expand=True, padx=5, pady=5)
 
         btns_frame = ttk.Frame(frame)
         btns_frame.pack(fill='x', pady=5)
@@ -505,20 +1128,39 @@ class MediaConverterApp(TkinterDnD.Tk):
                    command=lambda: self.clear_files(self.audio_files, self.audio_listbox)
                    ).pack(side='left', padx=5)
 
-        self.audio_listbox.drop_target_register(DND_FILES)
-        self.audio_listbox.dnd_bind('<<Drop>>',
-            lambda e: self.drop_files(e, self.audio_files, self.audio_listbox,
-                                      ['.mp3','.wav','.aac','.flac','.ogg','.m4a']))
+        self.audio_listbox.tree.drop_target_register(DND_FILES)
+        self.audio_listbox.tree.dnd_bind('<<Drop>>',
+            lambda e: self.drop_files(e, self.audio_files, self.audio_listbox, AUDIO_EXTS))
 
         fmt_frame = ttk.LabelFrame(frame, text="输出格式")
         fmt_frame.pack(fill='x', pady=5)
         self.audio_output_format = tk.StringVar(value="mp3")
         ttk.Label(fmt_frame, text="选择格式:").pack(side='left', padx=5)
         cb = ttk.Combobox(fmt_frame, textvariable=self.audio_output_format, state='readonly',
-                          values=["mp3","wav","aac","flac","ogg","m4a"])
+                          values=AUDIO_FORMATS)
         cb.pack(side='left', padx=5)
         cb.current(0)
 
+        # 音频编码参数：“保持”表示沿用源文件的设置，全部保持时可以直接流拷贝
+        encode_frame = ttk.LabelFrame(frame, text="音频编码")
+        encode_frame.pack(fill='x', pady=5)
+        self.audio_bitrate = tk.StringVar(value=AUDIO_BITRATES[0])
+        self.audio_sample_rate = tk.StringVar(value=AUDIO_SAMPLE_RATES[0])
+        self.audio_channels = tk.StringVar(value=next(iter(AUDIO_CHANNELS)))
+        self.audio_normalize = tk.BooleanVar(value=False)
+        self.audio_loudness = tk.StringVar(value=f"{DEFAULT_LOUDNESS:g}")
+        ttk.Label(encode_frame, text="码率:").pack(side='left', padx=5)
+        ttk.Combobox(encode_frame, textvariable=self.audio_bitrate, values=AUDIO_BITRATES,
+                     width=6).pack(side='left', padx=5)
+        ttk.Label(encode_frame, text="采样率:").pack(side='left', padx=5)
+        ttk.Combobox(encode_frame, textvariable=self.audio_sample_rate, values=AUDIO_SAMPLE_RATES,
+                     width=7).pack(side='left', padx=5)
+        ttk.Label(encode_frame, text="声道:").pack(side='left', padx=5)
+        ttk.Combobox(encode_frame, textvariable=self.audio_channels, values=list(AUDIO_CHANNELS),
+                     state='readonly', width=6).pack(side='left', padx=5)
+        ttk.Checkbutton(encode_frame, text="响度归一化到(dB):", variable=self.audio_normalize).pack(side='left', padx=5)
+        ttk.Entry(encode_frame, textvariable=self.audio_loudness, width=6).pack(side='left', padx=5)
+
         out_dir_frame = ttk.LabelFrame(frame, text="输出目录")
         out_dir_frame.pack(fill='x', pady=5)
         self.audio_output_dir_option = tk.StringVar(value="same")
@@ -526,20 +1168,22 @@ class MediaConverterApp(TkinterDnD.Tk):
             ttk.Radiobutton(out_dir_frame, text=txt, variable=self.audio_output_dir_option, value=val).pack(side='left', padx=5)
         btn_dir = ttk.Button(out_dir_frame, text="选择目录", command=lambda: self.choose_output_dir('audio'))
         btn_dir.pack(side='left', padx=5)
+        ttk.Checkbutton(out_dir_frame, text="跳过已转换的文件", variable=self.use_cache).pack(side='left', padx=5)
+        ttk.Checkbutton(out_dir_frame, text="相同内容只转换一次", variable=self.use_dedup).pack(side='left', padx=5)
         btn_dir.config(state='disabled')
         self.audio_output_dir_option.trace('w',
             lambda *args: self.toggle_dir_button(self.audio_output_dir_option, btn_dir))
 
-        ttk.Button(frame, text="开始转换", command=self.start_convert_audios).pack(pady=10)
+        run_btns = ttk.Frame(frame)
+        run_btns.pack(pady=10)
+        ttk.Button(run_btns, text="开始转换", command=self.start_convert_audios).pack(side='left', padx=5)
+        ttk.Button(run_btns, text="取消", command=lambda: self.cancel_batch('audio')).pack(side='left', padx=5)
         self.audio_progress = ttk.Progressbar(frame, orient='horizontal', mode='determinate')
         self.audio_progress.pack(fill='x', padx=5, pady=5)
 
         result_frame = ttk.LabelFrame(frame, text="转换结果")
         result_frame.pack(fill='both', expand=True, pady=5)
-        self.audio_results = ttk.Treeview(result_frame, columns=("原文件", "输出文件"), show='headings')
-        for col in ("原文件", "输出文件"):
-            self.audio_results.heading(col, text=col)
-        self.audio_results.pack(fill='both', expand=True, padx=5, pady=5)
+        self.audio_results = self.make_result_view(result_frame, self.audio_files)
 
         open_btns = ttk.Frame(frame)
         open_btns.pack(pady=5)
@@ -550,30 +1194,55 @@ class MediaConverterApp(TkinterDnD.Tk):
                    command=lambda: self.open_selected_file(self.audio_results, is_folder=True)
                    ).pack(side='left', padx=5)
 
+    def get_audio_encode(self):
+        """界面上的音频编码参数（dict，见 media_converter.audio），不合法时抛出 ValueError。"""
+        bitrate = self.audio_bitrate.get().strip()
+        sample_rate = self.audio_sample_rate.get().strip()
+        return resolve_audio_encode({
+            'bitrate': None if bitrate in ('', AUDIO_BITRATES[0]) else bitrate,
+            'sample_rate': None if sample_rate in ('', AUDIO_SAMPLE_RATES[0]) else sample_rate,
+            'channels': AUDIO_CHANNELS.get(self.audio_channels.get()),
+            'normalize': self.audio_loudness.get().strip() if self.audio_normalize.get() else None,
+        })
+
     def start_convert_audios(self):
         if not self.audio_files:
             messagebox.showinfo("信息", "请先添加音频文件。")
             return
-        for i in self.audio_results.get_children():
-            self.audio_results.delete(i)
-        Thread(target=self.convert_audios_thread, daemon=True).start()
+        if self.batch_running('audio'):
+            return
+        try:
+            audio_encode = self.get_audio_encode()
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        self.start_results(self.audio_results)
 
-    def convert_audios_thread(self):
-        total = len(self.audio_files)
-        self.audio_progress['maximum'] = total
         out_fmt = self.audio_output_format.get()
         out_dir = self.audio_specify_dir if self.audio_output_dir_option.get() == "specify" else None
+        cache = self.get_cache()
+
+        failed = []
+
+        def submit(f, group, callback):
+            self.scheduler.submit_audio(f, out_fmt, out_dir, cache=cache, group=group, callback=callback,
+                                        audio_encode=audio_encode, info=self.probe_info(f))
+
+        def on_result(r):
+            if r.ok:
+                self.show_result(self.audio_results, r, r.outputs[0])
+            else:
+                failed.append(r.input_path)
+                self.show_result(self.audio_results, r, f"出错：{r.error}")
 
-        for idx, f in enumerate(self.audio_files, start=1):
-            res = convert_audio_format(f, out_fmt, out_dir)
-            if res:
-                self.audio_results.insert("", "end", values=(f, res))
-            self.audio_progress['value'] = idx
-            self.update_idletasks()
+        def on_finish(group):
+            self.show_batch_summary("音频转换完成", group, failed)
 
-        messagebox.showinfo("完成", "音频转换完成。")
+        self.run_batch('audio', list(self.audio_files), self.audio_progress, submit, on_result, on_finish,
+                       output_dir=out_dir)
 
 def main():
+    multiprocessing.freeze_support()
     app = MediaConverterApp()
     app.mainloop()
 
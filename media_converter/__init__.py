@@ -0,0 +1,43 @@
+"""
+多媒体转换核心库。
+
+不依赖 tkinter，可以在无界面的环境（定时任务、容器）中直接 import 使用：
+
+    from media_converter import convert_files
+    results = convert_files(["photos/", "*.mp4"], output_dir="out")
+
+命令行用法见 ``python -m media_converter -h``。
+"""
+from .common import (RAW_EXTS, IMAGE_EXTS, VIDEO_EXTS, AUDIO_EXTS, IMAGE_FORMATS,
+                     AUDIO_FORMATS, IMAGE_QUALITIES, NO_AUDIO, ConversionError, configure_logging)
+from .ffmpeg_tools import probe_streams, transcode_audio_stream
+from .encoding import (VIDEO_PROFILES, available_video_codecs, resolve_video_encode,
+                       estimate_video_encode, measure_video_encode)
+from .converters import (convert_image, convert_image_outputs, separate_audio_from_video, convert_audio_format,
+                         extract_video_frames)
+from .jobs import ConversionResult, job_result, run_image_job, run_video_job, run_audio_job, run_frames_job
+from .scheduler import Job, JobGroup, JobScheduler
+from .batch import collect_inputs, convert_images_batch, convert_files
+from .cache import ConversionCache, default_cache_path
+from .metrics import JobMetrics, BatchStats, configure_metrics
+from .watch import FolderWatcher, WatchState, watch_folders
+from .manifest import BatchManifest, find_unfinished, resume_batch
+from .probe import ProbeIndex, probe_file, describe_info
+
+__all__ = [
+    'RAW_EXTS', 'IMAGE_EXTS', 'VIDEO_EXTS', 'AUDIO_EXTS', 'IMAGE_FORMATS', 'AUDIO_FORMATS',
+    'IMAGE_QUALITIES', 'NO_AUDIO', 'ConversionError', 'configure_logging',
+    'probe_streams', 'transcode_audio_stream',
+    'VIDEO_PROFILES', 'available_video_codecs', 'resolve_video_encode',
+    'estimate_video_encode', 'measure_video_encode',
+    'convert_image', 'convert_image_outputs', 'separate_audio_from_video', 'convert_audio_format',
+    'extract_video_frames',
+    'ConversionResult', 'job_result', 'run_image_job', 'run_video_job', 'run_audio_job', 'run_frames_job',
+    'Job', 'JobGroup', 'JobScheduler',
+    'collect_inputs', 'convert_images_batch', 'convert_files',
+    'ConversionCache', 'default_cache_path',
+    'JobMetrics', 'BatchStats', 'configure_metrics',
+    'FolderWatcher', 'WatchState', 'watch_folders',
+    'BatchManifest', 'find_unfinished', 'resume_batch',
+    'ProbeIndex', 'probe_file', 'describe_info',
+]
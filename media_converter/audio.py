@@ -0,0 +1,263 @@
+"""
+音频转码：直接调用 ffmpeg 解码、编码（不经过 moviepy 逐块读写），可设置码率、采样率、声道数，
+并可在同一次转码中做响度归一化。
+
+参数统一用 dict 表示（与视频编码参数一样可序列化，便于写入缓存键和批次清单）：
+  {'bitrate': '192k', 'sample_rate': 44100, 'channels': 2, 'normalize': -16.0}
+各项为 None 表示保持源文件的设置（码率为编码器默认值）；normalize 为目标响度（dB），None 表示不归一化。
+
+响度归一化：解码用的 ffmpeg 把音频以 32 位浮点 PCM 写入管道，NumPy 按 400ms 块计算门限响度
+（参照 ITU-R BS.1770 的门限方法，未做 K 计权），整段乘以同一个增益（逐样本，不做动态压缩），
+再写入编码用的 ffmpeg 的管道，不生成中间文件。增益受峰值上限限制，不会削波。
+解码后的 PCM 超过 NORMALIZE_MEMORY 时不在内存中保留，测量后由 ffmpeg 再解码一次并施加同样的增益。
+"""
+import re
+import math
+import struct
+import logging
+import subprocess
+
+from .ffmpeg_tools import AUDIO_ENCODERS, run_ffmpeg, popen_ffmpeg, check_ffmpeg, stop_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+# 无损格式：码率设置不起作用
+LOSSLESS_FORMATS = {'wav', 'flac'}
+# 采样率的允许范围和最大声道数
+SAMPLE_RATE_RANGE = (8000, 192000)
+MAX_CHANNELS = 8
+# 只指定归一化、不给数值时的目标响度（dB，常见的播客 / 语音响度）
+DEFAULT_LOUDNESS = -16.0
+# 归一化后的峰值上限（dBFS）
+PEAK_CEILING = -1.0
+# 门限响度：100ms 子块，每 4 个子块（400ms）为一块，相邻块重叠 75%
+SUB_BLOCK_SECONDS = 0.1
+BLOCK_SUB_BLOCKS = 4
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+# 解码后的 PCM 在内存中最多保留的字节数（约 12 分钟 44.1kHz 立体声）
+NORMALIZE_MEMORY = 256 << 20
+# 每次从解码管道读取的字节数
+READ_SIZE = 1 << 20
+
+_BITRATE_RE = re.compile(r'^\d+(\.\d+)?[km]?$')
+
+
+def resolve_audio_encode(audio_encode=None):
+    """
+    把 audio_encode（None 或 dict）整理成完整的参数 dict，参数不合法时抛出 ValueError。
+    normalize 为 True 时使用 DEFAULT_LOUDNESS。
+    """
+    settings = {'bitrate': None, 'sample_rate': None, 'channels': None, 'normalize': None}
+    audio_encode = dict(audio_encode or {})
+    unknown = set(audio_encode) - set(settings)
+    if unknown:
+        raise ValueError(f"未知的音频参数: {', '.join(sorted(unknown))}")
+    settings.update({k: v for k, v in audio_encode.items() if v is not None})
+    if settings['bitrate'] is not None:
+        bitrate = str(settings['bitrate']).strip().lower()
+        if not _BITRATE_RE.match(bitrate):
+            raise ValueError(f"音频码率格式错误: {settings['bitrate']}（如 192k）")
+        settings['bitrate'] = bitrate
+    try:
+        if settings['sample_rate'] is not None:
+            settings['sample_rate'] = int(settings['sample_rate'])
+        if settings['channels'] is not None:
+            settings['channels'] = int(settings['channels'])
+        if settings['normalize'] is True:
+            settings['normalize'] = DEFAULT_LOUDNESS
+        elif settings['normalize'] is False:
+            settings['normalize'] = None
+        elif settings['normalize'] is not None:
+            settings['normalize'] = float(settings['normalize'])
+    except (TypeError, ValueError):
+        raise ValueError(f"音频参数错误: {audio_encode}") from None
+    low, high = SAMPLE_RATE_RANGE
+    if settings['sample_rate'] is not None and not low <= settings['sample_rate'] <= high:
+        raise ValueError(f"采样率应在 {low} ~ {high} 之间")
+    if settings['channels'] is not None and not 1 <= settings['channels'] <= MAX_CHANNELS:
+        raise ValueError(f"声道数应在 1 ~ {MAX_CHANNELS} 之间")
+    if settings['normalize'] is not None and not ABSOLUTE_GATE < settings['normalize'] <= 0:
+        raise ValueError(f"目标响度应在 {ABSOLUTE_GATE:g} ~ 0 dB 之间")
+    return settings
+
+
+def is_default_audio(settings):
+    """是否全部保持源文件的设置（此时可以流拷贝，缓存键中也不记录）。"""
+    return all(v is None for v in settings.values())
+
+
+def audio_encode_args(settings, audio_format):
+    """ffmpeg 输出端的音频编码参数，如 ['-c:a', 'libmp3lame', '-b:a', '192k', '-ar', '44100']。"""
+    audio_format = audio_format.lower()
+    args = ['-c:a', AUDIO_ENCODERS.get(audio_format, audio_format)]
+    if settings['bitrate'] and audio_format not in LOSSLESS_FORMATS:
+        args += ['-b:a', settings['bitrate']]
+    if settings['sample_rate']:
+        args += ['-ar', str(settings['sample_rate'])]
+    if settings['channels']:
+        args += ['-ac', str(settings['channels'])]
+    return args
+
+
+def transcode_audio(src_path, out_path, audio_format, settings=None):
+    """
+    用 ffmpeg 把 src_path 的第一条音轨按 settings（resolve_audio_encode 的结果）编码为 audio_format，
+    写到 out_path。做了响度归一化时返回施加的增益（dB），否则返回 None。
+    """
+    settings = settings or resolve_audio_encode()
+    args = audio_encode_args(settings, audio_format)
+    if settings['normalize'] is None:
+        run_ffmpeg(['-i', src_path, '-map', '0:a:0', '-vn', *args, out_path])
+        return None
+    return _transcode_normalized(src_path, out_path, args, settings)
+
+
+# ------------------ 响度归一化 ------------------ #
+
+class LoudnessMeter:
+    """
+    流式测量门限响度和峰值：每次 add() 一段 (帧数, 声道数) 的 float32 PCM，
+    只保留每 100ms 一个的均方值，内存与解码数据的大小无关。
+    """
+    def __init__(self, rate, channels):
+        self.channels = channels
+        self.sub_frames = max(1, int(rate * SUB_BLOCK_SECONDS))
+        self.peak = 0.0
+        self._means = []
+        self._rest = None
+
+    def add(self, frames):
+        import numpy as np
+        if len(frames):
+            self.peak = max(self.peak, float(np.abs(frames).max()))
+        if self._rest is not None and len(self._rest):
+            frames = np.concatenate((self._rest, frames))
+        n = len(frames) // self.sub_frames * self.sub_frames
+        if n:
+            blocks = frames[:n].reshape(-1, self.sub_frames, self.channels)
+            # 各声道的均方值之和
+            self._means.append(np.square(blocks, dtype=np.float64).mean(axis=1).sum(axis=1))
+        self._rest = frames[n:]
+
+    def loudness(self):
+        """门限响度（dB）；全部低于绝对门限（静音）时返回 None。"""
+        import numpy as np
+        means = list(self._means)
+        if self._rest is not None and len(self._rest):
+            means.append(np.square(self._rest, dtype=np.float64).mean(axis=0).sum(keepdims=True))
+        if not means:
+            return None
+        sub = np.concatenate(means)
+        if len(sub) < BLOCK_SUB_BLOCKS:
+            blocks = sub.mean(keepdims=True)
+        else:
+            # 400ms 块 = 连续 4 个子块的平均，用累加和一次算出全部重叠块
+            acc = np.concatenate(([0.0], np.cumsum(sub)))
+            blocks = (acc[BLOCK_SUB_BLOCKS:] - acc[:-BLOCK_SUB_BLOCKS]) / BLOCK_SUB_BLOCKS
+        with np.errstate(divide='ignore'):
+            levels = 10 * np.log10(blocks)
+        gated = blocks[levels > ABSOLUTE_GATE]
+        if not len(gated):
+            return None
+        relative = 10 * math.log10(gated.mean()) + RELATIVE_GATE
+        return 10 * math.log10(blocks[levels > max(ABSOLUTE_GATE, relative)].mean())
+
+
+def normalize_gain(loudness, peak, target):
+    """达到目标响度所需的增益（dB），受峰值上限 PEAK_CEILING 限制；静音时返回 0。"""
+    if loudness is None or peak <= 0:
+        return 0.0
+    return min(target - loudness, PEAK_CEILING - 20 * math.log10(peak))
+
+
+def _read_exact(fp, n):
+    data = fp.read(n)
+    if len(data) != n:
+        raise RuntimeError("解码输出不完整")
+    return data
+
+
+def _read_wav_header(fp):
+    """读取 ffmpeg 写到管道的 WAV 头，返回 (采样率, 声道数)；之后读到的就是 PCM 数据。"""
+    riff = _read_exact(fp, 12)
+    if riff[:4] != b'RIFF' or riff[8:] != b'WAVE':
+        raise RuntimeError("无法解析解码输出")
+    rate = channels = None
+    while True:
+        chunk_id, size = struct.unpack('<4sI', _read_exact(fp, 8))
+        if chunk_id == b'data':
+            if rate is None:
+                raise RuntimeError("无法解析解码输出")
+            return rate, channels
+        body = _read_exact(fp, size + (size & 1))
+        if chunk_id == b'fmt ':
+            channels, rate = struct.unpack('<HI', body[2:8])
+
+
+def _transcode_normalized(src_path, out_path, args, settings):
+    import numpy as np
+    # 解码时按目标采样率 / 声道数转换，测量的就是最终输出的响度
+    resample = []
+    if settings['sample_rate']:
+        resample += ['-ar', str(settings['sample_rate'])]
+    if settings['channels']:
+        resample += ['-ac', str(settings['channels'])]
+    decoder = popen_ffmpeg(['-i', src_path, '-map', '0:a:0', '-vn', *resample,
+                            '-c:a', 'pcm_f32le', '-f', 'wav', 'pipe:1'], stdout=subprocess.PIPE)
+    chunks, kept = [], 0
+    try:
+        try:
+            rate, channels = _read_wav_header(decoder.stdout)
+        except RuntimeError:
+            decoder.stdout.close()
+            check_ffmpeg(decoder)  # 解码失败时报告 ffmpeg 的错误信息
+            raise
+        meter = LoudnessMeter(rate, channels)
+        frame_bytes = 4 * channels
+        while True:
+            data = decoder.stdout.read(READ_SIZE // frame_bytes * frame_bytes)
+            if not data:
+                break
+            frames = np.frombuffer(data, dtype='<f4', count=len(data) // frame_bytes * channels)
+            frames = frames.reshape(-1, channels)
+            meter.add(frames)
+            if chunks is not None:
+                kept += len(data)
+                if kept > NORMALIZE_MEMORY:
+                    chunks = None
+                else:
+                    chunks.append(frames)
+    except BaseException:
+        if decoder.returncode is None:
+            stop_ffmpeg(decoder, decoder.stdout)
+        raise
+    decoder.stdout.close()
+    check_ffmpeg(decoder)
+
+    gain = normalize_gain(meter.loudness(), meter.peak, settings['normalize'])
+    logger.debug(f"响度归一化: {src_path}, 增益 {gain:+.2f} dB")
+    if chunks is None:
+        # PCM 太大没有保留在内存中：由 ffmpeg 再解码一次并施加同样的增益
+        run_ffmpeg(['-i', src_path, '-map', '0:a:0', '-vn', '-af', f'volume={gain:.4f}dB', *args, out_path])
+        return gain
+
+    factor = np.float32(10 ** (gain / 20))
+    encoder = popen_ffmpeg(['-f', 'f32le', '-ar', str(rate), '-ac', str(channels), '-i', 'pipe:0',
+                            *args, out_path], stdin=subprocess.PIPE)
+    try:
+        for frames in chunks:
+            out = np.multiply(frames, factor)
+            np.clip(out, -1.0, 1.0, out=out)
+            encoder.stdin.write(out.tobytes())
+    except BrokenPipeError:
+        pass  # 编码进程已退出，下面报告它的错误信息
+    except BaseException:
+        stop_ffmpeg(encoder, encoder.stdin)
+        raise
+    try:
+        encoder.stdin.close()
+    except BrokenPipeError:
+        pass
+    check_ffmpeg(encoder)
+    return gain
@@ -0,0 +1,223 @@
+"""
+批量转换：收集输入文件、并行转换图片，以及供 CLI / 脚本使用的统一入口 convert_files。
+所有任务都通过 JobScheduler 执行。
+"""
+import os
+import glob
+import threading
+
+from .common import KIND_EXTS, detect_kind, is_partial_output, output_conflicts, conflict_message
+from .jobs import ConversionResult, job_result
+from .metrics import BatchStats
+from .manifest import BatchManifest
+from .probe import job_cost
+from .dedup import split_duplicates, replicate_result
+from .scheduler import JobScheduler, JobGroup
+
+
+def collect_inputs(inputs, kind=None, recursive=False):
+    """
+    把文件、目录、通配符混合的输入展开成文件列表（按出现顺序去重）。
+    目录和通配符只保留 kind 支持的扩展名（kind 为 None 时保留三类全部支持的文件）；
+    直接给出的文件路径原样保留。
+    """
+    exts = KIND_EXTS[kind] if kind else [e for v in KIND_EXTS.values() for e in v]
+    seen = set()
+    files = []
+
+    def add(path, check_ext):
+        if check_ext and (os.path.splitext(path)[1].lower() not in exts or is_partial_output(path)):
+            return
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            files.append(path)
+
+    for item in inputs:
+        if os.path.isdir(item):
+            if recursive:
+                for root, _dirs, names in os.walk(item):
+                    for name in sorted(names):
+                        add(os.path.join(root, name), True)
+            else:
+                for name in sorted(os.listdir(item)):
+                    path = os.path.join(item, name)
+                    if os.path.isfile(path):
+                        add(path, True)
+        elif os.path.isfile(item) or not any(c in item for c in '*?['):
+            # 不存在的普通路径也保留，由 convert_files 报告为失败
+            add(item, False)
+        else:
+            # Windows 的 shell 不展开通配符，这里统一处理
+            for path in sorted(glob.glob(item, recursive=recursive)):
+                if os.path.isfile(path):
+                    add(path, True)
+    return files
+
+
+def convert_images_batch(files, output_format='jpeg', output_dir=None, max_workers=None,
+                         callback=None, cache=None, **image_options):
+    """
+    使用进程池并行转换图片（RAW 解码与编码均为 CPU 密集型）。
+      - max_workers 为并行进程数，None 表示使用全部 CPU 核心。
+      - image_options 原样传给 convert_image（如 quality、max_size）。
+      - cache 为 ConversionCache 时，先跳过缓存命中的文件，转换成功的文件写入缓存。
+      - 每完成一个文件即调用 callback(已完成数, ConversionResult)。
+    返回 ConversionResult 列表，顺序为完成顺序。
+    """
+    results = []
+    if not files:
+        return results
+    lock = threading.Lock()
+    stats = BatchStats('convert_images_batch')
+
+    def on_done(job):
+        with lock:
+            results.append(job_result(job, 'image'))
+            stats.add(results[-1])
+            if callback:
+                callback(len(results), results[-1])
+
+    with JobScheduler(cpu_workers=max_workers or os.cpu_count()) as scheduler:
+        for f in files:
+            scheduler.submit_image(f, output_format, output_dir, cache=cache, callback=on_done,
+                                   **image_options)
+    stats.report()
+    return results
+
+
+def convert_files(inputs, kind=None, image_format='jpeg', audio_format='mp3', output_dir=None,
+                  recursive=False, max_workers=None, audio_only=False, stream_copy=None,
+                  video_format=None, callback=None, cache=None, image_quality='full', max_size=None,
+                  io_workers=None, scheduler=None, memory_limit=None, manifest=None, video_encode=None,
+                  image_ops=None, image_outputs=None, segment_workers=None, probe=None, dedup=None,
+                  audio_encode=None, video_frames=None, frame_output=None):
+    """
+    无界面的批量转换入口。
+      - inputs: 文件、目录或通配符组成的列表；kind 为 None 时按扩展名自动分类。
+      - image_format: 图片输出格式；audio_format: 音频（含视频提取的音轨）输出格式。
+      - output_dir: 与界面相同的规则，None 表示输出到原文件所在目录。
+      - video_format: 无声视频的封装格式，None 表示保留原视频后缀。
+      - video_encode: 无声视频需要重新编码时的编码组合名或参数 dict（见 encoding 模块）。
+      - video_frames: 指定时视频文件改为抽帧（见 extract_video_frames 的 frames，如 'count:12'），
+        不再分离音频；frame_output 为帧的输出格式（见 renditions.parse_outputs），None 表示 image_format。
+      - audio_encode: 音频文件转换时的码率、采样率、声道数和响度归一化参数 dict（见 audio 模块）。
+      - image_quality / max_size / memory_limit: 见 convert_image 的同名参数；
+        image_ops 为 convert_image 的 ops（图片操作链）。
+      - image_outputs: 每张图片解码一次、写出多份输出（见 renditions.parse_outputs），
+        指定时 image_format 和 max_size 不起作用。
+      - segment_workers: 长视频重新编码时分段并行编码的并发数（见 separate_audio_from_video）。
+      - max_workers / io_workers: CPU 通道与 I/O 通道的并发数（见 JobScheduler）。
+      - scheduler: 使用已有的 JobScheduler，None 时临时创建一个。
+      - callback(result) 在每个文件完成时调用。
+      - cache: ConversionCache，命中时跳过转换并直接返回已有输出（result.cached 为 True）。
+      - manifest: 批次清单文件路径；每个任务的结果都会追加写入，中断后可用 resume_batch 继续。
+      - probe: ProbeIndex；给出时先只读文件头探测全部文件（结果缓存在磁盘索引中），
+        据此直接跳过无法处理的文件、选择流拷贝或重新编码，并按预计耗时从长到短提交任务。
+      - dedup: 'link' / 'copy'，同一类文件中内容相同的只转换一次，其余文件的输出由转换结果
+        硬链接（不支持时复制）或复制而来（见 dedup 模块）；None 表示不去重。
+    返回 ConversionResult 列表（完成顺序）；错误不会抛出，而是记录在 result.error 中。
+    结束时把整批的吞吐量和各阶段耗时汇总写入日志（见 metrics.BatchStats）。
+    """
+    files = collect_inputs(inputs, kind, recursive)
+    results = []
+    lock = threading.Lock()
+    stats = BatchStats('convert_files')
+    book = None
+
+    def emit(result):
+        with lock:
+            results.append(result)
+            stats.add(result)
+            if book:
+                book.record(result)
+            if callback:
+                callback(result)
+
+    todo = []
+    for f in files:
+        k = kind or detect_kind(f)
+        if not os.path.isfile(f):
+            emit(ConversionResult(f, k, error="文件不存在"))
+        elif k is None:
+            emit(ConversionResult(f, None, error="不支持的文件类型"))
+        else:
+            todo.append((f, k))
+
+    # 输出文件名相同的文件（如 tone.flac、tone.wav 都输出 tone.mp3）只转换第一个
+    conflicts = {}
+    for k in {k for _f, k in todo}:
+        conflicts.update(output_conflicts([f for f, fk in todo if fk == k], output_dir))
+    if conflicts:
+        for f, k in todo:
+            if f in conflicts:
+                emit(ConversionResult(f, k, error=conflict_message(conflicts[f])))
+        todo = [(f, k) for f, k in todo if f not in conflicts]
+
+    # 内容相同的文件只转换第一个，完成后把结果复用到其余文件
+    copies = {}
+    if dedup and todo:
+        keep = set()
+        for k in {k for _f, k in todo}:
+            unique, found = split_duplicates([f for f, fk in todo if fk == k], cache)
+            keep.update(unique)
+            copies.update(found)
+        queued = [(f, k) for f, k in todo if f in keep]
+    else:
+        queued = todo
+
+    infos = {}
+    if probe is not None and queued:
+        infos = probe.probe_many([f for f, _k in queued])
+        # 长任务先开始，避免最后只剩一个长视频在单独运行
+        queued.sort(key=lambda fk: job_cost(infos[fk[0]]), reverse=True)
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if manifest:
+        # 路径都记成绝对路径，在其他工作目录下也能继续
+        options = dict(kind=kind, image_format=image_format, audio_format=audio_format,
+                       output_dir=os.path.abspath(output_dir) if output_dir else None,
+                       max_workers=max_workers, io_workers=io_workers, audio_only=audio_only,
+                       stream_copy=stream_copy, video_format=video_format, image_quality=image_quality,
+                       max_size=max_size, memory_limit=memory_limit, video_encode=video_encode,
+                       image_ops=image_ops, image_outputs=image_outputs, segment_workers=segment_workers,
+                       dedup=dedup, audio_encode=audio_encode, video_frames=video_frames,
+                       frame_output=frame_output)
+        book = BatchManifest.open(manifest, options, [(os.path.abspath(f), k) for f, k in todo])
+
+    own_scheduler = scheduler is None
+    if own_scheduler:
+        scheduler = JobScheduler(cpu_workers=max_workers, io_workers=io_workers)
+    group = JobGroup('convert_files')
+    try:
+        for f, k in queued:
+            def on_done(job, k=k):
+                result = job_result(job, k)
+                emit(result)
+                for d in copies.get(result.input_path, ()):
+                    emit(replicate_result(result, d, output_dir, dedup))
+            info = infos.get(f)
+            if k == 'image':
+                scheduler.submit_image(f, image_format, output_dir, cache=cache, group=group,
+                                       callback=on_done, info=info, quality=image_quality, max_size=max_size,
+                                       memory_limit=memory_limit, ops=image_ops, outputs=image_outputs)
+            elif k == 'video' and video_frames:
+                scheduler.submit_frames(f, output_dir, video_frames, frame_output or image_format, cache=cache,
+                                        group=group, callback=on_done, info=info)
+            elif k == 'video':
+                scheduler.submit_video(f, output_dir, audio_only, audio_format, video_format,
+                                       stream_copy, cache=cache, group=group, callback=on_done,
+                                       video_encode=video_encode, segment_workers=segment_workers, info=info)
+            else:
+                scheduler.submit_audio(f, audio_format, output_dir, cache=cache, group=group,
+                                       callback=on_done, info=info, audio_encode=audio_encode)
+        group.seal()
+        group.wait()
+    finally:
+        if own_scheduler:
+            scheduler.shutdown()
+        if book:
+            book.close()
+    stats.report()
+    return results
@@ -0,0 +1,473 @@
+"""
+内置性能基准：在本地生成合成测试素材，分别测量图片、音频、视频三条转换路径的
+吞吐量（文件/秒、MB/秒、实时倍率）和峰值内存，结果可保存为 JSON 并与以前的结果对比。
+
+--startup 只测量启动耗时：在全新的解释器中用 -X importtime 导入界面 / 命令行 / 库，
+以及执行一个图片、视频、音频任务，列出导入耗时的分布和实际加载了哪些较重的依赖。
+
+用法：
+    python -m media_converter.benchmark --json bench.json
+    python -m media_converter.benchmark --compare bench.json -k image
+    python -m media_converter.benchmark --startup
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import contextlib
+import platform
+import tempfile
+import statistics
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+
+from .common import IMAGE_FORMATS
+from .metrics import peak_rss_mb
+
+RESULT_VERSION = 1
+
+# 合成素材的尺寸 / 时长
+IMAGE_SIZE = (1500, 2000)
+DNG_SIZE = (2000, 3000)
+AUDIO_SECONDS = 30
+VIDEO_SECONDS = 10
+VIDEO_SIZE = '1280x720'
+
+
+# ------------------ 合成素材 ------------------ #
+
+def _write_noise_images(workdir):
+    import imageio
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (*IMAGE_SIZE, 3), dtype=np.uint8)
+    paths = {}
+    for fmt in IMAGE_FORMATS:
+        path = os.path.join(workdir, f'noise.{fmt}')
+        if not os.path.exists(path):
+            imageio.imsave(path, img)
+        paths[fmt] = path
+    return paths
+
+
+def _write_dng(workdir):
+    """
+    用 tifffile 写一个最小的 Bayer CFA DNG（RGGB，12 位随机噪声）。
+    没有 tifffile 时返回 None，跳过 RAW 测试。
+    """
+    try:
+        import tifffile
+    except ImportError:
+        return None
+    path = os.path.join(workdir, 'noise.dng')
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(0)
+    cfa = rng.integers(0, 4096, DNG_SIZE, dtype=np.uint16)
+    identity = (1, 1, 0, 1, 0, 1, 0, 1, 1, 1, 0, 1, 0, 1, 0, 1, 1, 1)
+    extratags = [
+        (271, 's', 0, 'Synthetic', False),            # Make
+        (272, 's', 0, 'Benchmark', False),            # Model
+        (33421, 'H', 2, (2, 2), False),               # CFARepeatPatternDim
+        (33422, 'B', 4, (0, 1, 1, 2), False),         # CFAPattern: RGGB
+        (50706, 'B', 4, (1, 4, 0, 0), False),         # DNGVersion
+        (50708, 's', 0, 'Synthetic Benchmark', False),  # UniqueCameraModel
+        (50714, 'H', 1, 0, False),                    # BlackLevel
+        (50717, 'H', 1, 4095, False),                 # WhiteLevel
+        (50721, '2i', 9, identity, False),            # ColorMatrix1
+        (50728, '2I', 3, (1, 1, 1, 1, 1, 1), False),  # AsShotNeutral
+        (50778, 'H', 1, 21, False),                   # CalibrationIlluminant1: D65
+    ]
+    tifffile.imwrite(path, cfa, photometric=32803, subfiletype=0, extratags=extratags)
+    return path
+
+
+def _write_media(workdir):
+    """用 ffmpeg 生成音调 + 噪声的音频，以及带音轨的 H.264 测试视频。"""
+    from .ffmpeg_tools import run_ffmpeg
+    tone = (f'sine=frequency=440:duration={AUDIO_SECONDS}:sample_rate=44100[a];'
+            f'anoisesrc=duration={AUDIO_SECONDS}:amplitude=0.1:sample_rate=44100[b];'
+            f'[a][b]amix=inputs=2,aformat=channel_layouts=stereo')
+    paths = {}
+    for fmt, codec in [('wav', ['-c:a', 'pcm_s16le']), ('mp3', ['-c:a', 'libmp3lame', '-b:a', '192k']),
+                       ('flac', ['-c:a', 'flac'])]:
+        path = os.path.join(workdir, f'tone.{fmt}')
+        if not os.path.exists(path):
+            run_ffmpeg(['-f', 'lavfi', '-i', tone, *codec, path])
+        paths[fmt] = path
+    path = os.path.join(workdir, 'testsrc.mp4')
+    if not os.path.exists(path):
+        run_ffmpeg(['-f', 'lavfi', '-i', f'testsrc2=size={VIDEO_SIZE}:rate=30:duration={VIDEO_SECONDS}',
+                    '-f', 'lavfi', '-i', f'sine=frequency=440:duration={VIDEO_SECONDS}',
+                    '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+                    '-c:a', 'aac', '-b:a', '128k', '-shortest', path])
+    paths['mp4'] = path
+    return paths
+
+
+def make_fixtures(workdir):
+    """生成（或复用 workdir 中已有的）全部测试素材，返回 {名称: 路径}。"""
+    os.makedirs(workdir, exist_ok=True)
+    fixtures = {f'image.{fmt}': path for fmt, path in _write_noise_images(workdir).items()}
+    dng = _write_dng(workdir)
+    if dng:
+        fixtures['image.dng'] = dng
+    for fmt, path in _write_media(workdir).items():
+        fixtures[f'{"video" if fmt == "mp4" else "audio"}.{fmt}'] = path
+    return fixtures
+
+
+# ------------------ 测试用例 ------------------ #
+
+def build_cases(fixtures):
+    """
+    返回测试用例列表，每项为 dict：
+      name / path（'image'、'audio'、'video'）/ input / func / kwargs / duration（秒，音视频才有）
+    """
+    cases = []
+    for fmt in IMAGE_FORMATS:
+        target = 'png' if fmt == 'jpeg' else 'jpeg'
+        cases.append({'name': f'image:{fmt}->{target}', 'path': 'image', 'input': fixtures[f'image.{fmt}'],
+                      'func': 'convert_image', 'kwargs': {'output_format': target}})
+    # 转换时一并裁剪、转 sRGB（与单纯转格式对比操作链的开销）
+    cases.append({'name': 'image:png->jpeg:ops', 'path': 'image', 'input': fixtures['image.png'],
+                  'func': 'convert_image',
+                  'kwargs': {'output_format': 'jpeg', 'ops': ['crop=16,16,1024,768', 'srgb=adobe_rgb']}})
+    if 'image.dng' in fixtures:
+        for quality in ('full', 'proxy'):
+            cases.append({'name': f'image:dng->jpeg:{quality}', 'path': 'image',
+                          'input': fixtures['image.dng'], 'func': 'convert_image',
+                          'kwargs': {'output_format': 'jpeg', 'quality': quality}})
+    for src, target in [('wav', 'mp3'), ('mp3', 'flac'), ('flac', 'aac')]:
+        cases.append({'name': f'audio:{src}->{target}', 'path': 'audio', 'input': fixtures[f'audio.{src}'],
+                      'func': 'convert_audio_format', 'kwargs': {'output_format': target},
+                      'duration': AUDIO_SECONDS})
+    video = fixtures['video.mp4']
+    cases += [
+        {'name': 'video:separate-copy', 'path': 'video', 'input': video, 'func': 'separate_audio_from_video',
+         'kwargs': {'audio_format': 'mp3', 'video_format': 'mp4'}, 'duration': VIDEO_SECONDS},
+        {'name': 'video:audio-only-m4a', 'path': 'video', 'input': video, 'func': 'separate_audio_from_video',
+         'kwargs': {'export_only_audio': True, 'audio_format': 'm4a'}, 'duration': VIDEO_SECONDS},
+        {'name': 'video:separate-reencode', 'path': 'video', 'input': video,
+         'func': 'separate_audio_from_video',
+         'kwargs': {'audio_format': 'mp3', 'video_format': 'mp4', 'stream_copy': False},
+         'duration': VIDEO_SECONDS},
+    ]
+    # 快速导入组合的重新编码，与上面默认组合（h264 medium）对比
+    cases.append({'name': 'video:reencode-fast_ingest', 'path': 'video', 'input': video,
+                  'func': 'separate_audio_from_video',
+                  'kwargs': {'audio_format': 'mp3', 'video_format': 'mp4', 'stream_copy': False,
+                             'video_encode': 'fast_ingest'},
+                  'duration': VIDEO_SECONDS})
+    return cases
+
+
+def _run_case(case, repeat):
+    """在独立进程中执行一个用例 repeat 次，返回每次耗时和峰值内存。"""
+    from . import converters
+    func = getattr(converters, case['func'])
+    baseline, _ = peak_rss_mb()
+    times = []
+    # 转换函数（moviepy）的进度输出写到 stderr，避免混入 --json - 的输出
+    with tempfile.TemporaryDirectory(prefix='mc_bench_') as out_dir, contextlib.redirect_stdout(sys.stderr):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(case['input'], output_dir=out_dir, **case['kwargs'])
+            times.append(time.perf_counter() - start)
+    peak, peak_children = peak_rss_mb()
+    return {'times': times, 'baseline_rss_mb': baseline, 'peak_rss_mb': peak,
+            'peak_child_rss_mb': peak_children}
+
+
+def run_case(case, repeat=3):
+    """
+    执行一个用例并汇总指标。每个用例使用全新的进程（spawn），峰值内存互不影响。
+    转换失败时结果中只有 name / path / error。
+    """
+    ctx = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            raw = pool.submit(_run_case, case, repeat).result()
+    except Exception as e:
+        return {'name': case['name'], 'path': case['path'], 'error': str(e)}
+    median = statistics.median(raw['times'])
+    size_mb = os.path.getsize(case['input']) / 2 ** 20
+    result = {
+        'name': case['name'],
+        'path': case['path'],
+        'input_mb': round(size_mb, 3),
+        'runs': [round(t, 4) for t in raw['times']],
+        'median_s': round(median, 4),
+        'min_s': round(min(raw['times']), 4),
+        'files_per_s': round(1 / median, 3),
+        'mb_per_s': round(size_mb / median, 2),
+        'realtime': round(case['duration'] / median, 2) if case.get('duration') else None,
+        'baseline_rss_mb': raw['baseline_rss_mb'],
+        'peak_rss_mb': raw['peak_rss_mb'],
+        'peak_child_rss_mb': raw['peak_child_rss_mb'],
+    }
+    return result
+
+
+def machine_info():
+    """记录运行环境，便于跨机器比较时区分。"""
+    from .ffmpeg_tools import ffmpeg_binary
+    try:
+        out = subprocess.run([ffmpeg_binary(), '-version'], capture_output=True, text=True, errors='replace')
+        ffmpeg = out.stdout.splitlines()[0] if out.stdout else None
+    except OSError:
+        ffmpeg = None
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'ffmpeg': ffmpeg,
+    }
+
+
+def run_benchmarks(workdir=None, repeat=3, select=None, callback=None):
+    """
+    生成素材并运行全部（或名称包含 select 的）用例，返回可序列化为 JSON 的结果。
+    callback(result) 在每个用例完成后调用。
+    """
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='mc_bench_fixtures_')
+    try:
+        cases = build_cases(make_fixtures(workdir))
+        if select:
+            cases = [c for c in cases if select in c['name']]
+        results = []
+        for case in cases:
+            result = run_case(case, repeat)
+            results.append(result)
+            if callback:
+                callback(result)
+    finally:
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {'version': RESULT_VERSION, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'repeat': repeat, 'machine': machine_info(), 'results': results}
+
+
+# ------------------ 启动耗时 ------------------ #
+
+# 较重的第三方依赖：启动耗时报告中列出各用例实际加载了哪些
+HEAVY_MODULES = ('numpy', 'PIL', 'rawpy', 'imageio', 'imageio_ffmpeg', 'moviepy', 'tifffile',
+                 'tkinter', 'tkinterdnd2')
+# 界面启动（导入 gui_converter / 打开窗口）的目标耗时（秒）
+STARTUP_BUDGET = 1.0
+# gui_converter.py 所在目录
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_startup_cases(fixtures=None, out_dir=None):
+    """
+    启动耗时用例，每项为 dict：name / code（在全新解释器中执行的代码）/ budget（目标秒数，可选）。
+    给出 fixtures 时加入各类任务：导入任务模块并转换一个文件，看该类任务实际需要加载哪些依赖。
+    """
+    cases = [
+        {'name': 'startup:package', 'code': 'import media_converter'},
+        {'name': 'startup:cli', 'code': 'from media_converter.cli import main'},
+        {'name': 'startup:gui', 'code': 'import gui_converter', 'budget': STARTUP_BUDGET},
+        # 需要图形界面；没有显示器时记为失败
+        {'name': 'startup:window', 'budget': STARTUP_BUDGET,
+         'code': 'import gui_converter; app = gui_converter.MediaConverterApp(); app.update(); app.on_close()'},
+    ]
+    if not fixtures:
+        return cases
+    # 任务函数不抛出异常，失败原因作为退出信息
+    cases.append({'name': 'job:image', 'code': (
+        f"from media_converter.jobs import convert_image_job; "
+        f"raise SystemExit(convert_image_job({fixtures['image.png']!r}, 'jpeg', {out_dir!r}, {{}})[2])")})
+    if 'image.dng' in fixtures:
+        cases.append({'name': 'job:raw', 'code': (
+            f"from media_converter.jobs import convert_image_job; "
+            f"raise SystemExit(convert_image_job({fixtures['image.dng']!r}, 'jpeg', {out_dir!r}, {{}})[2])")})
+    cases.append({'name': 'job:video', 'code': (
+        f"from media_converter.jobs import run_video_job; "
+        f"raise SystemExit(run_video_job({fixtures['video.mp4']!r}, {out_dir!r}, audio_format='m4a').error)")})
+    cases.append({'name': 'job:audio', 'code': (
+        f"from media_converter.jobs import run_audio_job; "
+        f"raise SystemExit(run_audio_job({fixtures['audio.wav']!r}, 'mp3', {out_dir!r}).error)")})
+    return cases
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 的输出，返回 [(模块名, 层级, 自身微秒, 累计微秒)]，层级 0 为顶层导入。"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表头
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(parts[0]), int(parts[1])))
+    return rows
+
+
+def run_startup_case(case, cwd, top=6):
+    """
+    在全新的解释器中执行一个启动用例，返回 dict：
+      - import_ms: 全部导入的耗时；wall_s: 进程从启动到退出的总耗时
+      - packages: 按顶层包汇总的导入耗时（各模块自身耗时之和，毫秒，取最多的 top 个）
+      - heavy: 加载了的 HEAVY_MODULES
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [_ROOT, env.get('PYTHONPATH')]))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', case['code']], cwd=cwd, env=env,
+                          capture_output=True, text=True, errors='replace')
+    wall = time.perf_counter() - start
+    if proc.returncode:
+        messages = [line for line in proc.stderr.splitlines() if line and not line.startswith('import time:')]
+        return {'name': case['name'], 'error': messages[-1] if messages else f"退出码 {proc.returncode}"}
+    rows = parse_importtime(proc.stderr)
+    packages = {}
+    for name, _depth, self_us, _cumulative in rows:
+        root = name.split('.')[0]
+        packages[root] = packages.get(root, 0) + self_us
+    loaded = {name for name, *_ in rows}
+    result = {
+        'name': case['name'],
+        'import_ms': round(sum(packages.values()) / 1000, 1),
+        'wall_s': round(wall, 3),
+        'packages': {k: round(v / 1000, 1) for k, v in
+                     sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]},
+        'heavy': [m for m in HEAVY_MODULES if m in loaded],
+    }
+    if case.get('budget'):
+        result['over_budget'] = wall > case['budget']
+    return result
+
+
+def run_startup(workdir=None, select=None, callback=None):
+    """运行启动耗时用例（选中 job: 用例时生成素材），返回可序列化为 JSON 的结果。"""
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='mc_bench_fixtures_')
+    try:
+        with tempfile.TemporaryDirectory(prefix='mc_startup_') as out_dir:
+            cases = build_startup_cases(None)
+            if not select or 'job' in select:
+                cases = build_startup_cases(make_fixtures(workdir), out_dir)
+            if select:
+                cases = [c for c in cases if select in c['name']]
+            results = []
+            for case in cases:
+                # 每个用例在空的临时目录中运行（界面会在当前目录创建日志文件）
+                result = run_startup_case(case, out_dir)
+                results.append(result)
+                if callback:
+                    callback(result)
+    finally:
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {'version': RESULT_VERSION, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'machine': machine_info(), 'startup': results}
+
+
+def _format_startup_row(r):
+    if 'error' in r:
+        return f"{r['name']:<18} 失败: {r['error']}"
+    over = "  超出目标" if r.get('over_budget') else ""
+    packages = ", ".join(f"{k} {v:.0f}" for k, v in r['packages'].items())
+    return (f"{r['name']:<18} {r['import_ms']:>8.0f} {r['wall_s']:>7.2f}  {' '.join(r['heavy']) or '-'}{over}\n"
+            f"{'':<18} 导入耗时(ms): {packages}")
+
+
+def compare(old, new, threshold=10.0):
+    """
+    按用例名对比两次结果的中位耗时和峰值内存，返回 [(name, 耗时变化%, 内存变化%, 是否变慢)]。
+    耗时增加超过 threshold% 视为变慢。
+    """
+    def change(a, b):
+        return round((b - a) / a * 100, 1) if a and b is not None else None
+
+    previous = {r['name']: r for r in old.get('results', [])}
+    rows = []
+    for r in new['results']:
+        before = previous.get(r['name'])
+        if before is None or 'error' in before or 'error' in r:
+            continue
+        dt = change(before['median_s'], r['median_s'])
+        dm = change(before.get('peak_rss_mb'), r.get('peak_rss_mb'))
+        rows.append((r['name'], dt, dm, dt is not None and dt > threshold))
+    return rows
+
+
+def _format_row(r):
+    if 'error' in r:
+        return f"{r['name']:<28} 失败: {r['error']}"
+    realtime = f"{r['realtime']:.1f}x" if r['realtime'] else '-'
+    peak = f"{r['peak_rss_mb']:.0f}" if r['peak_rss_mb'] is not None else '-'
+    return (f"{r['name']:<28} {r['median_s']:>8.3f} {r['files_per_s']:>8.2f} {r['mb_per_s']:>8.2f} "
+            f"{realtime:>9} {peak:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m media_converter.benchmark',
+                                     description="图片 / 音频 / 视频转换路径的性能基准")
+    parser.add_argument('-n', '--repeat', type=int, default=3, help="每个用例重复次数，取中位数（默认 3）")
+    parser.add_argument('-k', '--select', help="只运行名称包含该字符串的用例，如 image、audio:wav")
+    parser.add_argument('--workdir', help="素材目录：已有素材会被复用，结束后不删除")
+    parser.add_argument('--json', metavar='FILE', help="把结果写入 JSON 文件（- 表示标准输出）")
+    parser.add_argument('--compare', metavar='FILE', help="与以前保存的 JSON 结果对比")
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="对比时耗时增加超过该百分比视为变慢，退出码为 1（默认 10）")
+    parser.add_argument('--startup', action='store_true',
+                        help=f"只测量启动耗时（-X importtime），界面启动超过 {STARTUP_BUDGET:g} 秒时退出码为 1")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        return _startup_main(args)
+
+    quiet = args.json == '-'
+    if not quiet:
+        print(f"{'用例':<26} {'中位秒':>8} {'文件/秒':>6} {'MB/秒':>7} {'实时倍率':>7} {'峰值MB':>7}")
+    report = run_benchmarks(args.workdir, max(1, args.repeat), args.select,
+                            callback=None if quiet else lambda r: print(_format_row(r), flush=True))
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if not args.compare:
+        return 0
+    with open(args.compare, encoding='utf-8') as f:
+        old = json.load(f)
+    rows = compare(old, report, args.threshold)
+    out = sys.stderr if quiet else sys.stdout
+    print(f"\n与 {args.compare} 对比（正数表示变慢 / 内存增加）:", file=out)
+    for name, dt, dm, slower in rows:
+        fmt = lambda v: f"{v:+.1f}%" if v is not None else '-'
+        print(f"{name:<28} 耗时 {fmt(dt):>8}  内存 {fmt(dm):>8}{'  变慢' if slower else ''}", file=out)
+    return 1 if any(slower for *_, slower in rows) else 0
+
+
+def _startup_main(args):
+    quiet = args.json == '-'
+    if not quiet:
+        print(f"{'用例':<16} {'导入ms':>6} {'总秒数':>5}  加载的较重依赖")
+    report = run_startup(args.workdir, args.select,
+                         callback=None if quiet else lambda r: print(_format_startup_row(r), flush=True))
+    if args.json == '-':
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if any(r.get('over_budget') for r in report['startup']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+持久化转换缓存：输入内容未变、目标格式与参数相同且输出文件仍然完好时，直接复用已有输出。
+
+缓存键由输入文件内容哈希、操作名、参数和输出位置组成；
+为避免每次都重新读取整个文件计算哈希，另外记录 路径 -> (大小, 修改时间, 哈希)，
+大小和修改时间都没变时直接使用记录的哈希。
+只读取输入文件一小部分的任务（如视频抽帧）可以用 quick=True 的缓存键：内容哈希换成
+文件大小加开头、结尾各 PARTIAL_BYTES 字节的哈希，首次查询时不必读完整个大文件。
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from .common import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 100000
+_HASH_CHUNK = 1 << 20
+PARTIAL_BYTES = 64 << 10
+
+
+def default_cache_path():
+    """
+    默认缓存文件位置，可用环境变量 MEDIA_CONVERTER_CACHE 覆盖。
+    """
+    env = os.environ.get('MEDIA_CONVERTER_CACHE')
+    if env:
+        return env
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'media_converter', 'cache.sqlite3')
+
+
+def file_hash(path):
+    """计算文件内容的 BLAKE2b 哈希。"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as fp:
+        while True:
+            chunk = fp.read(_HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def partial_hash(path, size):
+    """文件开头和结尾各 PARTIAL_BYTES 字节的哈希；文件不大于两段之和时即整个文件的哈希。"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as fp:
+        h.update(fp.read(PARTIAL_BYTES))
+        if size > 2 * PARTIAL_BYTES:
+            fp.seek(-PARTIAL_BYTES, os.SEEK_END)
+        h.update(fp.read(PARTIAL_BYTES))
+    return h.hexdigest()
+
+
+class ConversionCache:
+    """
+    基于 sqlite 的转换缓存，可在多个线程中共用。
+      - max_entries: 最多保留的条目数，超出时淘汰最久未使用的条目。
+    """
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._inserts = 0
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS file_hash (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT);
+            CREATE TABLE IF NOT EXISTS entry (
+                key TEXT PRIMARY KEY, outputs TEXT, last_used REAL);
+            CREATE INDEX IF NOT EXISTS entry_last_used ON entry(last_used);
+        """)
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ------------------ 内部工具 ------------------ #
+    def _content_hash(self, path):
+        """先用 大小+修改时间 判断，未变化时复用记录的哈希，否则重新计算。"""
+        path = os.path.abspath(path)
+        size, mtime_ns = file_fingerprint(path)
+        with self._lock:
+            row = self._db.execute("SELECT size, mtime_ns, hash FROM file_hash WHERE path = ?",
+                                   (path,)).fetchone()
+        if row and row[0] == size and row[1] == mtime_ns:
+            return row[2]
+        digest = file_hash(path)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO file_hash VALUES (?, ?, ?, ?)",
+                             (path, size, mtime_ns, digest))
+            self._db.commit()
+        return digest
+
+    def _key(self, input_path, op, options, quick=False):
+        """
+        缓存键：内容哈希 + 操作 + 参数 + 输出位置（输出文件名取决于输入文件名和目录）。
+        quick 为 True 时用 大小 + 修改时间 + 首尾部分哈希 代替内容哈希（只改了中间内容的文件也会因修改时间变化而失效）。
+        """
+        options = dict(options)
+        out_dir = options.pop('output_dir', None)
+        location = os.path.join(os.path.abspath(out_dir or os.path.dirname(input_path)),
+                                os.path.basename(input_path))
+        if quick:
+            size, mtime_ns = file_fingerprint(input_path)
+            digest = f"partial:{size}:{mtime_ns}:{partial_hash(input_path, size)}"
+        else:
+            digest = self._content_hash(input_path)
+        raw = json.dumps([digest, op, options, location],
+                         sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    # ------------------ 对外接口 ------------------ #
+    def content_hash(self, path):
+        """输入文件的内容哈希（大小和修改时间都没变时直接使用记录的哈希）。"""
+        return self._content_hash(path)
+
+    def lookup(self, input_path, op, options, quick=False):
+        """
+        查询缓存，命中且输出文件都未被改动时返回输出路径列表，否则返回 None。
+        quick 见模块说明，同一类任务的 lookup 和 store 应使用相同的 quick。
+        """
+        try:
+            key = self._key(input_path, op, options, quick)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT outputs FROM entry WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        outputs = json.loads(row[0])
+        try:
+            valid = all(list(file_fingerprint(p)) == fp for p, fp in outputs)
+        except OSError:
+            valid = False
+        with self._lock:
+            if valid:
+                self._db.execute("UPDATE entry SET last_used = ? WHERE key = ?", (time.time(), key))
+            else:
+                self._db.execute("DELETE FROM entry WHERE key = ?", (key,))
+            self._db.commit()
+        if not valid:
+            return None
+        logger.info(f"缓存命中，跳过转换: {input_path}")
+        return [p for p, _fp in outputs]
+
+    def store(self, input_path, op, options, outputs, quick=False):
+        """记录一次成功的转换（outputs 为生成的输出文件路径列表）。"""
+        try:
+            key = self._key(input_path, op, options, quick)
+            record = json.dumps([[p, list(file_fingerprint(p))] for p in outputs], ensure_ascii=False)
+        except OSError as e:
+            logger.warning(f"写入缓存失败: {input_path}, 错误: {e}")
+            return
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO entry VALUES (?, ?, ?)", (key, record, time.time()))
+            self._db.commit()
+            self._inserts += 1
+            if self._inserts % 100 == 0:
+                self._evict()
+
+    def _evict(self):
+        """
+        在持有锁时调用：超出上限时删除最久未使用的条目和最早记录的哈希（重新计算的哈希会重新插入，
+        rowid 随之变大）。只执行 SQL，不访问文件系统；已不存在的文件的记录由 prune() 清理。
+        """
+        count = self._db.execute("SELECT COUNT(*) FROM entry").fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute("""DELETE FROM entry WHERE key IN (
+                                  SELECT key FROM entry ORDER BY last_used LIMIT ?)""",
+                             (count - self.max_entries,))
+        extra = self._db.execute("SELECT COUNT(*) FROM file_hash").fetchone()[0] - self.max_entries
+        if extra > 0:
+            self._db.execute("""DELETE FROM file_hash WHERE rowid IN (
+                                  SELECT rowid FROM file_hash ORDER BY rowid LIMIT ?)""", (extra,))
+        self._db.commit()
+
+    def prune(self):
+        """
+        删除输出文件已经不存在或被修改的条目，以及已不存在的输入文件的哈希记录，返回删除的条目数。
+        检查文件时不持有锁，其他线程可以照常查询和写入缓存；期间被重新写入的记录不会被删除。
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT key, outputs FROM entry").fetchall()
+            hashed = self._db.execute("SELECT path, hash FROM file_hash").fetchall()
+        stale = []
+        for key, outputs in rows:
+            try:
+                if not all(list(file_fingerprint(p)) == fp for p, fp in json.loads(outputs)):
+                    stale.append((key, outputs))
+            except OSError:
+                stale.append((key, outputs))
+        missing = [(p, digest) for p, digest in hashed if not os.path.exists(p)]
+        with self._lock:
+            self._db.executemany("DELETE FROM entry WHERE key = ? AND outputs = ?", stale)
+            self._db.executemany("DELETE FROM file_hash WHERE path = ? AND hash = ?", missing)
+            self._evict()
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM entry")
+            self._db.execute("DELETE FROM file_hash")
+            self._db.commit()
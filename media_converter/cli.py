@@ -0,0 +1,283 @@
+"""
+命令行入口：python -m media_converter [选项] 输入...
+"""
+import os
+import sys
+import json
+import argparse
+
+from .common import IMAGE_FORMATS, AUDIO_FORMATS, IMAGE_QUALITIES, configure_logging
+from .imageops import parse_ops
+from .renditions import parse_outputs
+from .encoding import (VIDEO_PROFILES, VIDEO_CODECS, SPEED_PRESETS, resolve_video_encode, encoder_for,
+                       describe_estimate)
+from .audio import DEFAULT_LOUDNESS, resolve_audio_encode
+from .frames import resolve_frames
+from .metrics import configure_metrics
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m media_converter",
+        description="批量转换图片/视频/音频（无界面模式）。不带输入文件时可用 --gui 启动图形界面。")
+    parser.add_argument('inputs', nargs='*', help="文件、目录或通配符")
+    parser.add_argument('-k', '--kind', choices=['image', 'video', 'audio'],
+                        help="只处理某一类文件（默认按扩展名自动分类）")
+    parser.add_argument('--image-format', default='jpeg', choices=IMAGE_FORMATS, help="图片输出格式")
+    parser.add_argument('--audio-format', default='mp3', choices=AUDIO_FORMATS,
+                        help="音频输出格式（也用于从视频中提取的音轨）")
+    parser.add_argument('--quality', choices=IMAGE_QUALITIES, default='full',
+                        help="图片质量：full 完整解码；proxy 快速预览（RAW 优先使用内嵌缩略图）")
+    parser.add_argument('--max-size', type=int, help="图片输出长边的最大像素数")
+    parser.add_argument('--memory-limit', type=int, metavar='MB',
+                        help="单个图片任务的内存上限（MB），超过时按条带流式处理或报错")
+    parser.add_argument('--output', action='append', dest='outputs', metavar='SPEC',
+                        help="每张图片解码一次、写出多份输出，可重复：格式[:长边][:q质量][:后缀]，"
+                             "如 --output jpeg --output webp:1600:q80 --output png:256:_thumb"
+                             "（指定后 --image-format、--max-size 不起作用）")
+    parser.add_argument('--op', action='append', dest='ops', metavar='OP',
+                        help="图片处理操作，可重复、按顺序执行：crop=左,上,宽,高 / resize=长边 或 宽x高 / "
+                             "srgb=adobe_rgb|display_p3|prophoto|linear / 8bit / strip_alpha[=RRGGBB]")
+    parser.add_argument('--video-format', help="无声视频封装格式（默认保留原后缀）")
+    parser.add_argument('-o', '--output-dir', help="输出目录（默认与原文件相同）")
+    parser.add_argument('-r', '--recursive', action='store_true', help="递归扫描目录")
+    parser.add_argument('-j', '--workers', type=int, help="CPU 通道（解码/编码）并发任务数（默认 CPU 核心数）")
+    parser.add_argument('--io-workers', type=int, help="I/O 通道（流拷贝、缓存命中）并发任务数（默认 2）")
+    parser.add_argument('--audio-only', action='store_true', help="视频仅导出音频")
+    parser.add_argument('--no-stream-copy', action='store_true', help="视频分离时始终重新编码")
+    parser.add_argument('--no-cache', action='store_true', help="不使用转换缓存，全部重新转换")
+    parser.add_argument('--cache-file', help="转换缓存文件（默认位于用户缓存目录）")
+    parser.add_argument('--no-probe', action='store_true',
+                        help="不预先探测文件头（默认先读取时长、音视频编码等，跳过无法处理的文件、长任务先开始）")
+    parser.add_argument('--dedup', nargs='?', const='link', choices=['link', 'copy'],
+                        help="内容相同的文件只转换一次，其余文件的输出用硬链接（默认，不支持时复制）或复制得到")
+    parser.add_argument('--info', action='store_true', help="只列出各文件的探测信息（分辨率、时长、编码等），不转换")
+    parser.add_argument('--json', action='store_true', help="每个结果输出一行 JSON")
+    parser.add_argument('--log-file', default='media_converter.log', help="日志文件")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="把每个任务的阶段耗时和批次汇总追加到 JSON lines 文件")
+    parser.add_argument('--gui', action='store_true', help="启动图形界面")
+
+    encode = parser.add_argument_group("视频编码（无声视频需要重新编码时使用）")
+    encode.add_argument('--video-profile', choices=list(VIDEO_PROFILES),
+                        help="编码组合：fast_ingest 速度优先；balanced 默认；archive 体积优先（h265）")
+    encode.add_argument('--video-codec', choices=list(VIDEO_CODECS), help="视频编码（覆盖编码组合中的设置）")
+    encode.add_argument('--preset', choices=list(SPEED_PRESETS), help="编码速度预设")
+    encode.add_argument('--crf', type=int, help="恒定画质参数，越小画质越好、文件越大")
+    encode.add_argument('--video-bitrate', help="目标码率（如 4M），指定后不使用 CRF")
+    encode.add_argument('--threads', type=int, help="每个编码任务的线程数（默认 0 自动）")
+    encode.add_argument('--segment-workers', type=int, metavar='N',
+                        help="长视频（2 分钟以上）按关键帧分段、N 段并行编码后无损拼接；0 表示使用全部 CPU 核心")
+
+    audio = parser.add_argument_group("音频编码（音频文件转换时使用，指定任何一项时总是重新编码）")
+    audio.add_argument('--audio-bitrate', help="音频码率（如 128k，对 wav / flac 无效）")
+    audio.add_argument('--sample-rate', type=int, help="输出采样率（如 44100、48000）")
+    audio.add_argument('--channels', type=int, help="输出声道数（1 单声道，2 立体声）")
+    audio.add_argument('--normalize', nargs='?', type=float, const=DEFAULT_LOUDNESS, metavar='DB',
+                       help=f"响度归一化到目标响度（默认 {DEFAULT_LOUDNESS:g} dB），峰值不超过 -1 dBFS")
+
+    frames = parser.add_argument_group("视频抽帧（指定 --frames 时视频文件改为抽帧，不再分离音频）")
+    frames.add_argument('--frames', metavar='MODE',
+                        help="count[:N] 均匀抽取 N 帧（默认 12）/ interval:秒 每隔若干秒一帧 / "
+                             "keyframes[:N] 只取关键帧（最多 N 帧）")
+    frames.add_argument('--frame-output', metavar='SPEC',
+                        help="帧的输出格式：格式[:长边][:q质量]，如 jpeg:320:q85（默认 --image-format 原尺寸）")
+    frames.add_argument('--contact-sheet', nargs='?', type=int, const=0, metavar='COLS',
+                        help="另外把各帧拼成一张联系表，可指定列数（默认自动）")
+
+    resume = parser.add_argument_group("批次清单")
+    resume.add_argument('--manifest', metavar='FILE',
+                        help="批次清单文件（默认自动写在用户缓存目录，全部成功后删除）")
+    resume.add_argument('--resume', nargs='?', const='latest', metavar='FILE',
+                        help="继续中断或有失败的批次，只重做未完成的文件；不指定文件时继续最近的一个")
+
+    watch = parser.add_argument_group("监视模式")
+    watch.add_argument('-w', '--watch', action='store_true',
+                       help="持续监视输入目录，新文件写完后自动转换（需要 -o，Ctrl+C 退出）")
+    watch.add_argument('--settle', type=float, default=2.0,
+                       help="文件大小和修改时间保持不变多少秒后才开始转换（默认 2）")
+    watch.add_argument('--poll-interval', type=float, default=5.0, help="轮询模式下扫描目录的间隔秒数（默认 5）")
+    watch.add_argument('--polling', action='store_true', help="不使用 inotify，始终轮询")
+    watch.add_argument('--state-file', help="监视模式的状态索引文件（默认位于用户缓存目录）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.gui:
+        # 只有启动界面时才导入 tkinter
+        from gui_converter import main as gui_main
+        gui_main()
+        return 0
+
+    if not args.inputs and not args.resume:
+        build_parser().print_usage(sys.stderr)
+        print("错误：请指定输入文件、目录或通配符。", file=sys.stderr)
+        return 2
+
+    configure_logging(args.log_file)
+    configure_metrics(args.metrics)
+    from .batch import convert_files, collect_inputs
+    from .cache import ConversionCache
+    from .probe import ProbeIndex, describe_info
+    if args.info:
+        with ProbeIndex() as index:
+            files = collect_inputs(args.inputs, args.kind, args.recursive)
+            for path, info in index.probe_many(files).items():
+                print(f"{path}\t{describe_info(info)}")
+        return 0 if files else 2
+    try:
+        parse_ops(args.ops)
+        if args.outputs:
+            parse_outputs(args.outputs)
+        video_frames = _video_frames(args)
+        if args.frame_output:
+            parse_outputs([args.frame_output])
+    except ValueError as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 2
+    cache = None if args.no_cache else ConversionCache(args.cache_file)
+    probe = None if args.no_probe else ProbeIndex()
+    video_encode = _video_encode(args)
+    if video_encode is not None:
+        try:
+            codec = resolve_video_encode(video_encode)['codec']
+        except ValueError as e:
+            print(f"错误：{e}", file=sys.stderr)
+            return 2
+        if encoder_for(codec) is None:
+            print(f"错误：当前 ffmpeg 不支持 {codec} 编码。", file=sys.stderr)
+            return 2
+        print(describe_estimate(video_encode), file=sys.stderr)
+    audio_encode = _audio_encode(args)
+    if audio_encode is not None:
+        try:
+            resolve_audio_encode(audio_encode)
+        except ValueError as e:
+            print(f"错误：{e}", file=sys.stderr)
+            return 2
+    options = dict(kind=args.kind, image_format=args.image_format, audio_format=args.audio_format,
+                   output_dir=args.output_dir, recursive=args.recursive, max_workers=args.workers,
+                   io_workers=args.io_workers, audio_only=args.audio_only,
+                   stream_copy=False if args.no_stream_copy else None, video_format=args.video_format,
+                   cache=cache, image_quality=args.quality, max_size=args.max_size,
+                   memory_limit=args.memory_limit << 20 if args.memory_limit else None,
+                   video_encode=video_encode, image_ops=args.ops, image_outputs=args.outputs,
+                   segment_workers=args.segment_workers, probe=probe, dedup=args.dedup,
+                   audio_encode=audio_encode, video_frames=video_frames, frame_output=args.frame_output)
+
+    def report(result):
+        if args.json:
+            print(json.dumps(result.to_dict(), ensure_ascii=False), flush=True)
+        elif result.ok:
+            outputs = ", ".join(result.outputs) or result.note or "-"
+            status = "跳过" if result.cached else "完成"
+            print(f"{status}  {result.input_path} -> {outputs}", flush=True)
+        else:
+            print(f"失败  {result.input_path}: {result.error}", file=sys.stderr, flush=True)
+
+    if args.watch:
+        return _watch(args, options, report)
+
+    from .manifest import BatchManifest, new_manifest_path
+    if args.resume:
+        manifest = _find_manifest(args.resume)
+        if manifest is None:
+            return 0 if args.resume == 'latest' else 2
+        from .manifest import resume_batch
+        overrides = {k: v for k, v in (('max_workers', args.workers), ('io_workers', args.io_workers)) if v}
+        results = resume_batch(manifest, callback=report, cache=cache, probe=probe, **overrides)
+    else:
+        manifest = args.manifest or new_manifest_path()
+        results = convert_files(args.inputs, callback=report, manifest=manifest, **options)
+    if cache:
+        cache.close()
+    if probe:
+        probe.close()
+
+    # 自动生成的清单在全部完成后删除；有失败时保留，提示可以继续
+    unfinished = []
+    if os.path.exists(manifest):
+        unfinished = BatchManifest.load(manifest).remaining()
+        if not unfinished and not args.manifest and (args.resume is None or args.resume == 'latest'):
+            os.remove(manifest)
+    if not results:
+        if args.resume:
+            print("该批次已全部完成。", file=sys.stderr)
+            return 0
+        print("没有找到可转换的文件。", file=sys.stderr)
+        return 2
+    failed = sum(1 for r in results if not r.ok)
+    cached = sum(1 for r in results if r.cached)
+    if not args.json:
+        print(f"共 {len(results)} 个文件，成功 {len(results) - failed} 个"
+              f"（其中 {cached} 个命中缓存），失败 {failed} 个。", file=sys.stderr)
+        if unfinished:
+            print(f"有 {len(unfinished)} 个文件未完成，可用 --resume \"{manifest}\" 重试。", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def _video_encode(args):
+    """命令行中的视频编码参数，都没指定时返回 None（使用默认组合）。"""
+    overrides = {'codec': args.video_codec, 'preset': args.preset, 'crf': args.crf,
+                 'bitrate': args.video_bitrate, 'threads': args.threads}
+    if args.video_profile is None and all(v is None for v in overrides.values()):
+        return None
+    return {'profile': args.video_profile, **{k: v for k, v in overrides.items() if v is not None}}
+
+
+def _audio_encode(args):
+    """命令行中的音频编码参数，都没指定时返回 None（保持源文件的设置）。"""
+    audio_encode = {k: v for k, v in (('bitrate', args.audio_bitrate), ('sample_rate', args.sample_rate),
+                                      ('channels', args.channels), ('normalize', args.normalize))
+                    if v is not None}
+    return audio_encode or None
+
+
+def _video_frames(args):
+    """命令行中的抽帧参数，没有指定 --frames 时返回 None（视频分离音频）。"""
+    if args.frames is None:
+        if args.contact_sheet is not None or args.frame_output:
+            raise ValueError("--contact-sheet、--frame-output 需要同时指定 --frames")
+        return None
+    return {**resolve_frames(args.frames), 'sheet': args.contact_sheet}
+
+
+def _find_manifest(resume):
+    """--resume 的参数：'latest' 表示默认目录中最近的未完成批次。"""
+    if resume != 'latest':
+        if not os.path.isfile(resume):
+            print(f"错误：批次清单不存在: {resume}", file=sys.stderr)
+            return None
+        return resume
+    from .manifest import find_unfinished
+    found = find_unfinished()
+    if not found:
+        print("没有未完成的批次。", file=sys.stderr)
+        return None
+    return found[0].path
+
+
+def _watch(args, options, report):
+    from .watch import watch_folders
+    if not args.output_dir:
+        print("错误：监视模式需要用 -o 指定输出目录。", file=sys.stderr)
+        return 2
+    print(f"正在监视 {', '.join(args.inputs)}，按 Ctrl+C 退出。", file=sys.stderr)
+    # 监视模式逐个处理新写完的文件，没有可以去重的“同一批”
+    watch_options = {k: v for k, v in options.items() if k != 'dedup'}
+    try:
+        watch_folders(args.inputs, callback=report, settle=args.settle, poll_interval=args.poll_interval,
+                      use_inotify=not args.polling, state_path=args.state_file, **watch_options)
+    except ValueError as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if options['cache']:
+            options['cache'].close()
+        if options['probe']:
+            options['probe'].close()
+    return 0
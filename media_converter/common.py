@@ -0,0 +1,174 @@
+"""
+公共常量与小工具：支持的扩展名、输出路径规则、异常类型、日志配置。
+"""
+import os
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+RAW_EXTS = ['.cr2', '.nef', '.arw', '.raw', '.raf', '.rw2', '.orf', '.dng']
+IMAGE_EXTS = RAW_EXTS + ['.jpeg', '.jpg', '.png', '.tiff', '.tif', '.bmp', '.gif', '.webp']
+VIDEO_EXTS = ['.mp4', '.mov', '.avi', '.mkv', '.flv', '.wmv']
+AUDIO_EXTS = ['.mp3', '.wav', '.aac', '.flac', '.ogg', '.m4a']
+
+IMAGE_FORMATS = ["jpeg", "png", "tiff", "bmp", "gif", "webp"]
+AUDIO_FORMATS = ["mp3", "wav", "aac", "flac", "ogg", "m4a"]
+# 图片质量：full 完整解码，proxy 快速预览
+IMAGE_QUALITIES = ["full", "proxy"]
+
+# 各类任务对应的输入扩展名
+KIND_EXTS = {'image': IMAGE_EXTS, 'video': VIDEO_EXTS, 'audio': AUDIO_EXTS}
+
+# 视频没有音轨时 separate_audio_from_video 返回的占位值
+NO_AUDIO = "无音频"
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# 进程的 umask：os.umask 只能在设置的同时读取旧值，所以在导入时（还没有其它线程）读取一次，
+# 之后不再修改，避免与其它线程中新建的文件相互影响
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+# 当前线程中的任务可以使用的 CPU 线程数，见 cpu_share()
+_local = threading.local()
+
+
+class ConversionError(Exception):
+    """
+    转换失败时抛出，path 为出错的输入文件。
+    """
+    def __init__(self, path, message):
+        super().__init__(message)
+        self.path = path
+
+    def __reduce__(self):
+        # 保证能在进程池的进程间传递
+        return type(self), (self.path, str(self))
+
+
+def output_path(input_path, output_dir=None, ext='', suffix=''):
+    """
+    计算输出文件路径：指定了 output_dir 时放在该目录，否则与原文件相同目录。
+    """
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    if output_dir:
+        return os.path.join(output_dir, f"{base_name}{suffix}.{ext}")
+    return f"{os.path.splitext(input_path)[0]}{suffix}.{ext}"
+
+
+def output_conflicts(files, output_dir=None):
+    """
+    同一类文件中输出文件名相互冲突的文件：输出路径只由文件名（不含扩展名）和输出目录决定，
+    如 tone.flac、tone.wav 都会输出为 tone.mp3。返回 {冲突的文件: 先占用该文件名的文件}，
+    每组只保留第一个文件，其余文件由调用者报告为失败，避免相互覆盖。
+    """
+    owners = {}
+    conflicts = {}
+    for f in files:
+        directory = os.path.abspath(output_dir or os.path.dirname(f) or '.')
+        key = os.path.normcase(os.path.join(directory, os.path.splitext(os.path.basename(f))[0]))
+        if key in owners:
+            conflicts[f] = owners[key]
+        else:
+            owners[key] = f
+    return conflicts
+
+
+def conflict_message(owner):
+    """output_conflicts 中被跳过的文件的错误信息。"""
+    return f"输出文件名与 {os.path.basename(owner)} 的输出相同，已跳过以免相互覆盖（可改名或分开输出目录）"
+
+
+def partial_path(path):
+    """
+    新建输出文件写入过程中使用的临时文件并返回其路径：同目录下的隐藏文件，
+    形如 .名称.随机串.part.扩展名，保留原扩展名（编码器据此判断格式）。
+    每次调用得到不同的文件，同时写同一个输出的任务不会争用同一个临时文件。
+    """
+    directory, name = os.path.split(path)
+    stem, ext = os.path.splitext(name)
+    fd, tmp = tempfile.mkstemp(dir=directory or '.', prefix=f".{stem}.", suffix=f".part{ext}")
+    os.close(fd)
+    # mkstemp 建立的文件只有所有者可读写，改成与普通新建文件相同的权限
+    os.chmod(tmp, 0o666 & ~_UMASK)
+    return tmp
+
+
+def is_partial_output(path):
+    """是否为 partial_path 生成的临时文件（中断后残留的半成品）。"""
+    name = os.path.basename(path)
+    return name.startswith('.') and os.path.splitext(name)[0].endswith('.part')
+
+
+@contextmanager
+def atomic_output(path):
+    """
+    先写到临时文件，成功后原子地重命名为 path；出错时删除临时文件。
+    程序中途崩溃时最终路径上不会留下写了一半的文件。
+
+        with atomic_output(out_path) as tmp:
+            imageio.imsave(tmp, rgb)
+    """
+    tmp = partial_path(path)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def cpu_share(threads):
+    """
+    在 with 块内把当前线程中任务可用的 CPU 线程数设为 threads（由调度器在 CPU 通道中设置），
+    编码器、分段编码和抽帧据此确定线程数和并发数，多个任务同时运行时不会超出 CPU 核心数。
+    """
+    previous = getattr(_local, 'threads', None)
+    _local.threads = max(1, int(threads))
+    try:
+        yield
+    finally:
+        _local.threads = previous
+
+
+def cpu_threads():
+    """当前任务可用的 CPU 线程数；不在调度器的 CPU 通道中执行时返回 None（不限制）。"""
+    return getattr(_local, 'threads', None)
+
+
+def file_fingerprint(path):
+    """文件的 (大小, 修改时间 ns)，用于判断文件是否改动过；文件不存在时抛出 OSError。"""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def detect_kind(path):
+    """
+    按扩展名判断文件类型，返回 'image' / 'video' / 'audio'，不支持时返回 None。
+    """
+    ext = os.path.splitext(path)[1].lower()
+    for kind, exts in KIND_EXTS.items():
+        if ext in exts:
+            return kind
+    return None
+
+
+def configure_logging(filename='media_converter.log', level=logging.INFO):
+    """
+    配置根日志写入 filename（已配置过时不重复添加）。
+    """
+    logging.basicConfig(filename=filename, level=level, format=LOG_FORMAT)
+
+
+def current_log_file():
+    """
+    返回根日志当前写入的文件路径，没有文件日志时返回 None（用于把配置传给子进程）。
+    """
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.FileHandler):
+            return handler.baseFilename
+    return None
@@ -0,0 +1,393 @@
+"""
+三类转换函数。失败时记录日志并抛出 ConversionError，不弹出任何对话框。
+
+rawpy、imageio、NumPy、moviepy 等较重的依赖在第一次用到时才导入：
+导入本模块（以及界面启动、只处理音频或视频的工作进程）不会加载图片解码库，
+能用 ffmpeg 直接处理的视频任务和全部音频任务也不会加载 moviepy。
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import RAW_EXTS, NO_AUDIO, ConversionError, output_path, atomic_output, cpu_threads
+from .imageops import resize_long_edge, parse_ops, apply_ops, fit_format, GEOMETRY_OPERATIONS
+from .metrics import stage, for_job
+from .renditions import parse_outputs
+from .ffmpeg_tools import (AUDIO_ENCODERS, run_ffmpeg, probe_streams, can_stream_copy_video,
+                           can_stream_copy_audio, transcode_audio_stream)
+from .encoding import (resolve_video_encode, check_container, encoder_for, encoder_params,
+                       encode_video_stream)
+from .segments import resolve_segment_workers, segment_seconds, encode_video_segmented
+from .audio import resolve_audio_encode, is_default_audio, transcode_audio
+from .frames import resolve_frames, sample_times, grab_frame, stream_frames, ContactSheet, SHEET_TILE
+
+logger = logging.getLogger(__name__)
+
+
+# 快速预览模式下，没有指定长边时可直接使用的内嵌缩略图最小长边
+PROXY_MIN_THUMB_EDGE = 1024
+
+
+def _orient_like_raw(img, flip):
+    """按 RAW 的 sizes.flip 旋转内嵌缩略图，使其方向与 postprocess 的结果一致。"""
+    import numpy as np
+    if flip == 3:
+        return np.rot90(img, 2)
+    if flip == 5:
+        return np.rot90(img, 1)
+    if flip == 6:
+        return np.rot90(img, -1)
+    return img
+
+
+def _read_raw_proxy(raw, max_size=None):
+    """
+    快速读取 RAW：内嵌 JPEG 足够大时直接解码缩略图，
+    否则使用半尺寸 + 线性插值的快速 postprocess。
+    """
+    import rawpy
+    import imageio
+    min_edge = max_size or PROXY_MIN_THUMB_EDGE
+    try:
+        thumb = raw.extract_thumb()
+    except (rawpy.LibRawNoThumbnailError, rawpy.LibRawUnsupportedThumbnailError):
+        thumb = None
+    if thumb is not None:
+        if thumb.format == rawpy.ThumbFormat.JPEG:
+            img = imageio.imread(thumb.data)
+        else:
+            img = thumb.data
+        if max(img.shape[:2]) >= min_edge:
+            return _orient_like_raw(img, raw.sizes.flip)
+    return raw.postprocess(half_size=True, demosaic_algorithm=rawpy.DemosaicAlgorithm.LINEAR,
+                           use_camera_wb=True)
+
+
+def _check_raw_memory(raw, quality, memory_limit):
+    """RAW 解码前按传感器尺寸估算内存，超过上限时直接报错。"""
+    from .streaming import FULL_DECODE_OVERHEAD, ImageTooLargeError
+    if not memory_limit:
+        return
+    need = raw.sizes.width * raw.sizes.height * 3 * FULL_DECODE_OVERHEAD
+    if quality == 'proxy':
+        need //= 4
+    if need > memory_limit:
+        raise ImageTooLargeError(
+            f"RAW 解码预计需要 {need >> 20} MB 内存，超过上限 {memory_limit >> 20} MB")
+
+
+def convert_image(input_file_path, output_format='jpeg', output_dir=None, quality='full', max_size=None,
+                  memory_limit=None, ops=None):
+    """
+    将各类图片/RAW 文件转换为指定格式，返回输出文件路径。
+      - quality: 'full' 完整解码；'proxy' 为快速预览，RAW 优先使用内嵌 JPEG 缩略图，
+        不够大时再用半尺寸快速解码。
+      - max_size: 输出长边的最大像素数，None 表示保持原尺寸。
+      - memory_limit: 单个任务允许使用的最大内存（字节）。多页 TIFF / 动图总是逐帧处理；
+        超过上限的大 TIFF 按条带流式处理，无法流式处理时报错而不是耗尽内存。
+      - ops: 解码后、编码前依次执行的图片操作（裁剪、缩放、转 sRGB、转 8 位、去透明通道），
+        格式见 imageops.parse_ops；max_size 在操作链之后生效。
+    无论是否指定 ops，编码前都会把像素转成输出格式能保存的形式（如 JPEG 去透明通道、转 8 位）。
+    """
+    spec = {'format': output_format, 'max_size': max_size, 'suffix': ''}
+    return convert_image_outputs(input_file_path, [spec], output_dir, quality=quality,
+                                 memory_limit=memory_limit, ops=ops)[0]
+
+
+def _encode_output(rgb, spec, out_path, ops=()):
+    """按一份输出参数缩放、执行剩余的逐像素操作并编码（多份输出时在线程中并行执行）。"""
+    import imageio
+    with stage('resize'):
+        img = resize_long_edge(rgb, spec['max_size'])
+    if ops:
+        with stage('ops'):
+            img = apply_ops(img, ops)
+    img = fit_format(img, spec['format'])
+    kwargs = {'quality': spec['quality']} if spec['quality'] else {}
+    with stage('encode'), atomic_output(out_path) as tmp:
+        imageio.imsave(tmp, img, **kwargs)
+    return out_path
+
+
+def convert_image_outputs(input_file_path, outputs, output_dir=None, quality='full', memory_limit=None,
+                          ops=None):
+    """
+    解码一次，写出多份输出，返回输出文件路径列表（与 outputs 顺序一致）。
+      - outputs: 每份输出的格式、长边、编码质量和文件名后缀，格式见 renditions.parse_outputs。
+      - quality / memory_limit / ops: 与 convert_image 相同；操作链只执行一次，结果供各份输出共用。
+    各份输出的缩放和编码在线程中并行执行；需要逐帧或按条带流式处理的输出单独处理。
+    """
+    import imageio
+    from .streaming import ImageTooLargeError, plan_image, convert_frames, convert_bands, read_first_frame
+    try:
+        outputs = parse_outputs(outputs)
+        ops = parse_ops(ops)
+        geometry = any(name in GEOMETRY_OPERATIONS for name, _args in ops)
+        transform = (lambda arr: apply_ops(arr, ops)) if ops else None
+        paths = [output_path(input_file_path, output_dir, o['ext'], suffix=o['suffix']) for o in outputs]
+        if len(set(paths)) != len(paths):
+            raise ValueError("多份输出的文件名重复，请为同一格式的输出设置不同的长边或后缀")
+        ext = os.path.splitext(input_file_path)[1]
+        # 判断是否是 RAW
+        if ext.lower() in RAW_EXTS:
+            import rawpy
+            sizes = [o['max_size'] for o in outputs]
+            with stage('decode'), rawpy.imread(input_file_path) as raw:
+                _check_raw_memory(raw, quality, memory_limit)
+                if quality == 'proxy':
+                    # 缩略图要够最大的一份输出使用
+                    rgb = _read_raw_proxy(raw, None if None in sizes else max(sizes))
+                else:
+                    rgb = raw.postprocess()
+            todo = list(range(len(outputs)))
+        else:
+            with stage('probe'):
+                plans = [plan_image(input_file_path, o['format'], o['max_size'], memory_limit) for o in outputs]
+            todo = []
+            for i, plan in enumerate(plans):
+                if plan == 'bands' and geometry:
+                    raise ImageTooLargeError("裁剪、缩放操作不支持按条带流式处理，请提高内存上限")
+                if plan not in ('frames', 'bands'):
+                    todo.append(i)
+                    continue
+                o = outputs[i]
+                # 流式处理时解码、缩放、编码交替进行，只记总耗时
+                with stage('stream'), atomic_output(paths[i]) as tmp:
+                    if plan == 'frames':
+                        convert_frames(input_file_path, tmp, o['format'], o['max_size'], transform=transform)
+                    else:
+                        convert_bands(input_file_path, tmp, o['format'], o['max_size'], writer=imageio.imsave,
+                                      transform=transform)
+                logger.info(f"图片流式转换成功: {input_file_path} -> {paths[i]}")
+            if not todo:
+                return paths
+            with stage('decode'):
+                if plans[todo[0]] == 'first':
+                    rgb = read_first_frame(input_file_path)
+                else:
+                    rgb = imageio.imread(input_file_path)
+
+        if ops and (geometry or len(todo) > 1):
+            # 裁剪坐标对应原图，且多份输出共用处理结果：先执行操作链再按各自的长边缩小
+            with stage('ops'):
+                rgb = apply_ops(rgb, ops)
+            ops = ()
+        if len(todo) == 1:
+            # 只有逐像素操作时先缩小，需要处理的像素更少
+            _encode_output(rgb, outputs[todo[0]], paths[todo[0]], ops)
+        else:
+            # 工作线程中不记录阶段耗时，并行部分整体记为 encode
+            with stage('encode'), ThreadPoolExecutor(min(len(todo), os.cpu_count() or 1)) as pool:
+                list(pool.map(lambda i: _encode_output(rgb, outputs[i], paths[i]), todo))
+        logger.info(f"图片转换成功: {input_file_path} -> {', '.join(paths[i] for i in todo)}")
+        return paths
+    except Exception as e:
+        logger.error(f"图片转换失败: {input_file_path}, 错误: {e}")
+        raise ConversionError(input_file_path, f"图片转换失败：{e}") from e
+
+
+def separate_audio_from_video(video_path, output_dir=None, export_only_audio=False,
+                              audio_format='mp3', video_format='mp4', stream_copy=None,
+                              video_encode=None, segment_workers=None, streams=None):
+    """
+    分离视频中的音频与画面，返回 (无声视频路径或 None, 音频路径或 NO_AUDIO)。
+      - export_only_audio = True 则不输出“无声视频”。
+      - audio_format / video_format 分别指定音频和视频封装格式（如 mp3、wav，mp4、mov 等）
+      - stream_copy: 使用 ffmpeg 流拷贝(-c copy)直接重新封装，不解码、不重新编码。
+        None（默认）表示目标封装格式兼容源编码时自动启用，否则重新编码；
+        False 表示始终重新编码。
+      - 音频总是由 ffmpeg 一次性直接写成 audio_format，不经过中间 WAV。
+      - video_encode: 需要重新编码时使用的编码参数（编码组合名或参数 dict，见 encoding 模块），
+        None 表示默认组合（h264 medium）。
+      - segment_workers: 长视频重新编码时按关键帧分段、并行编码的并发数（见 segments 模块），
+        None 或 1 表示不分段，0 表示使用全部 CPU 核心；分段编码期间音频同时提取。
+      - streams: 已有的流信息（probe_streams() 的结果或探测索引中的 info），给出时不再重新探测。
+    """
+    clip = None
+    try:
+        audio_out = output_path(video_path, output_dir, audio_format, suffix='_extracted_audio')
+        video_out = output_path(video_path, output_dir, video_format, suffix='_no_audio')
+        if not export_only_audio:
+            # 先检查编码参数，避免写完音频后才发现视频无法输出
+            settings = resolve_video_encode(video_encode)
+            check_container(settings, video_format)
+
+        if streams is None:
+            try:
+                with stage('probe'):
+                    streams = probe_streams(video_path)
+            except Exception as e:
+                logger.warning(f"读取流信息失败，改用 moviepy 处理: {video_path}, 错误: {e}")
+
+        def get_clip():
+            nonlocal clip
+            if clip is None:
+                from moviepy import VideoFileClip
+                with stage('open'):
+                    clip = VideoFileClip(video_path)
+            return clip
+
+        def extract_audio():
+            if streams:
+                try:
+                    with stage('audio'), atomic_output(audio_out) as tmp:
+                        transcode_audio_stream(video_path, tmp, audio_format, src_codec=streams['audio'],
+                                               stream_copy=stream_copy is not False)
+                    return
+                except Exception as e:
+                    logger.warning(f"ffmpeg 提取音频失败，改用 moviepy: {video_path}, 错误: {e}")
+            # 导出音频
+            codec = AUDIO_ENCODERS.get(audio_format.lower(), audio_format.lower())
+            audio_clip = get_clip().audio
+            with stage('audio'), atomic_output(audio_out) as tmp:
+                audio_clip.write_audiofile(tmp, codec=codec)
+
+        copy_video = bool(streams) and stream_copy is not False and \
+            can_stream_copy_video(video_path, streams['video'], video_format)
+        workers = resolve_segment_workers(segment_workers)
+        if cpu_threads():
+            # 调度器为该任务预留的核心数少于并发数时（通道并发数较小）减少并发，编码线程总数不超过核心数
+            workers = min(workers, cpu_threads())
+        seconds = None
+        if streams and not export_only_audio and not copy_video:
+            seconds = segment_seconds(streams['duration'], workers)
+
+        has_audio = streams['audio'] is not None if streams else get_clip().audio is not None
+        with ThreadPoolExecutor(1) as background:
+            audio_job = None
+            if has_audio and seconds:
+                # 分段编码视频期间在后台线程中提取音频（后台线程中的阶段耗时不单独记录）
+                audio_job = background.submit(for_job(extract_audio))
+            elif has_audio:
+                extract_audio()
+            else:
+                audio_out = NO_AUDIO
+
+            # 如仅要音频，则不输出无声视频
+            if not export_only_audio:
+                copied = False
+                if copy_video:
+                    try:
+                        with stage('video_copy'), atomic_output(video_out) as tmp:
+                            run_ffmpeg(['-i', video_path, '-map', '0:v:0', '-an', '-c:v', 'copy', tmp])
+                        copied = True
+                    except Exception as e:
+                        logger.warning(f"视频流拷贝失败，改为重新编码: {video_path}, 错误: {e}")
+                if not copied:
+                    if streams and seconds:
+                        with stage('video_encode'), atomic_output(video_out) as tmp:
+                            encode_video_segmented(video_path, tmp, settings, video_format, workers, seconds)
+                    elif streams:
+                        # ffmpeg 直接解码、编码，不经过 Python 逐帧传递
+                        with stage('video_encode'), atomic_output(video_out) as tmp:
+                            encode_video_stream(video_path, tmp, settings, video_format)
+                    else:
+                        clip_no_audio = get_clip().without_audio()
+                        with stage('video_encode'), atomic_output(video_out) as tmp:
+                            clip_no_audio.write_videofile(tmp, codec=encoder_for(settings['codec']), audio=False,
+                                                          ffmpeg_params=encoder_params(settings, video_format))
+                        clip_no_audio.close()
+            if audio_job is not None:
+                audio_job.result()
+
+        logger.info(f"分离音频成功: {video_path} -> {audio_out}, {video_out}")
+        return video_out if not export_only_audio else None, audio_out
+    except Exception as e:
+        logger.error(f"分离音频失败: {video_path}, 错误: {e}")
+        raise ConversionError(video_path, f"分离音频失败：{e}") from e
+    finally:
+        if clip is not None:
+            clip.close()
+
+
+def extract_video_frames(video_path, output_dir=None, frames='count', output='jpeg', streams=None):
+    """
+    从视频中抽帧并写成图片，返回输出文件路径列表（各帧按时间顺序，生成联系表时联系表在最后）。
+      - frames: 抽帧方式（见 frames.resolve_frames），如 'count:12'、'interval:10'、'keyframes'，
+        或 {'mode': 'count', 'value': 12, 'sheet': 0}；sheet 不为 None 时另外输出一张联系表。
+      - output: 帧的输出格式，与 convert_image_outputs 的一份输出相同（如 'jpeg'、'webp:640:q80'）。
+        各帧命名为 原文件名_frame_0001[后缀].格式，联系表为 原文件名_contact_sheet.格式。
+      - streams: 已有的流信息（probe_streams() 的结果或探测索引中的 info），给出时不再重新探测。
+    按时间点抽帧时只解码各时间点所在的 GOP，各时间点并行抽取；只取关键帧时不解码其余帧。
+    """
+    try:
+        settings = resolve_frames(frames)
+        spec = parse_outputs([output])[0]
+        if streams is None:
+            with stage('probe'):
+                streams = probe_streams(video_path)
+        if streams['video'] is None:
+            raise ValueError("文件中没有视频流")
+        times = sample_times(settings, streams['duration'])
+        sheet = ContactSheet(settings['sheet']) if settings['sheet'] is not None else None
+
+        def save(index, frame):
+            path = output_path(video_path, output_dir, spec['ext'],
+                               suffix=f"_frame_{index + 1:04d}{spec['suffix']}")
+            _encode_output(frame, spec, path)
+            return path
+
+        def grab(index):
+            # 工作线程中只返回缩小后的联系表格子，不保留整帧
+            frame = grab_frame(video_path, times[index], spec['max_size'])
+            if frame is None:
+                return None, None
+            return save(index, frame), resize_long_edge(frame, SHEET_TILE) if sheet else None
+
+        paths = []
+        with stage('frames'):
+            if times is not None:
+                # 在调度器的 CPU 通道中只用该任务分到的线程数，多个抽帧任务同时运行时不超过核心数
+                with ThreadPoolExecutor(min(len(times), cpu_threads() or os.cpu_count() or 1)) as pool:
+                    for i, (path, tile) in enumerate(pool.map(for_job(grab), range(len(times)))):
+                        if path is None:
+                            continue  # 时间点超出了最后一帧
+                        paths.append(path)
+                        if sheet:
+                            sheet.add(i, tile)
+            else:
+                for i, frame in enumerate(stream_frames(video_path, settings, spec['max_size'])):
+                    paths.append(save(i, frame))
+                    if sheet:
+                        sheet.add(i, frame)
+        if not paths:
+            raise ValueError("没有抽取到任何帧")
+        if sheet:
+            sheet_path = output_path(video_path, output_dir, spec['ext'], suffix='_contact_sheet')
+            with stage('sheet'):
+                _encode_output(sheet.build(), {**spec, 'max_size': None}, sheet_path)
+            paths.append(sheet_path)
+        logger.info(f"抽帧成功: {video_path} -> {len(paths) - bool(sheet)} 帧"
+                    f"{'，联系表 ' + paths[-1] if sheet else ''}")
+        return paths
+    except Exception as e:
+        logger.error(f"抽帧失败: {video_path}, 错误: {e}")
+        raise ConversionError(video_path, f"抽帧失败：{e}") from e
+
+
+def convert_audio_format(audio_path, output_format='mp3', output_dir=None, src_codec=None, audio_encode=None):
+    """
+    用 ffmpeg 对音频重新编码，例如转mp3、wav等，返回输出文件路径。
+    src_codec 为源音频编码（来自探测结果），能直接封装进目标格式时用 ffmpeg 流拷贝，不重新编码。
+    audio_encode 为码率、采样率、声道数和响度归一化参数（见 audio.resolve_audio_encode），
+    指定了任何一项时总是重新编码。
+    """
+    try:
+        settings = resolve_audio_encode(audio_encode)
+        output_file = output_path(audio_path, output_dir, output_format)
+        if is_default_audio(settings) and can_stream_copy_audio(src_codec, output_format):
+            try:
+                with stage('audio_copy'), atomic_output(output_file) as tmp:
+                    run_ffmpeg(['-i', audio_path, '-map', '0:a:0', '-vn', '-c:a', 'copy', tmp])
+                logger.info(f"音频转换成功（流拷贝）: {audio_path} -> {output_file}")
+                return output_file
+            except Exception as e:
+                logger.warning(f"音频流拷贝失败，改为重新编码: {audio_path}, 错误: {e}")
+        with stage('encode'), atomic_output(output_file) as tmp:
+            gain = transcode_audio(audio_path, tmp, output_format, settings)
+        note = f"，归一化增益 {gain:+.1f} dB" if gain is not None else ""
+        logger.info(f"音频转换成功: {audio_path} -> {output_file}{note}")
+        return output_file
+    except Exception as e:
+        logger.error(f"音频转换失败: {audio_path}, 错误: {e}")
+        raise ConversionError(audio_path, f"音频转换失败：{e}") from e
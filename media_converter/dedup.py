@@ -0,0 +1,111 @@
+"""
+按内容去重：同一批中内容相同、名字不同的文件（如多次备份的存储卡）只转换一次，
+其余文件直接复用转换结果（硬链接或复制到各自的输出文件名）。
+
+判断内容相同分三步，越往后越慢、需要比较的文件越少：
+  1. 文件大小相同；
+  2. 开头和结尾各 64 KB 的哈希相同（小文件此时已读完整个文件）；
+  3. 完整内容哈希相同。
+"""
+import os
+import shutil
+import logging
+
+from .common import atomic_output
+from .cache import file_hash, partial_hash, PARTIAL_BYTES
+from .jobs import ConversionResult
+
+logger = logging.getLogger(__name__)
+
+# 重复文件的输出：link 硬链接（不支持时改为复制），copy 复制
+DEDUP_MODES = ('link', 'copy')
+
+
+def _group_by(paths, key):
+    groups = {}
+    for p in paths:
+        try:
+            k = key(p)
+        except OSError as e:
+            logger.warning(f"读取文件失败，不参与去重: {p}, 错误: {e}")
+            continue
+        groups.setdefault(k, []).append(p)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def find_duplicates(paths, cache=None):
+    """
+    找出内容相同的文件，返回分组列表（每组至少两个路径，组内保持输入顺序）。
+    cache 为 ConversionCache 时完整哈希使用并写入其中的哈希记录（之后查询缓存时不必再算一遍）。
+    """
+    full = cache.content_hash if cache else file_hash
+    duplicates = []
+    for same_size in _group_by(paths, os.path.getsize):
+        size = os.path.getsize(same_size[0])
+        for same_partial in _group_by(same_size, lambda p: partial_hash(p, size)):
+            if size <= 2 * PARTIAL_BYTES:
+                duplicates.append(same_partial)
+            else:
+                duplicates.extend(_group_by(same_partial, full))
+    # 按第一次出现的位置排序，结果与输入顺序无关的部分保持稳定
+    order = {p: i for i, p in enumerate(paths)}
+    return sorted((sorted(g, key=order.get) for g in duplicates), key=lambda g: order[g[0]])
+
+
+def split_duplicates(paths, cache=None):
+    """返回 (需要转换的路径列表, {保留的文件: [与之内容相同的其他文件]})。"""
+    copies = {}
+    skip = set()
+    for group in find_duplicates(paths, cache):
+        copies[group[0]] = group[1:]
+        skip.update(group[1:])
+    return [p for p in paths if p not in skip], copies
+
+
+def duplicate_output(source_input, output, duplicate, output_dir=None):
+    """
+    source_input 的输出文件 output 对应到重复文件 duplicate 时的路径：
+    文件名中的原文件名部分换成 duplicate 的文件名，目录规则与 output_path 相同。
+    """
+    stem = os.path.splitext(os.path.basename(source_input))[0]
+    name = os.path.basename(output)
+    if not name.startswith(stem):
+        raise ValueError(f"无法对应输出文件名: {output}")
+    new_name = os.path.splitext(os.path.basename(duplicate))[0] + name[len(stem):]
+    return os.path.join(output_dir or os.path.dirname(duplicate), new_name)
+
+
+def link_or_copy(src, dst, mode='link'):
+    """把 src 硬链接（mode 为 link 且文件系统支持时）或复制到 dst，返回实际使用的方式。"""
+    with atomic_output(dst) as tmp:
+        if mode == 'link':
+            try:
+                os.remove(tmp)  # 临时文件名已由 atomic_output 占用，硬链接需要先让出
+                os.link(src, tmp)
+                return 'link'
+            except OSError:
+                pass  # 跨分区、FAT 存储卡等不支持硬链接
+        shutil.copy2(src, tmp)
+    return 'copy'
+
+
+def replicate_result(result, duplicate, output_dir=None, mode='link'):
+    """
+    把保留文件的转换结果（ConversionResult）复用到内容相同的 duplicate，返回 duplicate 的结果，不抛出异常。
+    """
+    if not result.ok:
+        return ConversionResult(duplicate, result.kind, error=result.error)
+    try:
+        outputs = []
+        for out in result.outputs:
+            target = duplicate_output(result.input_path, out, duplicate, output_dir)
+            # 输出就是输入本身（如音频已是目标格式、未指定输出目录）时不能用另一个文件替换它
+            if os.path.abspath(target) not in (os.path.abspath(out), os.path.abspath(duplicate)):
+                link_or_copy(out, target, mode)
+            outputs.append(target)
+    except (OSError, ValueError) as e:
+        logger.error(f"复用转换结果失败: {duplicate}, 错误: {e}")
+        return ConversionResult(duplicate, result.kind, error=f"复用转换结果失败：{e}")
+    logger.info(f"内容与 {result.input_path} 相同，复用转换结果: {duplicate}")
+    return ConversionResult(duplicate, result.kind, outputs,
+                            note=result.note or f"与 {os.path.basename(result.input_path)} 内容相同")
@@ -0,0 +1,236 @@
+"""
+视频重新编码参数：编码器、速度预设（ultrafast ~ slow）、CRF 或目标码率、线程数，
+以及几个常用组合（快速导入 / 默认 / 归档）和各预设速度、体积的粗略估计。
+
+参数统一用 dict 表示（可序列化，便于写入缓存键和批次清单）：
+  {'codec': 'h264', 'preset': 'medium', 'crf': 23, 'bitrate': None, 'threads': 0}
+接口中的 video_encode 参数可以是这样的 dict、编码组合名（见 VIDEO_PROFILES）或 None（默认组合）；
+dict 中可以带 'profile' 键，表示在该组合的基础上覆盖部分参数。
+"""
+import os
+import time
+import logging
+import tempfile
+
+from .common import cpu_threads
+from .ffmpeg_tools import ffmpeg_encoders, run_ffmpeg, probe_streams
+
+logger = logging.getLogger(__name__)
+
+# 编码名 -> 可用的 ffmpeg 编码器（按优先顺序，取第一个 ffmpeg 里有的）
+VIDEO_CODECS = {
+    'h264': ('libx264',),
+    'h265': ('libx265',),
+    'vp9': ('libvpx-vp9',),
+    'av1': ('libsvtav1', 'libaom-av1'),
+}
+
+# 编码名 -> 可以封装进的容器；None 表示任意容器（与原来固定使用 libx264 时一致）
+CODEC_CONTAINERS = {
+    'h264': None,
+    'h265': {'mp4', 'mov', 'mkv'},
+    'vp9': {'mp4', 'mkv', 'webm'},
+    'av1': {'mp4', 'mkv', 'webm'},
+}
+
+# 速度预设 -> (相对速度, 相对体积)，以 h264 medium、相同 CRF 为 1.0。
+# 为 x264 常见测试结果的粗略值，实际随片源变化，可用 measure_video_encode() 实测。
+SPEED_PRESETS = {
+    'ultrafast': (6.0, 1.9),
+    'superfast': (4.0, 1.4),
+    'veryfast': (2.5, 1.05),
+    'faster': (1.7, 1.05),
+    'fast': (1.3, 1.02),
+    'medium': (1.0, 1.0),
+    'slow': (0.6, 0.96),
+}
+
+# 编码器 -> (相对速度, 相对体积)，与 SPEED_PRESETS 相乘得到估计值（同等画质）
+ENCODER_FACTORS = {
+    'libx264': (1.0, 1.0),
+    'libx265': (0.25, 0.6),
+    'libvpx-vp9': (0.3, 0.65),
+    'libsvtav1': (0.3, 0.55),
+    'libaom-av1': (0.05, 0.55),
+}
+
+# 各编码器默认 CRF（数值含义不同，画质大致相当）
+DEFAULT_CRF = {
+    'libx264': 23,
+    'libx265': 28,
+    'libvpx-vp9': 31,
+    'libsvtav1': 35,
+    'libaom-av1': 30,
+}
+
+# 速度预设在非 x264/x265 编码器上的对应参数
+_VPX_SPEED = {'ultrafast': ('realtime', 8), 'superfast': ('realtime', 7), 'veryfast': ('good', 6),
+              'faster': ('good', 5), 'fast': ('good', 4), 'medium': ('good', 2), 'slow': ('good', 1)}
+_AOM_SPEED = {'ultrafast': 8, 'superfast': 7, 'veryfast': 6, 'faster': 5, 'fast': 4, 'medium': 3, 'slow': 2}
+_SVT_SPEED = {'ultrafast': 12, 'superfast': 11, 'veryfast': 10, 'faster': 9, 'fast': 8, 'medium': 6, 'slow': 4}
+
+# 常用组合；threads 为 0 表示自动：在调度器的 CPU 通道中使用该任务分到的线程数（见 common.cpu_share），
+# 否则由编码器按 CPU 核心数决定。
+# archive 的 CRF 28 是 x265 的默认值，画质与 x264 CRF 23 大致相当
+VIDEO_PROFILES = {
+    'fast_ingest': {'codec': 'h264', 'preset': 'ultrafast', 'crf': 23, 'bitrate': None, 'threads': 0},
+    'balanced': {'codec': 'h264', 'preset': 'medium', 'crf': 23, 'bitrate': None, 'threads': 0},
+    'archive': {'codec': 'h265', 'preset': 'slow', 'crf': 28, 'bitrate': None, 'threads': 0},
+}
+DEFAULT_PROFILE = 'balanced'
+
+PROFILE_LABELS = {
+    'fast_ingest': "快速导入（速度优先，文件较大）",
+    'balanced': "默认（h264 medium）",
+    'archive': "归档（h265 slow，体积优先）",
+}
+
+
+def encoder_for(codec):
+    """编码名对应的、当前 ffmpeg 可用的编码器；没有时返回 None。"""
+    available = ffmpeg_encoders()
+    for encoder in VIDEO_CODECS.get(codec, ()):
+        if encoder in available:
+            return encoder
+    return None
+
+
+def available_video_codecs():
+    """当前 ffmpeg 可用的编码名列表（如 ['h264', 'h265', 'vp9', 'av1']）。"""
+    return [codec for codec in VIDEO_CODECS if encoder_for(codec)]
+
+
+def resolve_video_encode(video_encode=None):
+    """
+    把 video_encode（None、组合名或 dict）整理成完整的参数 dict，参数不合法时抛出 ValueError。
+    crf 与 bitrate 只能二选一：给了 bitrate 时忽略 crf。
+    """
+    if video_encode is None:
+        video_encode = DEFAULT_PROFILE
+    if isinstance(video_encode, str):
+        video_encode = {'profile': video_encode}
+    overrides = {k: v for k, v in video_encode.items() if v is not None}
+    profile = overrides.pop('profile', None) or DEFAULT_PROFILE
+    if profile not in VIDEO_PROFILES:
+        raise ValueError(f"未知的编码组合: {profile}")
+    settings = {**VIDEO_PROFILES[profile], **overrides}
+    if settings['codec'] not in VIDEO_CODECS:
+        raise ValueError(f"不支持的视频编码: {settings['codec']}")
+    if settings['preset'] not in SPEED_PRESETS:
+        raise ValueError(f"未知的速度预设: {settings['preset']}")
+    if overrides.get('bitrate'):
+        settings['crf'] = None
+    elif 'crf' not in overrides and settings['codec'] != VIDEO_PROFILES[profile]['codec']:
+        # 换了编码器但没给 CRF：用该编码器自己的默认值
+        settings['crf'] = None
+    settings['threads'] = int(settings.get('threads') or 0)
+    return settings
+
+
+def check_container(settings, video_format):
+    """编码与封装格式不兼容时抛出 ValueError。"""
+    allowed = CODEC_CONTAINERS[settings['codec']]
+    if allowed is not None and video_format.lower() not in allowed:
+        raise ValueError(f"{settings['codec']} 编码不能封装进 {video_format}，"
+                         f"可用格式: {', '.join(sorted(allowed))}")
+
+
+def encoder_params(settings, video_format=None):
+    """除 -c:v 以外的编码参数（速度预设、CRF/码率、线程数、像素格式）。"""
+    encoder = encoder_for(settings['codec'])
+    if encoder is None:
+        raise ValueError(f"当前 ffmpeg 不支持 {settings['codec']} 编码")
+    preset = settings['preset']
+    params = []
+    if encoder in ('libx264', 'libx265'):
+        params += ['-preset', preset]
+    elif encoder == 'libvpx-vp9':
+        deadline, cpu_used = _VPX_SPEED[preset]
+        params += ['-deadline', deadline, '-cpu-used', str(cpu_used), '-row-mt', '1']
+    elif encoder == 'libaom-av1':
+        params += ['-cpu-used', str(_AOM_SPEED[preset]), '-row-mt', '1']
+    elif encoder == 'libsvtav1':
+        params += ['-preset', str(_SVT_SPEED[preset])]
+
+    if settings.get('bitrate'):
+        params += ['-b:v', str(settings['bitrate'])]
+    else:
+        params += ['-crf', str(settings['crf'] if settings['crf'] is not None else DEFAULT_CRF[encoder])]
+        if encoder in ('libvpx-vp9', 'libaom-av1'):
+            params += ['-b:v', '0']  # 这两个编码器只有 -b:v 0 时才是纯 CRF 模式
+    threads = settings['threads'] or cpu_threads()
+    if threads:
+        params += ['-threads', str(threads)]
+    # 与原来 moviepy 输出一致，使用兼容性最好的 yuv420p
+    params += ['-pix_fmt', 'yuv420p']
+    return params + container_params(settings, video_format)
+
+
+def container_params(settings, video_format):
+    """与封装格式相关的参数（编码和流拷贝拼接时都需要）。"""
+    if settings['codec'] == 'h265' and video_format and video_format.lower() in ('mp4', 'mov'):
+        return ['-tag:v', 'hvc1']  # 让 Apple 播放器识别 HEVC
+    return []
+
+
+def video_encode_args(settings, video_format=None):
+    """ffmpeg 输出端的视频编码参数，如 ['-c:v', 'libx264', '-preset', 'medium', '-crf', '23', ...]。"""
+    return ['-c:v', encoder_for(settings['codec']), *encoder_params(settings, video_format)]
+
+
+def encode_video_stream(src_path, out_path, settings, video_format=None, duration=None):
+    """
+    用一次 ffmpeg 调用把 src_path 的第一条视频流按 settings 重新编码到 out_path（不含音频）。
+    duration 给出时只编码开头这么多秒（用于实测）。
+    """
+    limit = ['-t', str(duration)] if duration else []
+    run_ffmpeg(['-i', src_path, *limit, '-map', '0:v:0', '-an', '-sn',
+                *video_encode_args(settings, video_format), out_path])
+
+
+# ------------------ 速度 / 体积估计 ------------------ #
+
+def estimate_video_encode(video_encode=None):
+    """
+    粗略估计 (相对速度, 相对体积)，以默认组合（h264 medium）为 1.0；
+    指定了目标码率时体积由码率决定，相对体积为 None。
+    """
+    settings = resolve_video_encode(video_encode)
+    encoder = encoder_for(settings['codec']) or VIDEO_CODECS[settings['codec']][-1]
+    speed, size = SPEED_PRESETS[settings['preset']]
+    codec_speed, codec_size = ENCODER_FACTORS[encoder]
+    speed *= codec_speed
+    size *= codec_size
+    crf = settings['crf'] if settings['crf'] is not None else DEFAULT_CRF[encoder]
+    # CRF 每增加 6，体积大约减半
+    size *= 2 ** ((DEFAULT_CRF[encoder] - crf) / 6)
+    return round(speed, 2), None if settings.get('bitrate') else round(size, 2)
+
+
+def describe_estimate(video_encode=None):
+    """估计值的文字说明，供界面和命令行显示。"""
+    speed, size = estimate_video_encode(video_encode)
+    size_text = "由目标码率决定" if size is None else f"约为默认的 {size * 100:.0f}%"
+    return f"编码速度约为默认的 {speed:g} 倍，文件体积{size_text}（粗略估计）"
+
+
+def measure_video_encode(src_path, video_encode=None, video_format='mp4', sample_seconds=5):
+    """
+    实际编码 src_path 开头 sample_seconds 秒，返回 dict：
+      - speed: 编码速度（相对实时播放的倍数）
+      - bitrate_kbps: 输出视频码率
+      - est_seconds / est_bytes: 按此推算整段视频的编码耗时和输出大小（时长未知时为 None）
+    """
+    settings = resolve_video_encode(video_encode)
+    duration = probe_streams(src_path).get('duration')
+    sample = min(sample_seconds, duration) if duration else sample_seconds
+    with tempfile.TemporaryDirectory(prefix='mc_encode_') as tmp_dir:
+        out = os.path.join(tmp_dir, f'sample.{video_format}')
+        start = time.perf_counter()
+        encode_video_stream(src_path, out, settings, video_format, duration=sample)
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        size = os.path.getsize(out)
+    return {'speed': round(sample / elapsed, 2),
+            'bitrate_kbps': round(size * 8 / sample / 1000, 1),
+            'est_seconds': round(duration * elapsed / sample, 1) if duration else None,
+            'est_bytes': int(size * duration / sample) if duration else None}
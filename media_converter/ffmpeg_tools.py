@@ -0,0 +1,218 @@
+"""
+ffmpeg 辅助函数：探测流信息、流拷贝判断、单次调用的音频提取/转码。
+"""
+import os
+import re
+import logging
+import platform
+import threading
+import subprocess
+from collections import deque
+from functools import lru_cache
+
+from .metrics import record_child_peak
+
+logger = logging.getLogger(__name__)
+
+# 封装格式 -> 可直接流拷贝(-c copy)进该容器的视频编码；None 表示任意编码均可
+VIDEO_COPY_CODECS = {
+    'mp4': {'h264', 'hevc', 'mpeg4', 'av1', 'vp9'},
+    'mov': {'h264', 'hevc', 'mpeg4', 'prores', 'mjpeg'},
+    'mkv': None,
+    'avi': {'mpeg4', 'h264', 'mjpeg', 'msmpeg4v3'},
+    'flv': {'h264', 'flv1'},
+    'wmv': {'wmv1', 'wmv2', 'wmv3', 'vc1'},
+}
+
+# 音频封装格式 -> 可直接流拷贝的音频编码
+AUDIO_COPY_CODECS = {
+    'mp3': {'mp3'},
+    'aac': {'aac'},
+    'm4a': {'aac', 'alac'},
+    'flac': {'flac'},
+    'ogg': {'vorbis', 'opus', 'flac'},
+    'wav': {'pcm_s16le'},
+}
+
+# 音频封装格式 -> 重新编码时使用的 ffmpeg 编码器
+AUDIO_ENCODERS = {
+    'mp3': 'libmp3lame',
+    'aac': 'aac',
+    'm4a': 'aac',
+    'flac': 'flac',
+    'ogg': 'libvorbis',
+    'wav': 'pcm_s16le',
+}
+
+# popen_ffmpeg 启动的进程保留的 stderr 末尾行数（失败时报告最后一行）
+STDERR_TAIL_LINES = 20
+
+# Windows 下调用 ffmpeg 时不弹出控制台窗口
+_CREATION_FLAGS = subprocess.CREATE_NO_WINDOW if platform.system() == 'Windows' else 0
+
+
+@lru_cache(maxsize=None)
+def ffmpeg_binary():
+    """
+    ffmpeg 可执行文件路径，查找规则与 moviepy.config 相同，第一次调用时才确定。
+    没有用环境变量 FFMPEG_BINARY 指定时直接取 imageio-ffmpeg 自带的 ffmpeg，
+    不必为此导入整个 moviepy（约需 1 秒）。
+    """
+    if os.getenv('FFMPEG_BINARY', 'ffmpeg-imageio') == 'ffmpeg-imageio':
+        try:
+            import imageio_ffmpeg
+            return imageio_ffmpeg.get_ffmpeg_exe()
+        except ImportError:
+            pass
+    from moviepy.config import FFMPEG_BINARY
+    return FFMPEG_BINARY
+
+
+class _FFmpegProcess(subprocess.Popen):
+    """
+    ffmpeg 子进程：支持 os.wait4 的系统上等待结束时顺便取得子进程的资源用量，
+    把它的峰值内存记到当前任务上（见 metrics.record_child_peak）。
+    """
+    def wait(self, timeout=None):
+        if timeout is None and self.returncode is None and hasattr(os, 'wait4'):
+            try:
+                _pid, status, usage = os.wait4(self.pid, 0)
+            except ChildProcessError:
+                pass  # 已被其他地方回收，交给 Popen.wait 处理
+            else:
+                self.returncode = os.waitstatus_to_exitcode(status)
+                record_child_peak(usage.ru_maxrss)
+        return super().wait(timeout)
+
+
+def run_ffmpeg(args):
+    """
+    调用 ffmpeg（与 moviepy 使用同一个可执行文件），失败时抛出 RuntimeError。
+    返回 subprocess.CompletedProcess（stdout / stderr 为文本）。
+    """
+    cmd = [ffmpeg_binary(), '-hide_banner', '-loglevel', 'error', '-y', *args]
+    with _FFmpegProcess(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace',
+                        creationflags=_CREATION_FLAGS) as proc:
+        stdout, stderr = proc.communicate()
+    if proc.returncode != 0:
+        lines = stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"ffmpeg 退出码 {proc.returncode}")
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+def _drain_stderr(pipe, tail):
+    # 一直读到 ffmpeg 退出，只保留末尾几行
+    with pipe:
+        for line in pipe:
+            tail.append(line)
+
+
+def popen_ffmpeg(args, **kwargs):
+    """
+    启动 ffmpeg 子进程但不等待结束（用于通过管道读写 PCM 数据），参数与 run_ffmpeg 相同；
+    kwargs 传给 subprocess.Popen（如 stdin / stdout）。结束后用 check_ffmpeg 检查，出错时用 stop_ffmpeg 结束。
+    stderr 由后台线程持续读取：损坏的文件每个数据包都可能输出一行错误，没人读时管道写满，
+    ffmpeg 会阻塞在写 stderr 上，调用者也就一直等不到 stdout 结束。
+    """
+    cmd = [ffmpeg_binary(), '-hide_banner', '-loglevel', 'error', '-y', *args]
+    proc = _FFmpegProcess(cmd, stderr=subprocess.PIPE, creationflags=_CREATION_FLAGS, **kwargs)
+    proc.stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+    proc.stderr_reader = threading.Thread(target=_drain_stderr, args=(proc.stderr, proc.stderr_tail),
+                                          daemon=True, name='ffmpeg-stderr')
+    proc.stderr_reader.start()
+    return proc
+
+
+def check_ffmpeg(proc):
+    """等待 popen_ffmpeg 启动的进程结束，失败时抛出 RuntimeError。"""
+    proc.wait()
+    proc.stderr_reader.join()
+    if proc.returncode != 0:
+        lines = b''.join(proc.stderr_tail).decode('utf-8', 'replace').strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"ffmpeg 退出码 {proc.returncode}")
+
+
+def stop_ffmpeg(proc, *pipes):
+    """出错时结束 popen_ffmpeg 启动的进程，关闭调用者使用的管道（stdin / stdout）并等待进程退出。"""
+    proc.kill()
+    for pipe in pipes:
+        try:
+            pipe.close()
+        except OSError:
+            pass  # stdin 中未写出的数据无法再写入
+    proc.wait()
+    proc.stderr_reader.join()
+
+
+def probe_streams(path):
+    """
+    只读取容器头（ffmpeg -i），返回
+    {'video': 视频编码或 None, 'audio': 音频编码或 None, 'duration': 时长（秒）或 None,
+     'width' / 'height': 视频分辨率或 None}。
+    """
+    proc = subprocess.run([ffmpeg_binary(), '-hide_banner', '-i', path],
+                          capture_output=True, text=True, errors='replace',
+                          creationflags=_CREATION_FLAGS)
+    if 'Input #0' not in proc.stderr:
+        lines = proc.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"无法读取文件：{path}")
+    streams = {'video': None, 'audio': None, 'duration': None, 'width': None, 'height': None}
+    m = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', proc.stderr)
+    if m:
+        h, mnt, sec = m.groups()
+        streams['duration'] = int(h) * 3600 + int(mnt) * 60 + float(sec)
+    for kind, codec, rest in re.findall(r'Stream #\d+:\d+.*?: (Video|Audio): (\w+)(.*)', proc.stderr):
+        kind = kind.lower()
+        # 跳过封面图之类的附加图片流
+        if kind == 'video' and 'attached pic' in rest:
+            continue
+        if streams[kind] is None:
+            streams[kind] = codec
+            size = re.search(r', (\d+)x(\d+)', rest) if kind == 'video' else None
+            if size:
+                streams['width'], streams['height'] = int(size.group(1)), int(size.group(2))
+    return streams
+
+
+@lru_cache(maxsize=None)
+def ffmpeg_encoders():
+    """ffmpeg 编译进来的视频编码器名称集合（只查询一次）。"""
+    try:
+        proc = subprocess.run([ffmpeg_binary(), '-hide_banner', '-encoders'], capture_output=True,
+                              text=True, errors='replace', creationflags=_CREATION_FLAGS)
+    except OSError as e:
+        logger.warning(f"查询 ffmpeg 编码器失败: {e}")
+        return frozenset()
+    return frozenset(re.findall(r'^\s*V\S*\s+(\S+)', proc.stdout, re.M))
+
+
+def can_stream_copy_video(src_path, codec, video_format):
+    """判断视频流能否不经解码直接封装进 video_format。"""
+    if not codec:
+        return False
+    if os.path.splitext(src_path)[1].lstrip('.').lower() == video_format.lower():
+        return True
+    allowed = VIDEO_COPY_CODECS.get(video_format.lower(), set())
+    return allowed is None or codec in allowed
+
+
+def can_stream_copy_audio(codec, audio_format):
+    """判断音频流能否不经解码直接封装进 audio_format。"""
+    return bool(codec) and codec in AUDIO_COPY_CODECS.get(audio_format.lower(), set())
+
+
+def transcode_audio_stream(src_path, audio_out, audio_format, src_codec=None, stream_copy=True):
+    """
+    用一次 ffmpeg 调用把 src_path 的第一条音轨写成 audio_format：
+    源编码与目标封装兼容时直接流拷贝，否则只解码一次并直接编码为目标格式（不生成中间 WAV）。
+    返回 True 表示使用了流拷贝。
+    """
+    if stream_copy and can_stream_copy_audio(src_codec, audio_format):
+        try:
+            run_ffmpeg(['-i', src_path, '-map', '0:a:0', '-vn', '-c:a', 'copy', audio_out])
+            return True
+        except Exception as e:
+            logger.warning(f"音频流拷贝失败，改为重新编码: {src_path}, 错误: {e}")
+    codec = AUDIO_ENCODERS.get(audio_format.lower(), audio_format.lower())
+    run_ffmpeg(['-i', src_path, '-map', '0:a:0', '-vn', '-c:a', codec, audio_out])
+    return False
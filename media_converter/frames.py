@@ -0,0 +1,205 @@
+"""
+视频抽帧：按时间间隔、只取关键帧或均匀抽取 N 帧，写成图片（格式同 convert_image），可选拼成联系表。
+
+抽帧方式用 dict 表示（可序列化，便于写入缓存键和批次清单）：
+  {'mode': 'count', 'value': 12, 'sheet': None}
+也可以用字符串（命令行 --frames）：count:12、interval:10、keyframes、keyframes:200。
+  - count: 均匀抽取 value 帧（取各等分区间的中点，避开片头片尾的黑场）；
+  - interval: 每隔 value 秒抽一帧；
+  - keyframes: 只取关键帧，value 为最多抽取的帧数（None 表示全部）。
+sheet 为联系表的列数，0 表示自动，None 表示不生成联系表。
+
+抽取指定时间点的帧时，ffmpeg 在输入端定位（-ss 放在 -i 之前）：先跳到该时间点之前的关键帧，
+只解码这一个 GOP 内需要的帧，各时间点由多个 ffmpeg 进程并行抽取，不解码整段视频。
+间隔小于 SEQUENTIAL_INTERVAL 时逐个定位反而要解码更多的帧，改为一次顺序解码并用 fps 滤镜抽帧。
+只取关键帧时解码器跳过全部非关键帧（-skip_frame nokey）。
+帧以 PPM（无压缩 RGB）经管道交给 Python，限制了长边时先由 ffmpeg 缩小，再按输出格式编码。
+"""
+import math
+import subprocess
+
+from .ffmpeg_tools import popen_ffmpeg, check_ffmpeg, stop_ffmpeg
+from .imageops import resize_long_edge
+
+FRAME_MODES = ('count', 'interval', 'keyframes')
+# 只写 count 时抽取的帧数
+DEFAULT_FRAME_COUNT = 12
+# 间隔小于此值（秒）时顺序解码，不再逐帧定位（常见视频的关键帧间隔为 2~10 秒）
+SEQUENTIAL_INTERVAL = 2.0
+# 联系表中每一格的长边像素、格间距和背景色
+SHEET_TILE = 320
+SHEET_GAP = 4
+SHEET_BACKGROUND = 32
+# 联系表最多的格数；帧数更多时均匀挑选
+SHEET_MAX_TILES = 100
+
+
+def resolve_frames(frames):
+    """
+    把抽帧方式（字符串或 dict）整理成完整的 dict，参数不合法时抛出 ValueError。
+    """
+    if isinstance(frames, str):
+        mode, _sep, value = frames.strip().partition(':')
+        frames = {'mode': mode, 'value': value.strip() or None}
+    settings = {'mode': None, 'value': None, 'sheet': None}
+    frames = dict(frames or {})
+    unknown = set(frames) - set(settings)
+    if unknown:
+        raise ValueError(f"未知的抽帧参数: {', '.join(sorted(unknown))}")
+    settings.update(frames)
+    mode = str(settings['mode'] or '').strip().lower()
+    if mode not in FRAME_MODES:
+        raise ValueError(f"不支持的抽帧方式: {settings['mode']}，可用: {', '.join(FRAME_MODES)}")
+    settings['mode'] = mode
+    value, sheet = settings['value'], settings['sheet']
+    try:
+        if mode == 'interval':
+            value = float(value) if value is not None else None
+            if value is None or value <= 0:
+                raise ValueError
+        elif value is not None:
+            value = int(value)
+            if value <= 0:
+                raise ValueError
+        if sheet is True:
+            sheet = 0
+        elif sheet is False:
+            sheet = None
+        elif sheet is not None:
+            sheet = int(sheet)
+            if sheet < 0:
+                raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError(f"抽帧参数错误: {frames}（如 count:12、interval:10、keyframes:200）") from None
+    if mode == 'count' and value is None:
+        value = DEFAULT_FRAME_COUNT
+    settings['value'], settings['sheet'] = value, sheet
+    return settings
+
+
+def sample_times(settings, duration):
+    """
+    需要逐个定位抽取的时间点（秒）；只取关键帧或间隔太小、应当顺序解码时返回 None。
+    """
+    mode, value = settings['mode'], settings['value']
+    if mode == 'keyframes' or (mode == 'interval' and value < SEQUENTIAL_INTERVAL):
+        return None
+    if not duration:
+        raise ValueError("无法获取视频时长，不能按时间点抽帧")
+    if mode == 'count':
+        return [duration * (i + 0.5) / value for i in range(value)]
+    return [i * value for i in range(math.ceil(duration / value))]
+
+
+def _scale_filter(max_size):
+    # 缩小到 max_size × max_size 的框内（只缩小不放大），保持宽高比
+    return (f"scale=w='min(iw,{max_size})':h='min(ih,{max_size})'"
+            f":force_original_aspect_ratio=decrease")
+
+
+def _read_ppm(fp):
+    """从管道读取一帧 PPM（P6），返回 (高, 宽, 3) 的 uint8 数组；管道结束时返回 None。"""
+    import numpy as np
+    fields = []
+    while len(fields) < 4:
+        line = fp.readline()
+        if not line:
+            if fields:
+                raise RuntimeError("解码输出不完整")
+            return None
+        fields += line.split(b'#')[0].split()
+    if fields[0] != b'P6' or fields[3] != b'255':
+        raise RuntimeError("无法解析解码输出")
+    width, height = int(fields[1]), int(fields[2])
+    data = fp.read(width * height * 3)
+    if len(data) != width * height * 3:
+        raise RuntimeError("解码输出不完整")
+    return np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+
+
+def iter_frames(input_args, filters=(), limit=None):
+    """
+    运行 ffmpeg（input_args 为输入端参数和输入，如 ['-ss', '10', '-i', path]）并逐帧返回 RGB 数组。
+    filters 为视频滤镜，limit 为最多输出的帧数；调用者提前结束迭代时结束 ffmpeg 进程。
+    """
+    output_args = ['-vf', ','.join(filters)] if filters else []
+    if limit:
+        output_args += ['-frames:v', str(limit)]
+    proc = popen_ffmpeg([*input_args, '-map', '0:v:0', '-an', '-sn', *output_args, '-fps_mode', 'passthrough',
+                         '-c:v', 'ppm', '-f', 'image2pipe', 'pipe:1'], stdout=subprocess.PIPE)
+    try:
+        while True:
+            frame = _read_ppm(proc.stdout)
+            if frame is None:
+                break
+            yield frame
+    except BaseException:
+        stop_ffmpeg(proc, proc.stdout)
+        raise
+    proc.stdout.close()
+    check_ffmpeg(proc)
+
+
+def grab_frame(path, seconds, max_size=None):
+    """
+    定位到 seconds 处抽取一帧（只解码该时间点所在 GOP 内的帧），返回 RGB 数组；
+    时间点超出视频末尾、没有帧输出时返回 None。调用者在多个线程中并行抽取，因此解码器只用一个线程。
+    """
+    filters = [_scale_filter(max_size)] if max_size else []
+    frames = iter_frames(['-ss', f'{seconds:.3f}', '-threads', '1', '-i', path], filters, limit=1)
+    return next(frames, None)
+
+
+def stream_frames(path, settings, max_size=None):
+    """
+    一次顺序读取整段视频的帧：只取关键帧（解码器跳过非关键帧），或间隔较小时用 fps 滤镜按间隔抽帧。
+    """
+    filters = []
+    if settings['mode'] == 'keyframes':
+        input_args = ['-skip_frame', 'nokey', '-i', path]
+    else:
+        input_args = ['-i', path]
+        filters.append(f"fps=1/{settings['value']:g}:round=down")
+    if max_size:
+        filters.append(_scale_filter(max_size))
+    limit = settings['value'] if settings['mode'] == 'keyframes' else None
+    return iter_frames(input_args, filters, limit)
+
+
+class ContactSheet:
+    """
+    收集缩小后的帧并拼成联系表（add 的 index 从 0 开始，可以乱序）。格数超过 SHEET_MAX_TILES 时
+    丢弃一半（只保留序号为偶数的帧），之后的帧也按同样的间隔保留，内存只与格数有关。
+    """
+    def __init__(self, columns=0):
+        self.columns = columns
+        self._tiles = {}
+        self._step = 1
+
+    def add(self, index, frame):
+        if index % self._step:
+            return
+        self._tiles[index] = resize_long_edge(frame, SHEET_TILE)
+        if len(self._tiles) > SHEET_MAX_TILES:
+            self._step *= 2
+            self._tiles = {i: t for i, t in self._tiles.items() if i % self._step == 0}
+
+    def build(self):
+        """按帧的顺序拼接，返回 RGB 数组；没有帧时返回 None。"""
+        import numpy as np
+        tiles = [self._tiles[i] for i in sorted(self._tiles)]
+        if not tiles:
+            return None
+        cell_h = max(t.shape[0] for t in tiles)
+        cell_w = max(t.shape[1] for t in tiles)
+        # 未指定列数时让整张表接近正方形
+        columns = self.columns or max(1, round(math.sqrt(len(tiles) * cell_h / cell_w)))
+        columns = min(columns, len(tiles))
+        rows = math.ceil(len(tiles) / columns)
+        sheet = np.full((rows * (cell_h + SHEET_GAP) + SHEET_GAP, columns * (cell_w + SHEET_GAP) + SHEET_GAP, 3),
+                        SHEET_BACKGROUND, dtype=np.uint8)
+        for i, tile in enumerate(tiles):
+            row, col = divmod(i, columns)
+            top, left = SHEET_GAP + row * (cell_h + SHEET_GAP), SHEET_GAP + col * (cell_w + SHEET_GAP)
+            sheet[top:top + tile.shape[0], left:left + tile.shape[1]] = tile
+        return sheet
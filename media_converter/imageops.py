@@ -0,0 +1,317 @@
+"""
+基于 NumPy 的图片处理，全部为向量运算，不含逐像素的 Python 循环。
+
+除缩放外还提供可在转换过程中串联执行的操作（见 parse_ops / apply_ops）：
+裁剪、缩放、转换到 sRGB、16 位转 8 位、去除透明通道。裁剪返回视图不复制数据，
+逐像素的运算按行分块处理，临时数组只有一块的大小。
+
+NumPy 在第一次处理像素时才导入：界面和命令行解析操作链（parse_ops）时不需要加载它。
+"""
+
+# 逐像素运算每次处理的行数（限制浮点临时数组的大小）
+ROW_BLOCK = 256
+
+# 源色彩空间 -> (转换到线性 sRGB 的矩阵, 传递函数)；矩阵由各自的原色计算，
+# ProPhoto（D50 白点）经 Bradford 色适应到 D65
+COLOR_SPACES = {
+    'linear': (None, 'linear'),
+    'adobe_rgb': (((1.3983557, -0.3983557, 0.0),
+                   (0.0, 1.0, 0.0),
+                   (0.0, -0.0429290, 1.0429290)), 2.19921875),
+    'display_p3': (((1.2249402, -0.2249402, 0.0),
+                    (-0.0420570, 1.0420570, 0.0),
+                    (-0.0196376, -0.0786360, 1.0982736)), 'srgb'),
+    'prophoto': (((2.0343675, -0.7276345, -0.3067331),
+                  (-0.2288268, 1.2317534, -0.0029266),
+                  (-0.0085584, -0.1532682, 1.1618266)), 'prophoto'),
+}
+
+# 输出格式 -> 支持的像素（不支持的在编码前自动转换）
+EIGHT_BIT_ONLY = {'jpeg', 'bmp', 'gif', 'webp'}
+NO_ALPHA = {'jpeg'}
+
+
+def _restore_dtype(arr, dtype):
+    """把浮点结果四舍五入并裁剪回原来的整数类型。"""
+    import numpy as np
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        np.rint(arr, out=arr)
+        np.clip(arr, info.min, info.max, out=arr)
+    return arr.astype(dtype, copy=False)
+
+
+def resize(img, out_h, out_w):
+    """
+    缩放到 (out_h, out_w)。缩小倍数 >= 2 时先做整数倍的块平均（等效 area 采样，避免锯齿），
+    剩余部分用双线性插值。
+    """
+    import numpy as np
+    h, w = img.shape[:2]
+    if (h, w) == (out_h, out_w):
+        return img
+    dtype = img.dtype
+    work = img
+    ky, kx = h // out_h, w // out_w
+    if ky >= 2 or kx >= 2:
+        ky, kx = max(ky, 1), max(kx, 1)
+        hh, ww = h // ky * ky, w // kx * kx
+        blocks = work[:hh, :ww].reshape(hh // ky, ky, ww // kx, kx, *work.shape[2:])
+        work = blocks.mean(axis=(1, 3), dtype=np.float32)
+        h, w = work.shape[:2]
+    if (h, w) != (out_h, out_w):
+        work = work.astype(np.float32, copy=False)
+        ys = np.clip((np.arange(out_h, dtype=np.float32) + 0.5) * (h / out_h) - 0.5, 0, h - 1)
+        xs = np.clip((np.arange(out_w, dtype=np.float32) + 0.5) * (w / out_w) - 0.5, 0, w - 1)
+        y0 = ys.astype(np.intp)
+        x0 = xs.astype(np.intp)
+        y1 = np.minimum(y0 + 1, h - 1)
+        x1 = np.minimum(x0 + 1, w - 1)
+        extra = (1,) * (work.ndim - 2)
+        wy = (ys - y0).reshape(-1, 1, *extra)
+        wx = (xs - x0).reshape(1, -1, *extra)
+        rows0 = work[y0]
+        rows1 = work[y1]
+        top = rows0[:, x0] * (1 - wx) + rows0[:, x1] * wx
+        bottom = rows1[:, x0] * (1 - wx) + rows1[:, x1] * wx
+        work = top * (1 - wy) + bottom * wy
+    if work is img:
+        return img
+    return _restore_dtype(work, dtype)
+
+
+def resize_long_edge(img, max_size):
+    """
+    等比缩小，使长边不超过 max_size（只缩小不放大）。
+    """
+    h, w = img.shape[:2]
+    long_edge = max(h, w)
+    if not max_size or long_edge <= max_size:
+        return img
+    scale = max_size / long_edge
+    return resize(img, max(1, round(h * scale)), max(1, round(w * scale)))
+
+
+# ------------------ 串联操作 ------------------ #
+
+def crop(img, left, top, width, height):
+    """裁剪出 (left, top) 起、width × height 的区域，超出边界的部分截掉；返回视图，不复制数据。"""
+    h, w = img.shape[:2]
+    left, top = max(0, left), max(0, top)
+    right, bottom = min(w, left + width), min(h, top + height)
+    if right <= left or bottom <= top:
+        raise ValueError(f"裁剪区域 {left},{top},{width},{height} 不在 {w}x{h} 的图片内")
+    return img[top:bottom, left:right]
+
+
+def to_8bit(img):
+    """16 位（或更高）整数 / 0~1 浮点像素转为 8 位；整数用查找表一次完成，不产生中间数组。"""
+    import numpy as np
+    if img.dtype == np.uint8:
+        return img
+    if img.dtype == np.uint16:
+        lut = np.rint(np.arange(65536, dtype=np.float32) / 257).astype(np.uint8)
+        return lut[img]
+    if np.issubdtype(img.dtype, np.floating):
+        out = np.empty(img.shape, dtype=np.uint8)
+        for y in range(0, img.shape[0], ROW_BLOCK):
+            block = np.clip(img[y:y + ROW_BLOCK], 0, 1) * 255
+            np.rint(block, out=block)
+            out[y:y + ROW_BLOCK] = block
+        return out
+    shift = img.dtype.itemsize * 8 - 8
+    return (img >> shift).astype(np.uint8)
+
+
+def _max_value(dtype):
+    import numpy as np
+    return np.iinfo(dtype).max if np.issubdtype(dtype, np.integer) else 1.0
+
+
+def strip_alpha(img, background=(255, 255, 255)):
+    """
+    去除透明通道：完全不透明时直接返回颜色通道的视图，否则按透明度合成到背景色上
+    （background 为 8 位 RGB，按位深缩放）。没有透明通道时原样返回。
+    """
+    import numpy as np
+    if img.ndim != 3 or img.shape[2] not in (2, 4):
+        return img
+    colors = img.shape[2] - 1
+    alpha = img[..., colors]
+    top = _max_value(img.dtype)
+    if alpha.min() == top:
+        return img[..., :colors]
+    bg = np.asarray(background[:colors] if colors == 3 else background[:1], dtype=np.float32) * (top / 255)
+    out = np.empty(img.shape[:2] + (colors,), dtype=img.dtype)
+    for y in range(0, img.shape[0], ROW_BLOCK):
+        block = img[y:y + ROW_BLOCK]
+        a = block[..., colors:].astype(np.float32) / top
+        mixed = block[..., :colors] * a
+        mixed += bg * (1 - a)
+        out[y:y + ROW_BLOCK] = _restore_dtype(mixed, img.dtype)
+    return out
+
+
+def _decode_transfer(v, curve):
+    """编码值（0~1）-> 线性值，v 为 float32，原地计算。"""
+    import numpy as np
+    if curve == 'linear':
+        return v
+    if curve == 'srgb':
+        return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4).astype(np.float32)
+    if curve == 'prophoto':
+        return np.where(v < 16 / 512, v / 16, v ** 1.8).astype(np.float32)
+    np.power(v, curve, out=v)
+    return v
+
+
+def _srgb_encode_lut(dtype):
+    """线性值（量化为 0~65535）-> sRGB 编码值的查找表。"""
+    import numpy as np
+    v = np.arange(65536, dtype=np.float64) / 65535
+    enc = np.where(v <= 0.0031308, v * 12.92, 1.055 * v ** (1 / 2.4) - 0.055)
+    if np.issubdtype(dtype, np.integer):
+        return np.rint(enc * np.iinfo(dtype).max).astype(dtype)
+    return enc.astype(dtype)
+
+
+def to_srgb(img, source):
+    """
+    把 source 色彩空间（见 COLOR_SPACES）的图片转换为 sRGB，保持原位深。
+    整数像素的解码用查找表，3×3 矩阵和编码按行分块向量计算。
+    """
+    import numpy as np
+    if source == 'srgb':
+        return img
+    if source not in COLOR_SPACES:
+        raise ValueError(f"未知的色彩空间: {source}，可用: srgb, {', '.join(COLOR_SPACES)}")
+    if img.ndim != 3 or img.shape[2] < 3:
+        raise ValueError("只能转换 RGB 图片的色彩空间")
+    matrix, curve = COLOR_SPACES[source]
+    matrix = None if matrix is None else np.asarray(matrix, dtype=np.float32).T
+    dtype = img.dtype
+    top = _max_value(dtype)
+    decode = None
+    if dtype in (np.uint8, np.uint16):
+        levels = np.arange(top + 1, dtype=np.float32) / top
+        decode = _decode_transfer(levels, curve)
+    encode = _srgb_encode_lut(dtype)
+    out = np.empty_like(img)
+    for y in range(0, img.shape[0], ROW_BLOCK):
+        block = img[y:y + ROW_BLOCK, :, :3]
+        if decode is not None:
+            lin = decode[block]
+        else:
+            lin = _decode_transfer(np.clip(block, 0, top).astype(np.float32) / top, curve)
+        if matrix is not None:
+            lin = lin @ matrix
+        np.clip(lin, 0, 1, out=lin)
+        lin *= 65535
+        out[y:y + ROW_BLOCK, :, :3] = encode[(lin + 0.5).astype(np.uint16)]
+    if img.shape[2] > 3:
+        out[..., 3:] = img[..., 3:]
+    return out
+
+
+def fit_format(img, output_format):
+    """编码前把像素转成输出格式能保存的形式：JPEG 去除透明通道，仅支持 8 位的格式转为 8 位。"""
+    import numpy as np
+    if output_format in NO_ALPHA:
+        img = strip_alpha(img)
+    if img.dtype != np.uint8 and (output_format in EIGHT_BIT_ONLY or
+                                  (output_format == 'png' and img.ndim == 3)):
+        # Pillow 只能写单通道的 16 位 PNG
+        img = to_8bit(img)
+    return img
+
+
+# 支持的操作；改变尺寸的操作无法用于按条带的流式处理
+OPERATIONS = ('crop', 'resize', 'srgb', '8bit', 'strip_alpha')
+GEOMETRY_OPERATIONS = {'crop', 'resize'}
+
+
+def parse_ops(specs):
+    """
+    解析操作链，specs 为字符串列表（也可以是用 ; 分隔的单个字符串），每项为：
+      - crop=左,上,宽,高
+      - resize=长边（只缩小） 或 resize=宽x高
+      - srgb=源色彩空间（linear / adobe_rgb / display_p3 / prophoto）
+      - 8bit
+      - strip_alpha 或 strip_alpha=RRGGBB（合成背景色，默认白色）
+    返回 [(操作名, 参数元组)]，格式错误时抛出 ValueError。
+    """
+    if isinstance(specs, str):
+        specs = specs.split(';')
+    ops = []
+    for spec in specs or ():
+        spec = spec.strip()
+        if not spec:
+            continue
+        name, _, arg = spec.partition('=')
+        name = name.strip().lower()
+        if name not in OPERATIONS:
+            raise ValueError(f"未知的图片操作: {name}，可用: {', '.join(OPERATIONS)}")
+        try:
+            if name == 'crop':
+                args = tuple(int(v) for v in arg.split(','))
+                if len(args) != 4 or args[2] <= 0 or args[3] <= 0:
+                    raise ValueError
+            elif name == 'resize':
+                if 'x' in arg.lower():
+                    w, h = (int(v) for v in arg.lower().split('x'))
+                    args = (w, h)
+                else:
+                    args = (int(arg),)
+                if min(args) <= 0:
+                    raise ValueError
+            elif name == 'srgb':
+                args = (arg.strip().lower(),)
+                if args[0] not in COLOR_SPACES and args[0] != 'srgb':
+                    raise ValueError
+            elif name == '8bit':
+                if arg:
+                    raise ValueError
+                args = ()
+            elif name == 'strip_alpha':
+                color = arg.strip().lstrip('#') or 'ffffff'
+                if len(color) != 6:
+                    raise ValueError
+                args = tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+        except ValueError:
+            raise ValueError(f"图片操作参数错误: {spec}") from None
+        ops.append((name, args))
+    return ops
+
+
+def format_ops(ops):
+    """parse_ops 的逆运算，得到可以写入缓存键、批次清单的字符串列表。"""
+    out = []
+    for name, args in ops:
+        if name == 'resize' and len(args) == 2:
+            out.append(f"resize={args[0]}x{args[1]}")
+        elif name == 'strip_alpha':
+            out.append(f"strip_alpha={''.join(f'{v:02x}' for v in args)}")
+        elif args:
+            out.append(f"{name}={','.join(str(v) for v in args)}")
+        else:
+            out.append(name)
+    return out
+
+
+def apply_ops(img, ops):
+    """按顺序执行 parse_ops 得到的操作链。"""
+    for name, args in ops:
+        if name == 'crop':
+            img = crop(img, *args)
+        elif name == 'resize':
+            if len(args) == 2:
+                img = resize(img, args[1], args[0])
+            else:
+                img = resize_long_edge(img, args[0])
+        elif name == 'srgb':
+            img = to_srgb(img, args[0])
+        elif name == '8bit':
+            img = to_8bit(img)
+        elif name == 'strip_alpha':
+            img = strip_alpha(img, args)
+    return img
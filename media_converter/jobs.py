@@ -0,0 +1,369 @@
+"""
+单文件转换任务：统一返回 ConversionResult，不抛出异常，并负责查询/写入转换缓存。
+另外提供任务分道（CPU / I/O）判断，供 JobScheduler 使用。
+"""
+import os
+import time
+import logging
+
+from .common import NO_AUDIO, ConversionError, configure_logging, output_path
+from .converters import (convert_image, convert_image_outputs, separate_audio_from_video, convert_audio_format,
+                         extract_video_frames)
+from .ffmpeg_tools import probe_streams, can_stream_copy_audio, can_stream_copy_video
+from .encoding import resolve_video_encode
+from .audio import resolve_audio_encode, is_default_audio
+from .imageops import parse_ops, format_ops
+from .renditions import format_outputs
+from .frames import resolve_frames
+from .metrics import track_job, current_job, stage, file_size, report_job
+
+logger = logging.getLogger(__name__)
+
+
+class ConversionResult:
+    """
+    单个输入文件的转换结果。
+      - outputs: 生成的输出文件路径列表（可能为空，如视频无音轨且仅导出音频）
+      - error: 失败原因，成功时为 None
+      - note: 附加说明，如 "无音频"
+      - cached: 是否命中转换缓存（直接复用了已有输出）
+      - metrics: 各阶段耗时等统计数据（JobMetrics），未执行的任务为 None
+    """
+    __slots__ = ('input_path', 'kind', 'outputs', 'error', 'note', 'cached', 'metrics')
+
+    def __init__(self, input_path, kind, outputs=(), error=None, note=None, cached=False, metrics=None):
+        self.input_path = input_path
+        self.kind = kind
+        self.outputs = list(outputs)
+        self.error = error
+        self.note = note
+        self.cached = cached
+        self.metrics = metrics
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def to_dict(self):
+        return {'input': self.input_path, 'kind': self.kind, 'ok': self.ok,
+                'outputs': self.outputs, 'error': self.error, 'note': self.note,
+                'cached': self.cached}
+
+    def __repr__(self):
+        return f"ConversionResult({self.to_dict()!r})"
+
+
+def job_result(job, kind):
+    """
+    取出调度器任务的 ConversionResult；任务函数意外抛出异常或被取消时返回失败结果。
+    """
+    if job.result is not None:
+        return job.result
+    return ConversionResult(job.args[0], kind, error=job.error or "任务已取消")
+
+
+def init_worker(log_file):
+    """子进程初始化：沿用父进程的日志文件。"""
+    if log_file:
+        configure_logging(log_file)
+
+
+def convert_image_job(input_file_path, output_format, output_dir, image_options):
+    """
+    进程池中的单个图片任务，返回 (原文件, 输出文件列表, 错误信息, JobMetrics)。
+    image_options 中有 outputs 时解码一次写出多份输出（忽略 output_format 和 max_size）。
+    """
+    with track_job(input_file_path, 'image') as metrics:
+        try:
+            options = {k: v for k, v in image_options.items() if k != 'outputs'}
+            if image_options.get('outputs'):
+                options.pop('max_size', None)
+                outs = convert_image_outputs(input_file_path, image_options['outputs'], output_dir, **options)
+            else:
+                outs = [convert_image(input_file_path, output_format, output_dir, **options)]
+            return input_file_path, outs, None, metrics
+        except Exception as e:
+            return input_file_path, None, str(e), metrics
+
+
+def _run_cached(cache, kind, input_path, options, func, quick=False):
+    """
+    有缓存时先查缓存，未命中再调用 func() -> (输出列表, 附加说明)，成功后写入缓存。
+    同时统计各阶段耗时，写入日志并附在结果的 metrics 上。quick 见 ConversionCache.lookup。
+    """
+    with track_job(input_path, kind) as metrics:
+        result = _run_cached_job(cache, kind, input_path, options, func, quick)
+    metrics.ok, metrics.cached = result.ok, result.cached
+    metrics.bytes_in = file_size(input_path)
+    metrics.bytes_out = sum(file_size(p) for p in result.outputs)
+    result.metrics = metrics
+    report_job(metrics)
+    return result
+
+
+def _run_cached_job(cache, kind, input_path, options, func, quick=False):
+    with stage('cache'):
+        hit = cache.lookup(input_path, kind, options, quick) if cache else None
+    if hit:
+        return ConversionResult(input_path, kind, hit, cached=True)
+    try:
+        outputs, note = func()
+    except ConversionError as e:
+        return ConversionResult(input_path, kind, error=str(e))
+    if cache and outputs:
+        with stage('cache'):
+            cache.store(input_path, kind, options, outputs, quick)
+    return ConversionResult(input_path, kind, outputs, note=note)
+
+
+def _skip_result(input_path, kind, info):
+    """
+    根据探测结果（info）判断文件无法处理时直接返回失败结果，不再启动转换；可以处理时返回 None。
+    """
+    if not info:
+        return None
+    if info.get('error'):
+        return ConversionResult(input_path, kind, error=f"文件无法读取：{info['error']}")
+    if kind == 'audio' and info.get('audio') is None:
+        return ConversionResult(input_path, kind, error="文件中没有音频流")
+    return None
+
+
+def _audio_is_noop(audio_path, output_format, output_dir, info):
+    """输出路径就是输入文件本身、且源编码已符合目标格式：无需转换。"""
+    return bool(info) and can_stream_copy_audio(info.get('audio'), output_format) and \
+        os.path.abspath(output_path(audio_path, output_dir, output_format)) == os.path.abspath(audio_path)
+
+
+def image_options_key(output_format, output_dir, image_options):
+    """
+    图片任务写入缓存时使用的参数（内存上限不影响输出结果，不计入；
+    操作链统一为规范写法，没有操作时不计入，已有的缓存记录继续有效）。
+    """
+    options = {'output_format': output_format, 'output_dir': output_dir, **image_options}
+    options.pop('memory_limit', None)
+    outputs = options.pop('outputs', None)
+    if outputs:
+        # 多份输出时 output_format / max_size 不起作用
+        options.pop('output_format', None)
+        options.pop('max_size', None)
+        try:
+            options['outputs'] = format_outputs(outputs)
+        except ValueError:
+            options['outputs'] = outputs  # 格式错误，任务会在转换时失败
+    ops = options.pop('ops', None)
+    if ops:
+        try:
+            options['ops'] = format_ops(parse_ops(ops))
+        except ValueError:
+            options['ops'] = ops  # 格式错误，任务会在转换时失败
+    return options
+
+
+def run_image_job(input_path, output_format='jpeg', output_dir=None, cache=None, executor=None,
+                  info=None, **image_options):
+    """
+    转换单张图片，返回 ConversionResult，不抛出异常。
+    executor 为进程池时在子进程中解码/编码，否则在当前线程中执行。
+    info 为探测结果（见 probe 模块），表明文件无法读取时直接返回失败结果。
+    """
+    skipped = _skip_result(input_path, 'image', info)
+    if skipped:
+        return skipped
+    options = image_options_key(output_format, output_dir, image_options)
+
+    def work():
+        worker_metrics = wall = None
+        if executor is None:
+            _src, outs, err, worker_metrics = convert_image_job(input_path, output_format, output_dir,
+                                                                image_options)
+        else:
+            start = time.perf_counter()
+            try:
+                _src, outs, err, worker_metrics = executor.submit(convert_image_job, input_path, output_format,
+                                                                  output_dir, image_options).result()
+            except Exception as e:
+                # 子进程异常退出（如 BrokenProcessPool）时也要保证每个文件都有结果
+                logger.error(f"图片转换失败: {input_path}, 错误: {e}")
+                outs, err = None, str(e)
+            wall = time.perf_counter() - start
+        if worker_metrics is not None:
+            current_job().merge(worker_metrics, wall)
+        if err:
+            raise ConversionError(input_path, err)
+        return outs, None
+    return _run_cached(cache, 'image', input_path, options, work)
+
+
+def _video_options(video_path, output_dir, audio_only, audio_format, video_format, stream_copy,
+                   video_encode=None):
+    options = {'output_dir': output_dir, 'audio_only': audio_only, 'audio_format': audio_format,
+               'video_format': video_format or os.path.splitext(video_path)[1].lstrip('.'),
+               'stream_copy': stream_copy}
+    if video_encode is not None:
+        # 只在指定了编码参数时写入缓存键，已有的缓存记录（默认编码）继续有效
+        options['video_encode'] = resolve_video_encode(video_encode)
+    return options
+
+
+def run_video_job(video_path, output_dir=None, audio_only=False, audio_format='mp3',
+                  video_format=None, stream_copy=None, cache=None, video_encode=None, segment_workers=None,
+                  info=None):
+    """
+    处理单个视频（分离音频/无声视频），返回 ConversionResult，不抛出异常。
+    video_format 为 None 时保留原视频后缀；video_encode / segment_workers 见 separate_audio_from_video
+    （segment_workers 只影响速度，不计入缓存键）。
+    info 为探测结果：文件无法读取时直接失败；仅导出音频但没有音轨时直接返回“无音频”，
+    否则代替 separate_audio_from_video 中的流信息探测。
+    """
+    skipped = _skip_result(video_path, 'video', info)
+    if skipped:
+        return skipped
+    if info and audio_only and info.get('audio') is None:
+        return ConversionResult(video_path, 'video', note=NO_AUDIO)
+    if info and not audio_only and info.get('video') is None:
+        return ConversionResult(video_path, 'video', error="文件中没有视频流")
+    try:
+        options = _video_options(video_path, output_dir, audio_only, audio_format, video_format,
+                                 stream_copy, video_encode)
+    except ValueError as e:
+        return ConversionResult(video_path, 'video', error=str(e))
+
+    def work():
+        v_out, a_out = separate_audio_from_video(
+            video_path, output_dir, export_only_audio=audio_only, audio_format=audio_format,
+            video_format=options['video_format'], stream_copy=stream_copy, video_encode=video_encode,
+            segment_workers=segment_workers, streams=info)
+        outputs = [p for p in (v_out, a_out) if p and p != NO_AUDIO]
+        return outputs, NO_AUDIO if a_out == NO_AUDIO else None
+    return _run_cached(cache, 'video', video_path, options, work)
+
+
+def _frames_options(output_dir, frames, output):
+    """抽帧任务的缓存键参数（与分离音频的参数不同，两者的缓存记录互不影响）。"""
+    return {'output_dir': output_dir, 'frames': resolve_frames(frames), 'frame_output': format_outputs([output])[0]}
+
+
+def run_frames_job(video_path, output_dir=None, frames='count', output='jpeg', cache=None, info=None):
+    """
+    从单个视频中抽帧（见 extract_video_frames），返回 ConversionResult，不抛出异常。
+    info 为探测结果：文件无法读取或没有视频流时直接失败，否则代替流信息探测。
+    抽帧只读取视频的一小部分，缓存键不计算整个文件的内容哈希（quick，见 cache 模块）。
+    """
+    skipped = _skip_result(video_path, 'video', info)
+    if skipped:
+        return skipped
+    if info and info.get('video') is None:
+        return ConversionResult(video_path, 'video', error="文件中没有视频流")
+    try:
+        options = _frames_options(output_dir, frames, output)
+    except ValueError as e:
+        return ConversionResult(video_path, 'video', error=str(e))
+    return _run_cached(cache, 'video', video_path, options,
+                       lambda: (extract_video_frames(video_path, output_dir, frames, output, streams=info), None),
+                       quick=True)
+
+
+def _audio_options(output_format, output_dir, audio_encode=None):
+    """音频任务的缓存键参数；只在指定了编码参数时写入，已有的缓存记录继续有效。"""
+    options = {'output_format': output_format, 'output_dir': output_dir}
+    settings = resolve_audio_encode(audio_encode)
+    if not is_default_audio(settings):
+        options['audio_encode'] = settings
+    return options
+
+
+def run_audio_job(audio_path, output_format='mp3', output_dir=None, cache=None, info=None, audio_encode=None):
+    """
+    转换单个音频文件，返回 ConversionResult，不抛出异常。
+    info 为探测结果：文件无法读取时直接失败；输出就是输入本身且编码已符合目标格式时直接跳过；
+    源编码能直接封装进目标格式时流拷贝，否则重新编码。
+    audio_encode 为码率、采样率、声道数和响度归一化参数（见 audio 模块），指定时总是重新编码。
+    """
+    skipped = _skip_result(audio_path, 'audio', info)
+    if skipped:
+        return skipped
+    try:
+        options = _audio_options(output_format, output_dir, audio_encode)
+    except ValueError as e:
+        return ConversionResult(audio_path, 'audio', error=str(e))
+    if 'audio_encode' not in options and _audio_is_noop(audio_path, output_format, output_dir, info):
+        return ConversionResult(audio_path, 'audio', [audio_path], note="已是目标格式")
+    src_codec = info.get('audio') if info else None
+    return _run_cached(cache, 'audio', audio_path, options,
+                       lambda: ([convert_audio_format(audio_path, output_format, output_dir, src_codec,
+                                                      audio_encode)], None))
+
+
+# ------------------ 任务分道 ------------------ #
+
+def image_job_lane(input_path, output_format='jpeg', output_dir=None, cache=None, info=None,
+                   **image_options):
+    """缓存命中或探测结果表明无法读取的图片任务走 I/O 通道；否则走 CPU 通道。"""
+    if _skip_result(input_path, 'image', info):
+        return 'io'
+    options = image_options_key(output_format, output_dir, image_options)
+    if cache and cache.lookup(input_path, 'image', options):
+        return 'io'
+    return 'cpu'
+
+
+def video_job_lane(video_path, output_dir=None, audio_only=False, audio_format='mp3',
+                   video_format=None, stream_copy=None, cache=None, video_encode=None, segment_workers=None,
+                   info=None):
+    """
+    只需流拷贝（不解码）、缓存命中或可以直接跳过的视频任务走 I/O 通道，需要重新编码的走 CPU 通道。
+    有探测结果（info）时不再重新探测流信息。
+    """
+    if _skip_result(video_path, 'video', info) or (info and audio_only and info.get('audio') is None):
+        return 'io'
+    try:
+        options = _video_options(video_path, output_dir, audio_only, audio_format, video_format,
+                                 stream_copy, video_encode)
+    except ValueError:
+        return 'io'  # 参数错误，任务会立即失败
+    if cache and cache.lookup(video_path, 'video', options):
+        return 'io'
+    if stream_copy is False:
+        return 'cpu'
+    try:
+        streams = info or probe_streams(video_path)
+    except Exception:
+        return 'cpu'
+    audio_ok = streams['audio'] is None or can_stream_copy_audio(streams['audio'], audio_format)
+    video_ok = audio_only or can_stream_copy_video(video_path, streams['video'], options['video_format'])
+    return 'io' if audio_ok and video_ok else 'cpu'
+
+
+def frames_job_lane(video_path, output_dir=None, frames='count', output='jpeg', cache=None, info=None):
+    """缓存命中或可以直接判定失败的抽帧任务走 I/O 通道，否则需要解码，走 CPU 通道。"""
+    if _skip_result(video_path, 'video', info) or (info and info.get('video') is None):
+        return 'io'
+    try:
+        options = _frames_options(output_dir, frames, output)
+    except ValueError:
+        return 'io'  # 参数错误，任务会立即失败
+    if cache and cache.lookup(video_path, 'video', options, quick=True):
+        return 'io'
+    return 'cpu'
+
+
+def audio_job_lane(audio_path, output_format='mp3', output_dir=None, cache=None, info=None, audio_encode=None):
+    """
+    缓存命中、可以直接跳过或只需流拷贝（源编码符合目标格式，见探测结果 info）的音频任务走 I/O 通道，
+    否则需要重新编码，走 CPU 通道。
+    """
+    if _skip_result(audio_path, 'audio', info):
+        return 'io'
+    try:
+        options = _audio_options(output_format, output_dir, audio_encode)
+    except ValueError:
+        return 'io'  # 参数错误，任务会立即失败
+    if 'audio_encode' not in options:
+        if _audio_is_noop(audio_path, output_format, output_dir, info):
+            return 'io'
+        if info and can_stream_copy_audio(info.get('audio'), output_format):
+            return 'io'
+    if cache and cache.lookup(audio_path, 'audio', options):
+        return 'io'
+    return 'cpu'
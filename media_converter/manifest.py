@@ -0,0 +1,189 @@
+"""
+批次清单：把一批任务及每个任务的结果逐条追加写入 JSON lines 日志文件。
+
+程序中途退出（崩溃、断电、被结束进程）后，清单里只有已完成任务的记录，
+resume_batch() 据此跳过已成功且输出仍在的任务，只重做剩下的部分。
+
+文件格式（每行一个 JSON 对象）：
+  {"type": "batch", "version": 1, "created": ..., "options": {...}, "jobs": [[路径, 类型], ...]}
+  {"type": "result", "input": ..., "kind": ..., "ok": ..., "outputs": [...], "error": ...}
+每条结果写入后立即 fsync；最后一行不完整（写到一半时崩溃）时忽略该行，继续追加前先补上换行。
+"""
+import os
+import json
+import time
+import logging
+import threading
+
+from .cache import default_cache_path
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def default_manifest_dir():
+    """默认清单目录：与转换缓存放在同一目录下的 batches。"""
+    return os.path.join(os.path.dirname(default_cache_path()), 'batches')
+
+
+def new_manifest_path(name='batch'):
+    """在默认目录下生成一个新的清单文件路径。"""
+    return os.path.join(default_manifest_dir(),
+                        f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{os.getpid()}.jsonl")
+
+
+class BatchManifest:
+    """
+    一个批次的清单。open() 创建新清单或打开已有清单继续追加，load() 只读加载。
+      - options: 创建时记录的转换参数（resume 时原样使用）
+      - jobs: [(路径, 类型)]，按提交顺序
+    """
+    def __init__(self, path, options=None, jobs=(), created=None):
+        self.path = path
+        self.options = dict(options or {})
+        self.jobs = [tuple(j) for j in jobs]
+        self.created = created
+        self.results = {}   # 绝对路径 -> 最后一条结果记录
+        self._fp = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """读取清单；文件不存在或首行不是批次记录时抛出 ValueError。"""
+        manifest = None
+        with open(path, encoding='utf-8') as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 崩溃时写了一半的行
+                if manifest is None:
+                    if record.get('type') != 'batch':
+                        raise ValueError(f"不是批次清单: {path}")
+                    manifest = cls(path, record.get('options'), record.get('jobs', ()), record.get('created'))
+                elif record.get('type') == 'result':
+                    manifest.results[os.path.abspath(record['input'])] = record
+                elif record.get('type') == 'jobs':
+                    manifest.jobs.extend(tuple(j) for j in record['jobs'])
+        if manifest is None:
+            raise ValueError(f"不是批次清单: {path}")
+        return manifest
+
+    @classmethod
+    def open(cls, path, options, jobs):
+        """
+        path 不存在时创建新清单并写入批次记录；已存在时加载后继续追加，
+        其中未出现过的任务追加到任务列表。
+        """
+        if os.path.exists(path):
+            manifest = cls.load(path)
+            known = {os.path.abspath(p) for p, _k in manifest.jobs}
+            extra = [(p, k) for p, k in jobs if os.path.abspath(p) not in known]
+            if extra:
+                manifest.jobs.extend(extra)
+                manifest._append({'type': 'jobs', 'jobs': extra})
+            return manifest
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        manifest = cls(path, options, jobs, time.strftime('%Y-%m-%dT%H:%M:%S'))
+        manifest._append({'type': 'batch', 'version': MANIFEST_VERSION, 'created': manifest.created,
+                          'options': manifest.options, 'jobs': manifest.jobs})
+        return manifest
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._fp is None:
+                torn = _torn_tail(self.path)
+                self._fp = open(self.path, 'a', encoding='utf-8')
+                if torn:
+                    # 上次写到一半的行单独成行，否则新记录会接在它后面一起被忽略
+                    self._fp.write('\n')
+            self._fp.write(line)
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+
+    def record(self, result):
+        """追加一个任务的结果（ConversionResult），路径都记成绝对路径。"""
+        record = {'type': 'result', **result.to_dict()}
+        record['input'] = os.path.abspath(result.input_path)
+        record['outputs'] = [os.path.abspath(p) for p in result.outputs]
+        self.results[record['input']] = record
+        try:
+            self._append(record)
+        except OSError as e:
+            logger.warning(f"写入批次清单失败: {self.path}, 错误: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_done(self, path):
+        """该任务已成功且输出文件都还在。"""
+        record = self.results.get(os.path.abspath(path))
+        return bool(record and record['ok'] and all(os.path.exists(p) for p in record['outputs']))
+
+    def remaining(self):
+        """尚未成功完成的任务 [(路径, 类型)]（未执行、失败或输出已丢失）。"""
+        return [(p, k) for p, k in self.jobs if not self.is_done(p)]
+
+    @property
+    def finished(self):
+        return not self.remaining()
+
+
+def _torn_tail(path):
+    """文件非空且不以换行结尾（最后一行写到一半时中断）。"""
+    try:
+        with open(path, 'rb') as fp:
+            fp.seek(0, os.SEEK_END)
+            if not fp.tell():
+                return False
+            fp.seek(-1, os.SEEK_END)
+            return fp.read(1) != b'\n'
+    except OSError:
+        return False
+
+
+def find_unfinished(directory=None):
+    """返回目录中还有未完成任务的清单（按修改时间从新到旧）。"""
+    directory = directory or default_manifest_dir()
+    try:
+        names = [os.path.join(directory, n) for n in os.listdir(directory) if n.endswith('.jsonl')]
+    except OSError:
+        return []
+    found = []
+    for path in sorted(names, key=os.path.getmtime, reverse=True):
+        try:
+            manifest = BatchManifest.load(path)
+        except (OSError, ValueError):
+            continue
+        if not manifest.finished:
+            found.append(manifest)
+    return found
+
+
+def resume_batch(path, callback=None, cache=None, scheduler=None, **overrides):
+    """
+    继续执行清单中未完成的任务，结果继续追加到同一个清单；返回本次执行的 ConversionResult 列表。
+    转换参数使用清单中记录的参数，overrides 可覆盖其中的并发数等设置。
+    """
+    from .batch import convert_files
+    manifest = BatchManifest.load(path)
+    todo = manifest.remaining()
+    skipped = len(manifest.jobs) - len(todo)
+    logger.info(f"继续批次 {path}: 跳过已完成 {skipped} 个，剩余 {len(todo)} 个")
+    if not todo:
+        return []
+    options = {**manifest.options, **overrides}
+    return convert_files([p for p, _k in todo], callback=callback, cache=cache, scheduler=scheduler,
+                         manifest=path, **options)
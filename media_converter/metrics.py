@@ -0,0 +1,321 @@
+"""
+任务耗时统计：记录每个转换任务各阶段（缓存查询、解码、缩放、编码写盘、流拷贝等）的耗时、
+输入/输出字节数、峰值内存和执行者，写入日志；批次结束时汇总 文件/秒 和各阶段 p50 / p95。
+可选同时导出为 JSON lines（每行一条记录），便于画图分析。
+
+峰值内存按任务统计：
+  - 执行进程：任务执行期间由后台线程定期采样本进程的常驻内存（只支持 Linux），取最大值。
+    图片任务在进程池的进程中逐个执行，即该任务的峰值；视频/音频任务在主进程的线程中执行，
+    同时运行的其他任务也计算在内（它们的主要内存在 ffmpeg 子进程中）。
+  - ffmpeg 子进程：子进程结束时由 os.wait4 取得其峰值内存（见 ffmpeg_tools），取该任务各子进程中的最大值。
+"""
+import os
+import sys
+import json
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_export_lock = threading.Lock()
+_export_path = None
+
+# 采样执行进程常驻内存的间隔（秒）
+RSS_SAMPLE_INTERVAL = 0.05
+# Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+_MAXRSS_SCALE = 1 if sys.platform == 'darwin' else 1024
+# 正在采样峰值内存的任务，及采样线程（没有任务时退出）
+_sampling = set()
+_sampling_lock = threading.Lock()
+_sampler = None
+
+
+def peak_rss_mb():
+    """
+    返回 (本进程, 已结束子进程) 的峰值常驻内存（MB），均为进程启动以来的最高值（用于基准测试，
+    每个用例一个新进程；单个任务的峰值见 track_job）。Windows 上没有 resource 模块，返回 (None, None)。
+    """
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_SCALE / 2 ** 20
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * _MAXRSS_SCALE / 2 ** 20
+    return round(own, 1), round(children, 1)
+
+
+def current_rss_mb():
+    """本进程当前的常驻内存（MB）；只支持 Linux（读取 /proc），其他系统返回 None。"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20, 1)
+
+
+class JobMetrics:
+    """
+    单个任务的统计数据。
+      - stages: {阶段名: 秒}，同名阶段多次出现时累加
+      - worker: 执行任务的 "pid/线程名"
+      - peak_rss_mb / peak_child_rss_mb: 任务执行期间执行进程的峰值内存、该任务的 ffmpeg 子进程中
+        最高的峰值内存（见模块说明），无法获取时为 None
+    """
+    __slots__ = ('input_path', 'kind', 'stages', 'seconds', 'bytes_in', 'bytes_out',
+                 'peak_rss_mb', 'peak_child_rss_mb', 'worker', 'ok', 'cached')
+
+    def __init__(self, input_path, kind):
+        self.input_path = input_path
+        self.kind = kind
+        self.stages = {}
+        self.seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.peak_rss_mb = None
+        self.peak_child_rss_mb = None
+        self.worker = None
+        self.ok = True
+        self.cached = False
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def merge(self, other, wall=None):
+        """
+        合并子进程中记录的阶段耗时，执行者和峰值内存以子进程为准。
+        wall 为父进程等待子进程结果的总时长，超出子进程自身耗时的部分
+        （排队、启动进程、传递参数和结果）记为 'pool' 阶段。
+        """
+        for name, seconds in other.stages.items():
+            self.add_stage(name, seconds)
+        if wall is not None:
+            self.add_stage('pool', max(0.0, wall - other.seconds))
+        self.worker = other.worker
+        self.peak_rss_mb = other.peak_rss_mb
+        self.peak_child_rss_mb = other.peak_child_rss_mb
+
+    def to_dict(self):
+        return {'type': 'job', 'input': self.input_path, 'kind': self.kind, 'ok': self.ok,
+                'cached': self.cached, 'seconds': round(self.seconds, 4),
+                'stages': {k: round(v, 4) for k, v in self.stages.items()},
+                'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out,
+                'peak_rss_mb': self.peak_rss_mb, 'peak_child_rss_mb': self.peak_child_rss_mb,
+                'worker': self.worker}
+
+    def summary(self):
+        stages = ', '.join(f"{k} {v:.2f}s" for k, v in self.stages.items())
+        peak = f"{self.peak_rss_mb:.0f} MB" if self.peak_rss_mb is not None else "未知"
+        if self.peak_child_rss_mb is not None:
+            peak += f"（ffmpeg {self.peak_child_rss_mb:.0f} MB）"
+        return (f"任务耗时: {self.input_path} 共 {self.seconds:.2f}s [{stages}] "
+                f"输入 {self.bytes_in / 2 ** 20:.1f} MB 输出 {self.bytes_out / 2 ** 20:.1f} MB "
+                f"峰值内存 {peak} 执行者 {self.worker}")
+
+
+def current_job():
+    """当前线程正在统计的任务，没有时返回 None。"""
+    return getattr(_local, 'job', None)
+
+
+def for_job(func):
+    """
+    包装交给工作线程（线程池）执行的函数：其中结束的 ffmpeg 子进程的峰值内存记到调用 for_job 的线程
+    正在统计的任务上。工作线程中的 stage() 仍不记录（并行部分由调用者整体记为一个阶段）。
+    """
+    job = current_job()
+
+    def run(*args, **kwargs):
+        previous, _local.owner = getattr(_local, 'owner', None), job
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.owner = previous
+    return run
+
+
+def record_child_peak(ru_maxrss):
+    """记录当前任务的一个已结束子进程的峰值内存（os.wait4 返回的 ru_maxrss），保留各子进程中的最大值。"""
+    metrics = current_job() or getattr(_local, 'owner', None)
+    if metrics is None:
+        return
+    mb = round(ru_maxrss * _MAXRSS_SCALE / 2 ** 20, 1)
+    if metrics.peak_child_rss_mb is None or mb > metrics.peak_child_rss_mb:
+        metrics.peak_child_rss_mb = mb
+
+
+def _observe_rss(metrics, rss):
+    # 已经通过 merge() 取得子进程（进程池）的统计时不再记录本进程的内存
+    if rss is not None and metrics.worker is None and \
+            (metrics.peak_rss_mb is None or rss > metrics.peak_rss_mb):
+        metrics.peak_rss_mb = rss
+
+
+def _sample_rss():
+    """采样线程：定期读取本进程的常驻内存，更新所有正在执行的任务的峰值；没有任务时退出。"""
+    global _sampler
+    while True:
+        time.sleep(RSS_SAMPLE_INTERVAL)
+        with _sampling_lock:
+            if not _sampling:
+                _sampler = None
+                return
+            jobs = list(_sampling)
+        rss = current_rss_mb()
+        for metrics in jobs:
+            _observe_rss(metrics, rss)
+
+
+def _start_sampling(metrics):
+    global _sampler
+    _observe_rss(metrics, current_rss_mb())
+    with _sampling_lock:
+        _sampling.add(metrics)
+        if _sampler is None and sys.platform.startswith('linux'):
+            _sampler = threading.Thread(target=_sample_rss, daemon=True, name='rss-sampler')
+            _sampler.start()
+
+
+def _stop_sampling(metrics):
+    with _sampling_lock:
+        _sampling.discard(metrics)
+    _observe_rss(metrics, current_rss_mb())
+
+
+@contextmanager
+def track_job(input_path, kind):
+    """
+    在当前线程统计一个任务，退出时填好总耗时、执行者和峰值内存
+    （已经通过 merge() 取得子进程的执行者时保留子进程的值）；
+    其间转换函数里的 stage() 都记到这个任务上。
+    """
+    metrics = JobMetrics(input_path, kind)
+    previous, _local.job = current_job(), metrics
+    _start_sampling(metrics)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.seconds = time.perf_counter() - start
+        _stop_sampling(metrics)
+        if metrics.worker is None:
+            metrics.worker = f"{os.getpid()}/{threading.current_thread().name}"
+        _local.job = previous
+
+
+@contextmanager
+def stage(name):
+    """记录一个阶段的耗时；当前线程没有在统计任务时不做任何事。"""
+    metrics = current_job()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_stage(name, time.perf_counter() - start)
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+# ------------------ 导出 ------------------ #
+
+def configure_metrics(path=None):
+    """
+    设置 JSON lines 导出文件；path 为 None 时使用环境变量 MEDIA_CONVERTER_METRICS，
+    都没有时只写日志不导出。
+    """
+    global _export_path
+    _export_path = path or os.environ.get('MEDIA_CONVERTER_METRICS') or None
+
+
+def export(record):
+    """把一条记录追加到 JSON lines 文件（未配置时忽略）。"""
+    if not _export_path:
+        return
+    line = json.dumps({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), **record}, ensure_ascii=False)
+    with _export_lock:
+        try:
+            with open(_export_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            logger.warning(f"写入统计文件失败: {_export_path}, 错误: {e}")
+
+
+def report_job(metrics):
+    """任务结束：写日志并导出。"""
+    logger.info(metrics.summary())
+    export(metrics.to_dict())
+
+
+# ------------------ 批次汇总 ------------------ #
+
+def _percentile(values, q):
+    """最近秩法百分位数，values 已排序。"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+class BatchStats:
+    """
+    收集一个批次中各任务的 JobMetrics，结束时给出吞吐量和各阶段 p50 / p95。
+    add() 可在多个线程中调用。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.jobs = []
+        self.failed = 0
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, result):
+        """记录一个 ConversionResult（没有统计数据的结果只计入文件数）。"""
+        with self._lock:
+            if not result.ok:
+                self.failed += 1
+            self.jobs.append(result.metrics)
+
+    def summary(self):
+        wall = time.perf_counter() - self._start
+        jobs = [m for m in self.jobs if m is not None]
+        bytes_in = sum(m.bytes_in for m in jobs)
+        stages = {}
+        for m in jobs:
+            for name, seconds in m.stages.items():
+                stages.setdefault(name, []).append(seconds)
+        stages['total'] = [m.seconds for m in jobs]
+        stage_stats = {}
+        for name, values in stages.items():
+            values.sort()
+            stage_stats[name] = {'count': len(values), 'total': round(sum(values), 4),
+                                 'p50': round(_percentile(values, 50) or 0, 4),
+                                 'p95': round(_percentile(values, 95) or 0, 4)}
+        return {'type': 'batch', 'name': self.name, 'files': len(self.jobs), 'failed': self.failed,
+                'cached': sum(1 for m in jobs if m.cached), 'wall_s': round(wall, 4),
+                'files_per_s': round(len(self.jobs) / wall, 3) if wall > 0 else None,
+                'mb_in_per_s': round(bytes_in / 2 ** 20 / wall, 3) if wall > 0 else None,
+                'bytes_in': bytes_in, 'bytes_out': sum(m.bytes_out for m in jobs),
+                'stages': stage_stats}
+
+    def report(self):
+        """批次结束：写汇总日志并导出，返回汇总 dict。"""
+        s = self.summary()
+        stages = ', '.join(f"{k} p50 {v['p50']:.2f}s / p95 {v['p95']:.2f}s"
+                           for k, v in s['stages'].items() if v['count'])
+        logger.info(f"批次汇总 [{self.name}]: {s['files']} 个文件（失败 {s['failed']}，缓存 {s['cached']}），"
+                    f"用时 {s['wall_s']:.2f}s，{s['files_per_s'] or 0:.2f} 文件/秒，"
+                    f"{s['mb_in_per_s'] or 0:.2f} MB/秒；{stages}")
+        export(s)
+        return s
@@ -0,0 +1,239 @@
+"""
+快速探测：只读文件头（容器头 / 图片头 / RAW 头），得到时长、音视频编码、分辨率、相机型号等信息，
+并按 路径 + 大小 + 修改时间 缓存在磁盘索引中，文件没变时不再重复探测。
+
+探测结果（info）为 dict：
+  {'kind': 'video', 'duration': 秒或 None, 'video': 视频编码或 None, 'audio': 音频编码或 None,
+   'width': 宽或 None, 'height': 高或 None, 'camera': 相机型号或 None, 'error': 无法读取时的原因}
+其中 video / audio / duration 与 probe_streams() 的结果相同，可以直接代替它使用。
+添加文件时先探测，调度器据此直接跳过无事可做或无法读取的文件、选择流拷贝还是重新编码，
+并让耗时长的任务先开始（见 job_cost）。
+"""
+import os
+import json
+import struct
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import RAW_EXTS, detect_kind, file_fingerprint
+from .cache import default_cache_path
+from .ffmpeg_tools import probe_streams
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROBE_WORKERS = 4
+# 粗略的耗时估计：每百万像素的图片约相当于多少秒的音视频，只用于排序
+IMAGE_SECONDS_PER_MEGAPIXEL = 0.1
+
+
+def default_probe_index_path():
+    """默认探测索引位置：与转换缓存放在同一目录。"""
+    return os.path.join(os.path.dirname(default_cache_path()), 'probe.sqlite3')
+
+
+# ------------------ 读取文件头 ------------------ #
+
+def _tiff_camera(fp, head):
+    """从 TIFF 结构（CR2、NEF、ARW、DNG 等）的第一个 IFD 中读取 Make / Model。"""
+    endian = {b'II': '<', b'MM': '>'}.get(head[:2])
+    if endian is None:
+        return None
+    fp.seek(struct.unpack(endian + 'I', head[4:8])[0])
+    count = struct.unpack(endian + 'H', fp.read(2))[0]
+    tags = {}
+    for _ in range(min(count, 512)):
+        tag, typ, n, value = struct.unpack(endian + 'HHI4s', fp.read(12))
+        if tag in (271, 272) and typ == 2:  # ASCII
+            tags[tag] = (n, value)
+    parts = []
+    for tag in (271, 272):
+        if tag not in tags:
+            continue
+        n, value = tags[tag]
+        if n > 4:
+            pos = fp.tell()
+            fp.seek(struct.unpack(endian + 'I', value)[0])
+            value = fp.read(n)
+            fp.seek(pos)
+        parts.append(value[:n].split(b'\0')[0].decode('ascii', 'replace').strip())
+    # Model 通常已包含厂商名（如 "Canon EOS R5"），不重复显示
+    if len(parts) == 2 and parts[1].lower().startswith(parts[0].split()[0].lower()):
+        parts = parts[1:]
+    return ' '.join(p for p in parts if p) or None
+
+
+def raw_camera(path):
+    """读取 RAW 文件头中的相机型号，无法识别时返回 None。"""
+    try:
+        with open(path, 'rb') as fp:
+            head = fp.read(64)
+            if head.startswith(b'FUJIFILMCCD-RAW'):
+                return head[28:60].split(b'\0')[0].decode('ascii', 'replace').strip() or None
+            return _tiff_camera(fp, head)
+    except (OSError, struct.error):
+        return None
+
+
+def _probe_image(path, info):
+    if os.path.splitext(path)[1].lower() in RAW_EXTS:
+        import rawpy
+        # rawpy.imread 只解析文件头，访问像素数据时才解包
+        with rawpy.imread(path) as raw:
+            width, height = raw.sizes.width, raw.sizes.height
+            if raw.sizes.flip in (5, 6):
+                width, height = height, width
+        info['camera'] = raw_camera(path)
+    else:
+        from PIL import Image
+        with Image.open(path) as im:
+            width, height = im.size
+    info['width'], info['height'] = width, height
+
+
+def probe_file(path, kind=None):
+    """
+    只读文件头探测一个文件，返回 info（见模块说明）；无法读取时 info['error'] 为原因，不抛出异常。
+    kind 为 None 时按扩展名判断。
+    """
+    kind = kind or detect_kind(path)
+    info = {'kind': kind, 'duration': None, 'video': None, 'audio': None,
+            'width': None, 'height': None, 'camera': None, 'error': None}
+    try:
+        if kind == 'image':
+            _probe_image(path, info)
+        else:
+            info.update(probe_streams(path))
+    except Exception as e:
+        info['error'] = str(e) or type(e).__name__
+    return info
+
+
+def job_cost(info):
+    """
+    任务耗时的粗略估计（秒），用于让长任务先开始；没有探测信息时返回 0。
+    """
+    if not info or info.get('error'):
+        return 0
+    if info.get('kind') == 'image':
+        return (info['width'] or 0) * (info['height'] or 0) / 1e6 * IMAGE_SECONDS_PER_MEGAPIXEL
+    return info.get('duration') or 0
+
+
+def _format_duration(seconds):
+    seconds = int(round(seconds))
+    h, rest = divmod(seconds, 3600)
+    return f"{h}:{rest // 60:02d}:{rest % 60:02d}" if h else f"{rest // 60:02d}:{rest % 60:02d}"
+
+
+def describe_info(info):
+    """探测结果的简短说明，供文件列表显示，如 "1920x1080 · 02:30 · h264/aac"。"""
+    if info.get('error'):
+        return f"无法读取：{info['error']}"
+    parts = []
+    if info.get('width'):
+        parts.append(f"{info['width']}x{info['height']}")
+    if info.get('camera'):
+        parts.append(info['camera'])
+    if info.get('duration'):
+        parts.append(_format_duration(info['duration']))
+    if info.get('kind') == 'video':
+        parts.append(f"{info['video']}/{info['audio']}" if info['audio'] else f"{info['video']}/无音频")
+    elif info.get('kind') == 'audio':
+        parts.append(info['audio'])
+    return " · ".join(parts)
+
+
+# ------------------ 磁盘索引 ------------------ #
+
+class ProbeIndex:
+    """
+    探测结果的磁盘索引（sqlite），按 路径 + 大小 + 修改时间 判断是否需要重新探测，可在多个线程中共用。
+    """
+    def __init__(self, path=None):
+        self.path = path or default_probe_index_path()
+        self._lock = threading.Lock()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS probe (
+                              path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, info TEXT)""")
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup(self, path):
+        """只查索引：文件没变时返回记录的 info，否则返回 None（不探测）。"""
+        path = os.path.abspath(path)
+        try:
+            size, mtime_ns = file_fingerprint(path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT size, mtime_ns, info FROM probe WHERE path = ?",
+                                   (path,)).fetchone()
+        if row and row[0] == size and row[1] == mtime_ns:
+            return json.loads(row[2])
+        return None
+
+    def probe(self, path, kind=None):
+        """返回 path 的 info：索引中有且文件没变时直接使用，否则探测并写入索引。"""
+        info = self.lookup(path)
+        if info is not None:
+            return info
+        info = probe_file(path, kind)
+        try:
+            size, mtime_ns = file_fingerprint(path)
+        except OSError:
+            return info  # 文件不存在，不记录
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?)",
+                             (os.path.abspath(path), size, mtime_ns, json.dumps(info, ensure_ascii=False)))
+            self._db.commit()
+        return info
+
+    def probe_many(self, paths, workers=DEFAULT_PROBE_WORKERS):
+        """
+        并行探测多个文件（ffmpeg 子进程 / 读文件头），返回 {路径: info}。
+        新的探测结果一次写入索引（只提交一次），大量小文件时比逐个调用 probe() 快得多。
+        """
+        found = {p: self.lookup(p) for p in paths}
+        missing = [p for p, info in found.items() if info is None]
+        if not missing:
+            return found
+        with ThreadPoolExecutor(max(1, min(workers, len(missing)))) as pool:
+            infos = list(pool.map(probe_file, missing))
+        rows = []
+        for path, info in zip(missing, infos):
+            found[path] = info
+            try:
+                size, mtime_ns = file_fingerprint(path)
+            except OSError:
+                continue  # 文件不存在，不记录
+            rows.append((os.path.abspath(path), size, mtime_ns, json.dumps(info, ensure_ascii=False)))
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+        return found
+
+    def prune(self):
+        """删除已不存在的文件的记录，返回删除的条数。"""
+        with self._lock:
+            stale = [p for (p,) in self._db.execute("SELECT path FROM probe") if not os.path.exists(p)]
+            self._db.executemany("DELETE FROM probe WHERE path = ?", [(p,) for p in stale])
+            self._db.commit()
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM probe")
+            self._db.commit()
@@ -0,0 +1,79 @@
+"""
+一次解码、多份输出：同一张图片解码一次后，按多份输出参数（格式、长边、编码质量、文件名后缀）
+分别缩放和编码，编码在线程中并行执行（见 converters.convert_image_outputs）。
+
+每份输出用 dict 表示（可序列化，便于写入缓存键和批次清单）：
+  {'format': 'webp', 'max_size': 1600, 'quality': 80, 'suffix': '_1600', 'ext': 'webp'}
+format 是编码用的格式名（jpg、tif 等别名换成 IMAGE_FORMATS 中的名称），ext 是输出文件的扩展名（保留调用者写法）。
+也可以用字符串（命令行 --output）：格式[:长边][:q质量][:后缀]，如 jpeg、webp:1600:q80、png:256:_thumb
+"""
+from .common import IMAGE_FORMATS
+
+# 可以设置编码质量（1~100）的输出格式
+QUALITY_FORMATS = {'jpeg', 'webp'}
+# 输出格式的别名：作为扩展名原样保留，编码和校验时换成对应的格式
+FORMAT_ALIASES = {'jpg': 'jpeg', 'tif': 'tiff'}
+
+
+def _parse_spec(spec):
+    parts = spec.strip().split(':')
+    out = {'format': parts[0].strip().lower(), 'max_size': None, 'quality': None, 'suffix': None}
+    for part in parts[1:]:
+        part = part.strip()
+        if part.isdigit():
+            out['max_size'] = int(part)
+        elif part[:1].lower() == 'q' and part[1:].isdigit():
+            out['quality'] = int(part[1:])
+        elif part:
+            out['suffix'] = part
+    return out
+
+
+def parse_outputs(specs):
+    """
+    整理多份输出参数，specs 为 dict 或字符串组成的列表（也可以是用 ; 分隔的单个字符串），
+    返回完整的 dict 列表；参数不合法时抛出 ValueError。
+    没有指定后缀时，限制了长边的输出使用 "_长边" 作为后缀，否则不加后缀。
+    """
+    if isinstance(specs, str):
+        specs = specs.split(';')
+    outputs = []
+    for spec in specs or ():
+        if isinstance(spec, str):
+            if not spec.strip():
+                continue
+            spec = _parse_spec(spec)
+        ext = spec.get('ext') or spec['format'].lower()
+        out = {'format': FORMAT_ALIASES.get(spec['format'].lower(), spec['format'].lower()),
+               'max_size': spec.get('max_size') or None, 'quality': spec.get('quality'),
+               'suffix': spec.get('suffix'), 'ext': ext}
+        if out['format'] not in IMAGE_FORMATS:
+            raise ValueError(f"不支持的输出格式: {out['format']}，可用: {', '.join(IMAGE_FORMATS)}")
+        if out['max_size'] is not None and out['max_size'] <= 0:
+            raise ValueError(f"长边像素必须大于 0: {out['max_size']}")
+        if out['quality'] is not None:
+            if out['format'] not in QUALITY_FORMATS:
+                raise ValueError(f"{out['format']} 不能设置编码质量（仅 {', '.join(sorted(QUALITY_FORMATS))}）")
+            if not 1 <= out['quality'] <= 100:
+                raise ValueError(f"编码质量应在 1~100 之间: {out['quality']}")
+        if out['suffix'] is None:
+            out['suffix'] = f"_{out['max_size']}" if out['max_size'] else ''
+        outputs.append(out)
+    if not outputs:
+        raise ValueError("至少需要一份输出")
+    return outputs
+
+
+def format_outputs(outputs):
+    """parse_outputs 的逆运算，得到可以写入缓存键、批次清单的字符串列表。"""
+    out = []
+    for o in parse_outputs(outputs):
+        parts = [o['ext']]
+        if o['max_size']:
+            parts.append(str(o['max_size']))
+        if o['quality']:
+            parts.append(f"q{o['quality']}")
+        if o['suffix']:
+            parts.append(o['suffix'])
+        out.append(':'.join(parts))
+    return out
@@ -0,0 +1,355 @@
+"""
+统一的任务调度器：所有图片、视频、音频任务都交给同一个 JobScheduler。
+
+  - CPU 通道：需要解码/编码的任务，并发数默认等于 CPU 核心数；
+    图片任务在共享的进程池中执行，视频/音频任务由 ffmpeg 子进程完成。
+    每个任务分到 CPU 核心数 / 并发数 个线程（见 common.cpu_share），编码器按此设置线程数，
+    同时运行的编码线程总数不超过 CPU 核心数。分段并行编码的视频任务按并发的编码进程数占用
+    多个并发名额（weight），名额不足时排队等待。
+  - I/O 通道：流拷贝（重新封装）、缓存命中等只读写磁盘的任务，并发数单独限制。
+  - 任务可以先在 I/O 通道上判断分道（探测流信息、查缓存），需要编码时再转入 CPU 通道。
+  - 同一通道内按优先级（数值大者先执行）、再按提交顺序执行；排队中的任务可以取消。
+"""
+import os
+import heapq
+import logging
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .common import current_log_file, cpu_share
+from .segments import resolve_segment_workers, segment_seconds
+from .jobs import (init_worker, run_image_job, run_video_job, run_audio_job, run_frames_job,
+                   image_job_lane, video_job_lane, audio_job_lane, frames_job_lane)
+
+logger = logging.getLogger(__name__)
+
+LANES = ('cpu', 'io')
+DEFAULT_IO_WORKERS = 2
+
+
+class Job:
+    """
+    一个排队中的任务。state 为 queued / running / done / cancelled，
+    结束后 result 为任务函数的返回值；任务函数抛出异常时 error 为异常信息。
+    weight 为在 CPU 通道中占用的并发名额（不超过通道的并发数），slots 为实际占用的名额。
+    """
+    def __init__(self, scheduler, func, args, kwargs, lane, priority, group, router, callback, weight=1):
+        self._scheduler = scheduler
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.lane = lane
+        self.priority = priority
+        self.group = group
+        self.router = router
+        self.callback = callback
+        self.weight = max(1, int(weight))
+        self.slots = 0
+        self.state = 'queued'
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def cancel(self):
+        """取消排队中的任务，已在执行的任务无法取消，返回是否取消成功。"""
+        return self._scheduler._cancel(self)
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """等待任务结束（完成或被取消），返回 result。"""
+        self._done.wait(timeout)
+        return self.result
+
+
+class JobGroup:
+    """
+    一批相关任务（例如一次“开始转换”）。可整体取消；
+    全部任务结束（完成或取消）后调用 on_done(group)。
+    """
+    def __init__(self, name='', on_done=None):
+        self.name = name
+        self.on_done = on_done
+        self.jobs = []
+        self.completed = 0
+        self.cancelled = 0
+        self.sealed = False
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def total(self):
+        return len(self.jobs)
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def cancel(self):
+        """取消组内全部排队中的任务，返回取消的数量。"""
+        return sum(1 for job in list(self.jobs) if job.cancel())
+
+    def seal(self):
+        """声明任务已全部提交；之后最后一个任务结束时触发 on_done。"""
+        with self._lock:
+            self.sealed = True
+        self._check_done()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _job_finished(self, cancelled):
+        with self._lock:
+            if cancelled:
+                self.cancelled += 1
+            else:
+                self.completed += 1
+        self._check_done()
+
+    def _check_done(self):
+        with self._lock:
+            if not self.sealed or self._done.is_set() or \
+                    self.completed + self.cancelled < len(self.jobs):
+                return
+            self._done.set()
+        if self.on_done:
+            self.on_done(self)
+
+
+class JobScheduler:
+    """
+    带 CPU / I/O 两条通道的任务调度器。
+      - cpu_workers: CPU 通道并发数，None 表示 CPU 核心数。
+      - io_workers: I/O 通道并发数。
+    """
+    def __init__(self, cpu_workers=None, io_workers=DEFAULT_IO_WORKERS):
+        self._cond = threading.Condition()
+        self._queues = {lane: [] for lane in LANES}
+        self._running = {lane: 0 for lane in LANES}
+        self._limits = {}
+        self._seq = itertools.count()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._closed = False
+        self.set_limits(cpu_workers, io_workers)
+
+    # ------------------ 配置 ------------------ #
+    def set_limits(self, cpu_workers=None, io_workers=None):
+        """调整各通道的并发上限，立即生效（正在执行的任务不受影响）。"""
+        with self._cond:
+            if cpu_workers is not None or 'cpu' not in self._limits:
+                self._limits['cpu'] = max(1, cpu_workers or os.cpu_count() or 1)
+            if io_workers is not None or 'io' not in self._limits:
+                self._limits['io'] = max(1, io_workers or DEFAULT_IO_WORKERS)
+            self._dispatch()
+
+    @property
+    def limits(self):
+        return dict(self._limits)
+
+    def process_pool(self):
+        """图片任务共用的进程池（首次使用时创建）。"""
+        with self._pool_lock:
+            if self._pool is None:
+                # rawpy 内部启用了 OpenMP，fork 出的子进程可能死锁，统一使用 spawn；
+                # 实际并发由 CPU 通道限制，进程数按核心数创建即可
+                self._pool = ProcessPoolExecutor(
+                    max_workers=max(self._limits['cpu'], os.cpu_count() or 1),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=init_worker, initargs=(current_log_file(),))
+            return self._pool
+
+    # ------------------ 提交任务 ------------------ #
+    def submit(self, func, *args, lane='cpu', priority=0, group=None, router=None,
+               callback=None, weight=1, **kwargs):
+        """
+        提交任务 func(*args, **kwargs)，返回 Job。
+          - router: 可选，在 I/O 通道上调用 router(*args, **kwargs) 决定实际通道（'cpu' / 'io'）。
+          - callback(job) 在任务结束后于工作线程中调用。
+          - weight: 任务在 CPU 通道中同时使用的核心数（如分段并行编码的并发数），占用同样多的并发名额。
+        """
+        job = Job(self, func, args, kwargs, 'io' if router else lane, priority, group, router, callback,
+                  weight)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("调度器已关闭")
+            if group is not None:
+                group.jobs.append(job)
+            self._push(job)
+            self._dispatch()
+        return job
+
+    def submit_image(self, input_path, output_format='jpeg', output_dir=None, cache=None,
+                     priority=0, group=None, callback=None, info=None, **image_options):
+        """
+        提交图片转换任务（在共享进程池中执行）。
+        各 submit_* 的 info 为探测结果（见 probe 模块），用于跳过无法处理的文件、选择流拷贝或重新编码。
+        """
+        kwargs = dict(output_format=output_format, output_dir=output_dir, cache=cache, info=info,
+                      **image_options)
+        return self.submit(self._image_job, input_path, priority=priority, group=group,
+                           router=image_job_lane if cache or info else None, callback=callback, **kwargs)
+
+    def submit_video(self, video_path, output_dir=None, audio_only=False, audio_format='mp3',
+                     video_format=None, stream_copy=None, cache=None, priority=0, group=None,
+                     callback=None, video_encode=None, segment_workers=None, info=None):
+        """
+        提交视频分离任务，只需流拷贝的任务走 I/O 通道。
+        可能分段并行编码的任务在 CPU 通道中按 segment_workers 占用并发名额。
+        """
+        workers = resolve_segment_workers(segment_workers)
+        if audio_only or (info and not segment_seconds(info.get('duration'), workers)):
+            workers = 1
+        return self.submit(run_video_job, video_path, priority=priority, group=group,
+                           router=video_job_lane, callback=callback, weight=workers, output_dir=output_dir,
+                           audio_only=audio_only, audio_format=audio_format,
+                           video_format=video_format, stream_copy=stream_copy, cache=cache,
+                           video_encode=video_encode, segment_workers=segment_workers, info=info)
+
+    def submit_frames(self, video_path, output_dir=None, frames='count', output='jpeg', cache=None,
+                      priority=0, group=None, callback=None, info=None):
+        """提交视频抽帧任务（见 extract_video_frames），缓存命中的任务走 I/O 通道。"""
+        return self.submit(run_frames_job, video_path, priority=priority, group=group,
+                           router=frames_job_lane if cache or info else None, callback=callback,
+                           output_dir=output_dir, frames=frames, output=output, cache=cache, info=info)
+
+    def submit_audio(self, audio_path, output_format='mp3', output_dir=None, cache=None,
+                     priority=0, group=None, callback=None, info=None, audio_encode=None):
+        """
+        提交音频转换任务，只需流拷贝的任务走 I/O 通道。
+        需要重新编码的任务在 CPU 通道的线程中各启动一个 ffmpeg，同时运行的编码进程数即 CPU 通道的并发数。
+        """
+        return self.submit(run_audio_job, audio_path, priority=priority, group=group,
+                           router=audio_job_lane if cache or info else None, callback=callback,
+                           output_format=output_format, output_dir=output_dir, cache=cache, info=info,
+                           audio_encode=audio_encode)
+
+    def _image_job(self, input_path, **kwargs):
+        return run_image_job(input_path, executor=self.process_pool(), **kwargs)
+
+    # ------------------ 调度 ------------------ #
+    def _push(self, job):
+        heapq.heappush(self._queues[job.lane], (-job.priority, next(self._seq), job))
+
+    def _dispatch(self):
+        """在持有锁时调用：为未满的通道启动排队中的任务。"""
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue:
+                job = queue[0][2]
+                if job.state != 'queued':
+                    heapq.heappop(queue)
+                    continue
+                # 名额不足时队首任务等待，不让后面的轻任务插队，否则多名额的任务可能一直得不到执行
+                slots = min(job.weight, self._limits[lane]) if lane == 'cpu' else 1
+                if self._running[lane] + slots > self._limits[lane]:
+                    break
+                heapq.heappop(queue)
+                job.state = 'running'
+                job.slots = slots
+                self._running[lane] += slots
+                threading.Thread(target=self._run, args=(job, lane), daemon=True,
+                                 name=f"{lane}-job").start()
+
+    def _run(self, job, lane):
+        rerouted = False
+        try:
+            if job.router is not None:
+                router, job.router = job.router, None
+                try:
+                    target = router(*job.args, **job.kwargs)
+                except Exception as e:
+                    logger.warning(f"任务分道失败，改用 CPU 通道: {job.args}, 错误: {e}")
+                    target = 'cpu'
+                if target != lane:
+                    rerouted = True
+                    return
+            if lane == 'cpu':
+                with cpu_share(self._job_threads(job.slots)):
+                    job.result = job.func(*job.args, **job.kwargs)
+            else:
+                job.result = job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            logger.error(f"任务执行出错: {job.args}, 错误: {e}")
+            job.error = str(e)
+        finally:
+            with self._cond:
+                self._running[lane] -= job.slots
+                if rerouted:
+                    job.lane = target
+                    job.state = 'queued'
+                    self._push(job)
+                elif job.state == 'running':
+                    job.state = 'done'
+                self._dispatch()
+                self._cond.notify_all()
+            if not rerouted:
+                self._finish(job, cancelled=False)
+
+    def _job_threads(self, slots):
+        """CPU 通道中占用 slots 个名额的任务可用的线程数：CPU 核心数按通道并发数平分。"""
+        return max(1, (os.cpu_count() or 1) * slots // self._limits['cpu'])
+
+    def _finish(self, job, cancelled):
+        job._done.set()
+        if job.callback and not cancelled:
+            try:
+                job.callback(job)
+            except Exception as e:
+                logger.error(f"任务回调出错: {job.args}, 错误: {e}")
+        if job.group is not None:
+            job.group._job_finished(cancelled)
+
+    def _cancel(self, job):
+        with self._cond:
+            if job.state != 'queued':
+                return False
+            # 仍在堆中，出队时会被跳过
+            job.state = 'cancelled'
+            self._cond.notify_all()
+        self._finish(job, cancelled=True)
+        return True
+
+    # ------------------ 状态 / 关闭 ------------------ #
+    def pending(self, lane=None):
+        """排队中的任务数。"""
+        with self._cond:
+            lanes = [lane] if lane else LANES
+            return sum(1 for ln in lanes for _p, _s, j in self._queues[ln] if j.state == 'queued')
+
+    def running(self, lane=None):
+        """执行中的任务占用的并发名额数。"""
+        with self._cond:
+            return sum(self._running[ln] for ln in ([lane] if lane else LANES))
+
+    def wait_idle(self):
+        """阻塞直到没有排队或执行中的任务。"""
+        with self._cond:
+            self._cond.wait_for(lambda: not any(self._running.values()) and not any(
+                j.state == 'queued' for q in self._queues.values() for _p, _s, j in q))
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        """关闭调度器：可选取消排队任务，等待执行中的任务结束并关闭进程池。"""
+        if cancel_pending:
+            with self._cond:
+                queued = [j for q in self._queues.values() for _p, _s, j in q if j.state == 'queued']
+            for job in queued:
+                job.cancel()
+        with self._cond:
+            self._closed = True
+        if wait:
+            self.wait_idle()
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=not wait)
+                self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
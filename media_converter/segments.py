@@ -0,0 +1,98 @@
+"""
+长视频分段并行编码：单个长视频重新编码时只能用到一个编码进程，其余 CPU 核心空闲。
+
+  1. 用 ffmpeg 分段封装器流拷贝切分视频流（-c copy，只在关键帧处切开，不解码）；
+  2. 各段同时编码，并发数为 segment_workers；
+  3. 用 concat 分离器把编码后的各段流拷贝拼接成最终文件（不再重新编码）。
+
+每段都从关键帧开始，各段时长之和等于原视频时长，拼接后的画面与单独提取的音轨保持同步。
+临时文件写在输出目录下的隐藏目录中，文件名与 partial_path 相同的形式，不会被当作输入文件。
+"""
+import os
+import shutil
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import cpu_threads
+from .metrics import for_job
+from .ffmpeg_tools import run_ffmpeg
+from .encoding import video_encode_args, container_params
+
+logger = logging.getLogger(__name__)
+
+# 短于此时长（秒）的视频不分段：切分、拼接的固定开销抵消不了并行的收益
+MIN_SEGMENT_DURATION = 120
+# 每段的最短时长（秒）
+MIN_SEGMENT_SECONDS = 20
+# 段数约为并发数的几倍，使各编码进程的负载更均匀
+SEGMENTS_PER_WORKER = 2
+
+
+def resolve_segment_workers(segment_workers):
+    """segment_workers：None / 1 表示不分段，0 表示使用全部 CPU 核心。"""
+    if segment_workers is None:
+        return 1
+    if segment_workers == 0:
+        return os.cpu_count() or 1
+    return max(1, int(segment_workers))
+
+
+def segment_seconds(duration, workers):
+    """
+    每段的目标时长（秒）；不值得分段（并发数为 1、时长未知或太短）时返回 None。
+    """
+    if workers <= 1 or not duration or duration < MIN_SEGMENT_DURATION:
+        return None
+    return max(MIN_SEGMENT_SECONDS, duration / (workers * SEGMENTS_PER_WORKER))
+
+
+def split_video(src_path, tmp_dir, seconds):
+    """按关键帧流拷贝切分 src_path 的第一条视频流，返回按顺序排列的分段路径。"""
+    pattern = os.path.join(tmp_dir, '.src%05d.part.mkv')
+    run_ffmpeg(['-i', src_path, '-map', '0:v:0', '-an', '-sn', '-c', 'copy',
+                '-f', 'segment', '-segment_time', f'{seconds:.3f}', '-reset_timestamps', '1',
+                '-segment_format', 'matroska', pattern])
+    return sorted(os.path.join(tmp_dir, n) for n in os.listdir(tmp_dir) if n.startswith('.src'))
+
+
+def _concat_line(path):
+    # concat 列表中的路径用单引号包围，路径里的单引号需要转义
+    return "file '" + path.replace("'", "'\\''") + "'\n"
+
+
+def concat_segments(paths, out_path, settings, video_format, tmp_dir):
+    """把编码后的各段流拷贝拼接为 out_path。"""
+    list_path = os.path.join(tmp_dir, '.concat.part.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.writelines(_concat_line(p) for p in paths)
+    run_ffmpeg(['-f', 'concat', '-safe', '0', '-i', list_path, '-map', '0:v:0', '-c', 'copy',
+                *container_params(settings, video_format), out_path])
+
+
+def encode_video_segmented(src_path, out_path, settings, video_format, workers, seconds):
+    """
+    分段并行重新编码 src_path 的第一条视频流到 out_path（不含音频），返回实际的段数。
+    settings 为 encoding.resolve_video_encode() 的结果；未指定线程数时按并发数平分该任务可用的线程
+    （在调度器的 CPU 通道中为任务分到的线程数，见 common.cpu_share，否则为 CPU 核心数）。
+    """
+    if not settings['threads']:
+        settings = {**settings, 'threads': max(1, (cpu_threads() or os.cpu_count() or 1) // workers)}
+    tmp_dir = tempfile.mkdtemp(prefix='.segments.', dir=os.path.dirname(os.path.abspath(out_path)))
+    try:
+        sources = split_video(src_path, tmp_dir, seconds)
+        encoded = [os.path.join(tmp_dir, f'.enc{i:05d}.part.mkv') for i in range(len(sources))]
+        args = video_encode_args(settings, 'mkv')
+
+        def encode(i):
+            run_ffmpeg(['-i', sources[i], '-map', '0:v:0', *args, encoded[i]])
+            # 编码完成的源分段立即删除，临时文件最多约为一份视频流的大小
+            os.remove(sources[i])
+
+        with ThreadPoolExecutor(min(workers, len(sources))) as pool:
+            list(pool.map(for_job(encode), range(len(sources))))
+        concat_segments(encoded, out_path, settings, video_format, tmp_dir)
+        logger.info(f"分段并行编码完成: {src_path}，{len(sources)} 段，并发 {workers}")
+        return len(sources)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
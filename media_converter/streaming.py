@@ -0,0 +1,304 @@
+"""
+大图片与多页图片的流式转换，单个任务的内存占用有上限。
+
+  - 多页 TIFF / 动图 GIF、WebP：逐帧解码、处理、写出，同一时间只有一帧在内存中。
+  - 超大单页 TIFF：按条带/分块读取（需要 tifffile），
+    直接逐块写成 TIFF / PNG，或边读边缩小后再编码为任意格式。
+  - 无法流式处理且预计内存超过上限时抛出 ImageTooLargeError，而不是把机器内存耗尽。
+"""
+import os
+import zlib
+import struct
+import itertools
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from .imageops import resize, resize_long_edge, fit_format
+
+try:
+    import tifffile
+except ImportError:  # 可选依赖：没有时大 TIFF 只能整图解码
+    tifffile = None
+
+# 可以保存多帧的输出格式
+MULTIFRAME_FORMATS = {'tiff', 'gif', 'webp'}
+# 可以逐行/逐块写出、不需要整图在内存中的输出格式
+BAND_OUTPUT_FORMATS = {'tiff', 'png'}
+TIFF_EXTS = {'.tif', '.tiff'}
+
+# 整图解码时的峰值内存约为解码后图像大小的倍数（解码缓冲 + 编码时的拷贝）
+FULL_DECODE_OVERHEAD = 2
+TILE = 256
+
+_PIL_FORMATS = {'jpeg': 'JPEG', 'png': 'PNG', 'tiff': 'TIFF', 'bmp': 'BMP', 'gif': 'GIF', 'webp': 'WEBP'}
+_MODE_ITEMSIZE = {'I;16': 2, 'I;16B': 2, 'I;16L': 2, 'I': 4, 'F': 4}
+
+
+class ImageTooLargeError(Exception):
+    """图片无法在内存上限内完成转换。"""
+
+
+def image_info(path):
+    """
+    只读文件头，返回 {'height', 'width', 'channels', 'itemsize', 'frames'}。
+    """
+    if tifffile is not None and os.path.splitext(path)[1].lower() in TIFF_EXTS:
+        with tifffile.TiffFile(path) as tf:
+            page = tf.pages[0]
+            return {'height': page.imagelength, 'width': page.imagewidth,
+                    'channels': page.samplesperpixel, 'itemsize': page.dtype.itemsize,
+                    'frames': len(tf.pages)}
+    with Image.open(path) as im:
+        return {'height': im.height, 'width': im.width, 'channels': len(im.getbands()),
+                'itemsize': _MODE_ITEMSIZE.get(im.mode, 1), 'frames': getattr(im, 'n_frames', 1)}
+
+
+def frame_bytes(info):
+    """单帧解码后的字节数。"""
+    return info['height'] * info['width'] * info['channels'] * info['itemsize']
+
+
+def _scaled_size(height, width, max_size):
+    long_edge = max(height, width)
+    if not max_size or long_edge <= max_size:
+        return height, width
+    scale = max_size / long_edge
+    return max(1, round(height * scale)), max(1, round(width * scale))
+
+
+def plan_image(path, output_format, max_size=None, memory_limit=None):
+    """
+    决定转换方式：
+      - 'full'   整图解码（默认方式）
+      - 'frames' 多页/多帧逐帧处理
+      - 'first'  多页/多帧图片输出为单帧格式，只解码第一帧
+      - 'bands'  超大单页按条带处理
+    memory_limit 为单个任务允许的最大内存（字节），None 表示不限制。
+    """
+    info = image_info(path)
+    per_frame = frame_bytes(info) * FULL_DECODE_OVERHEAD
+    if info['frames'] > 1 and output_format in MULTIFRAME_FORMATS:
+        if memory_limit and per_frame > memory_limit:
+            raise ImageTooLargeError(
+                f"单帧预计需要 {per_frame >> 20} MB 内存，超过上限 {memory_limit >> 20} MB")
+        return 'frames'
+    if info['frames'] > 1:
+        if memory_limit and per_frame > memory_limit:
+            raise ImageTooLargeError(
+                f"单帧预计需要 {per_frame >> 20} MB 内存，超过上限 {memory_limit >> 20} MB")
+        return 'first'
+    if not memory_limit or per_frame <= memory_limit:
+        return 'full'
+
+    # 超过上限：只有 tifffile 能按条带读取的 TIFF 可以流式处理
+    if tifffile is None or os.path.splitext(path)[1].lower() not in TIFF_EXTS:
+        raise ImageTooLargeError(
+            f"图片预计需要 {per_frame >> 20} MB 内存，超过上限 {memory_limit >> 20} MB，"
+            f"且该格式不支持分块读取（仅 TIFF 支持，需要安装 tifffile）")
+    out_h, out_w = _scaled_size(info['height'], info['width'], max_size)
+    small = out_h * out_w * info['channels'] * 4 * FULL_DECODE_OVERHEAD
+    if (out_h, out_w) != (info['height'], info['width']) and small <= memory_limit:
+        return 'bands'
+    if output_format not in BAND_OUTPUT_FORMATS:
+        raise ImageTooLargeError(
+            f"图片预计需要 {per_frame >> 20} MB 内存，超过上限 {memory_limit >> 20} MB；"
+            f"请改用 tiff / png 输出，或设置更小的长边像素")
+    return 'bands'
+
+
+# ------------------ 多帧：逐帧处理 ------------------ #
+
+def _frame_to_array(frame):
+    if frame.mode in ('P', 'PA', 'LA', 'RGBA'):
+        frame = frame.convert('RGBA')
+    elif frame.mode not in ('L', 'RGB', 'I;16', 'I;16B', 'I;16L'):
+        frame = frame.convert('RGB')
+    return np.asarray(frame)
+
+
+def read_first_frame(path, output_format=None):
+    """只解码多页/多帧图片的第一帧；给出 output_format 时转成该格式能保存的像素。"""
+    with Image.open(path) as src:
+        arr = _frame_to_array(src)
+    return fit_format(arr, output_format) if output_format else arr
+
+
+def convert_frames(path, out_path, output_format, max_size=None, transform=None):
+    """
+    逐帧转换多页/多帧图片：每次只解码一帧，处理后交给编码器。
+    transform(array) -> array 为可选的逐帧处理函数，在按 max_size 缩小之前执行。
+    """
+    with Image.open(path) as src:
+        def frames():
+            for frame in ImageSequence.Iterator(src):
+                arr = _frame_to_array(frame)
+                if transform is not None:
+                    arr = transform(arr)
+                arr = resize_long_edge(arr, max_size)
+                img = Image.fromarray(np.ascontiguousarray(fit_format(arr, output_format)))
+                # 保留每帧的显示时长
+                if 'duration' in frame.info:
+                    img.info['duration'] = frame.info['duration']
+                yield img
+
+        it = frames()
+        first = next(it)
+        first.save(out_path, format=_PIL_FORMATS[output_format], save_all=True, append_images=it,
+                   loop=src.info.get('loop', 0))
+    return out_path
+
+
+# ------------------ 超大单页：按条带处理 ------------------ #
+
+def iter_tiff_bands(path):
+    """
+    按条带（或一行分块）依次解码 TIFF 第一页，yield 形状为 (行数, 宽, 通道) 的数组。
+    同一时间只保留一个条带。
+    """
+    with tifffile.TiffFile(path) as tf:
+        page = tf.pages[0]
+        if page.planarconfig != 1 and page.samplesperpixel > 1:
+            raise ImageTooLargeError("不支持按通道分平面存储的 TIFF 的分块读取")
+        height, width, channels = page.imagelength, page.imagewidth, page.samplesperpixel
+        if page.is_tiled:
+            band_h = page.tilelength
+            band = None
+            band_y = 0
+            for seg, idx, _shape in page.segments(sort=True, maxworkers=1):
+                y, x = idx[2], idx[3]
+                if band is None or y != band_y:
+                    if band is not None:
+                        yield band[:min(band_h, height - band_y)]
+                    band = np.empty((band_h, width, channels), dtype=page.dtype)
+                    band_y = y
+                tile = seg.reshape(seg.shape[-3:])
+                w = min(tile.shape[1], width - x)
+                band[:, x:x + w] = tile[:, :w]
+            if band is not None:
+                yield band[:min(band_h, height - band_y)]
+        else:
+            for seg, _idx, _shape in page.segments(sort=True, maxworkers=1):
+                yield seg.reshape(seg.shape[-3:])
+
+
+def _rechunk(bands, rows):
+    """把任意高度的条带重新拼成固定 rows 行的条带（最后一块可能不足 rows 行）。"""
+    pending = []
+    count = 0
+    for band in bands:
+        pending.append(band)
+        count += band.shape[0]
+        while count >= rows:
+            merged = np.concatenate(pending) if len(pending) > 1 else pending[0]
+            yield merged[:rows]
+            rest = merged[rows:]
+            pending = [rest] if rest.shape[0] else []
+            count = rest.shape[0]
+    if count:
+        yield np.concatenate(pending) if len(pending) > 1 else pending[0]
+
+
+def downscale_bands(bands, height, width, out_h, out_w):
+    """
+    边读边缩小：每 ky 行做一次块平均，只保留缩小后的结果，最后再精确缩放到 (out_h, out_w)。
+    """
+    ky, kx = max(1, height // out_h), max(1, width // out_w)
+    ww = width // kx * kx
+    reduced = []
+    dtype = None
+    for band in _rechunk(bands, ky * 16):
+        dtype = band.dtype
+        rows = band.shape[0] // ky * ky
+        if not rows:
+            continue
+        blocks = band[:rows, :ww].reshape(rows // ky, ky, ww // kx, kx, band.shape[2])
+        reduced.append(blocks.mean(axis=(1, 3), dtype=np.float32))
+    small = np.concatenate(reduced)
+    if np.issubdtype(dtype, np.integer):
+        np.rint(small, out=small)
+    return resize(small, out_h, out_w).astype(dtype)
+
+
+def _squeeze(arr):
+    return arr[..., 0] if arr.ndim == 3 and arr.shape[2] == 1 else arr
+
+
+def write_png_stream(out_path, height, width, channels, dtype, bands):
+    """
+    逐条带写 PNG（每行使用 Up 滤波），不需要整图在内存中。只支持 8/16 位。
+    """
+    if dtype not in (np.uint8, np.uint16):
+        raise ImageTooLargeError(f"PNG 不支持 {np.dtype(dtype).name} 像素，无法流式写出")
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+    bit_depth = 8 if dtype == np.uint8 else 16
+
+    def chunk(fp, tag, data):
+        fp.write(struct.pack('>I', len(data)) + tag + data)
+        fp.write(struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    with open(out_path, 'wb') as fp:
+        fp.write(b'\x89PNG\r\n\x1a\n')
+        chunk(fp, b'IHDR', struct.pack('>IIBBBBB', width, height, bit_depth, color_type, 0, 0, 0))
+        comp = zlib.compressobj(6)
+        prev = np.zeros(width * channels * (bit_depth // 8), dtype=np.uint8)
+        for band in bands:
+            rows = np.ascontiguousarray(band.astype('>u2' if bit_depth == 16 else np.uint8, copy=False))
+            rows = rows.reshape(rows.shape[0], -1).view(np.uint8)
+            # Up 滤波：与上一行逐字节相减（按 256 取模）
+            shifted = np.empty_like(rows)
+            shifted[0] = prev
+            shifted[1:] = rows[:-1]
+            filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+            filtered[:, 0] = 2
+            np.subtract(rows, shifted, out=filtered[:, 1:])
+            prev = rows[-1].copy()
+            data = comp.compress(filtered.tobytes())
+            if data:
+                chunk(fp, b'IDAT', data)
+        chunk(fp, b'IDAT', comp.flush())
+        chunk(fp, b'IEND', b'')
+    return out_path
+
+
+def write_tiff_stream(out_path, height, width, channels, dtype, bands):
+    """逐块写 TIFF（256×256 分块），不需要整图在内存中。"""
+    def tiles():
+        for band in _rechunk(bands, TILE):
+            for x in range(0, width, TILE):
+                yield _squeeze(band[:, x:x + TILE])
+
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    tifffile.imwrite(out_path, data=tiles(), shape=shape, dtype=dtype, tile=(TILE, TILE),
+                     photometric='minisblack' if channels == 1 else 'rgb')
+    return out_path
+
+
+def convert_bands(path, out_path, output_format, max_size=None, writer=None, transform=None):
+    """
+    按条带转换超大单页 TIFF：
+      - 需要缩小时边读边缩小，最后用 writer(out_path, array) 编码小图；
+      - 否则直接逐块写成 TIFF / PNG。
+    transform(array) -> array 为可选的逐像素处理（不能改变宽高），对每个条带分别执行。
+    """
+    info = image_info(path)
+    height, width, channels = info['height'], info['width'], info['channels']
+    out_h, out_w = _scaled_size(height, width, max_size)
+    bands = iter_tiff_bands(path)
+    if (out_h, out_w) != (height, width):
+        small = downscale_bands(bands, height, width, out_h, out_w)
+        if transform is not None:
+            small = transform(small)
+        writer(out_path, _squeeze(fit_format(small, output_format)))
+        return out_path
+    with tifffile.TiffFile(path) as tf:
+        dtype = tf.pages[0].dtype
+    if transform is not None:
+        # 处理后的位深、通道数以第一个条带的结果为准
+        bands = (transform(band) for band in bands)
+        first = next(bands)
+        dtype, channels = first.dtype, first.shape[2] if first.ndim == 3 else 1
+        bands = itertools.chain([first], bands)
+    if output_format == 'png':
+        return write_png_stream(out_path, height, width, channels, dtype, bands)
+    return write_tiff_stream(out_path, height, width, channels, dtype, bands)
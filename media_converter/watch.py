@@ -0,0 +1,386 @@
+"""
+监视文件夹：持续监视目录，新文件写完后按扩展名交给调度器转换。
+
+  - Linux 上使用 inotify（通过 ctypes 直接调用，无额外依赖），其他平台或 inotify 不可用时定时轮询目录。
+  - 防抖：文件的大小和修改时间在 settle 秒内不再变化才认为写入完成。
+  - 状态索引（sqlite）记录每个已处理文件的 大小 + 修改时间 和结果，
+    重启后只处理新增或修改过的文件；转换失败的文件在被修改之前不会反复重试。
+"""
+import os
+import sys
+import json
+import time
+import select
+import struct
+import sqlite3
+import logging
+import threading
+
+from .common import KIND_EXTS, detect_kind, is_partial_output, file_fingerprint
+from .cache import default_cache_path
+from .jobs import job_result
+from .scheduler import JobScheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTLE = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+# 事件循环的最长等待时间（秒），决定防抖检查和停止请求的响应速度
+_TICK = 0.5
+
+
+def default_state_path():
+    """默认状态索引位置：与转换缓存放在同一目录。"""
+    return os.path.join(os.path.dirname(default_cache_path()), 'watch_state.sqlite3')
+
+
+class WatchState:
+    """
+    持久化的状态索引：路径 -> (大小, 修改时间, 状态, 输出, 错误)。可在多个线程中共用。
+    """
+    def __init__(self, path=None):
+        self.path = path or default_state_path()
+        self._lock = threading.Lock()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS file (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, status TEXT,
+                outputs TEXT, error TEXT, updated REAL)""")
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_current(self, path, fingerprint):
+        """该文件以同样的 大小 + 修改时间 处理过（无论成功还是失败）时返回 True。"""
+        with self._lock:
+            row = self._db.execute("SELECT size, mtime_ns FROM file WHERE path = ?",
+                                   (os.path.abspath(path),)).fetchone()
+        return row is not None and tuple(row) == tuple(fingerprint)
+
+    def record(self, path, fingerprint, result):
+        """记录一个文件的处理结果（ConversionResult）。"""
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO file VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (os.path.abspath(path), *fingerprint, 'ok' if result.ok else 'failed',
+                              json.dumps(result.outputs, ensure_ascii=False), result.error, time.time()))
+            self._db.commit()
+
+    def failed(self):
+        """返回处理失败的 [(路径, 错误信息)]。"""
+        with self._lock:
+            return self._db.execute("SELECT path, error FROM file WHERE status = 'failed'").fetchall()
+
+
+# ------------------ inotify ------------------ #
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+    """Linux inotify 的最小封装。"""
+
+    def __init__(self):
+        import ctypes
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._dirs = {}
+
+    def add_watch(self, directory):
+        import ctypes
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"无法监视目录: {directory}")
+        self._dirs[wd] = directory
+
+    def read(self, timeout):
+        """等待最多 timeout 秒，返回 [(路径, mask)]；mask 含 IN_Q_OVERFLOW 时路径为 None。"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            directory = self._dirs.get(wd)
+            if mask & IN_Q_OVERFLOW or directory is None:
+                events.append((None, mask))
+            else:
+                events.append((os.path.join(directory, os.fsdecode(name)), mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_inotify():
+    """可用时返回 Inotify，否则返回 None（改为轮询）。"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        return Inotify()
+    except (OSError, AttributeError) as e:
+        logger.warning(f"inotify 不可用，改为轮询: {e}")
+        return None
+
+
+# ------------------ 监视 ------------------ #
+
+class FolderWatcher:
+    """
+    监视 dirs 中的文件，写入完成且不在状态索引中的文件交给 submit(路径, 类型, on_done)，
+    on_done(result) 由 submit 在任务结束时调用；任务被取消时传入 None，不写入状态索引。
+      - kind: 只处理某一类文件，None 表示三类都处理
+      - exclude: 忽略这些目录下的文件（如位于监视目录中的输出目录）
+      - use_inotify: False 时总是轮询
+    """
+
+    def __init__(self, dirs, submit, state, kind=None, recursive=False, settle=DEFAULT_SETTLE,
+                 poll_interval=DEFAULT_POLL_INTERVAL, exclude=(), use_inotify=True):
+        self.dirs = [os.path.abspath(d) for d in dirs]
+        self.submit = submit
+        self.state = state
+        self.kind = kind
+        self.recursive = recursive
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.exclude = [os.path.abspath(d) for d in exclude if d]
+        self._exts = set(KIND_EXTS[kind]) if kind else {e for v in KIND_EXTS.values() for e in v}
+        self._inotify = open_inotify() if use_inotify else None
+        self._lock = threading.Lock()
+        self._pending = {}      # 路径 -> [指纹, 最后一次变化的时间]
+        self._running = set()   # 正在转换的路径
+
+    @property
+    def mode(self):
+        return 'inotify' if self._inotify else 'polling'
+
+    def _wanted(self, path):
+        if os.path.splitext(path)[1].lower() not in self._exts or is_partial_output(path):
+            return False
+        return not any(path == d or path.startswith(d + os.sep) for d in self.exclude)
+
+    def _walk(self, top):
+        """返回 top 下的 (子目录列表, 文件列表)，递归与否取决于 recursive。"""
+        subdirs, files = [], []
+        for root, dirnames, names in os.walk(top):
+            if any(root == d or root.startswith(d + os.sep) for d in self.exclude):
+                dirnames[:] = []
+                continue
+            subdirs.append(root)
+            files.extend(os.path.join(root, n) for n in names)
+            if not self.recursive:
+                break
+        return subdirs, files
+
+    def _touch(self, path, now):
+        """文件有变化：加入（或刷新）待处理列表。"""
+        if self._wanted(path):
+            entry = self._pending.get(path)
+            if entry is None:
+                self._pending[path] = [None, now]
+            else:
+                entry[1] = now
+
+    def _scan(self, top, now, watch=False):
+        """扫描目录，把新增或修改过的文件加入待处理列表；watch 为 True 时同时给子目录加 inotify 监视。"""
+        try:
+            subdirs, files = self._walk(top)
+        except OSError as e:
+            logger.warning(f"扫描目录失败: {top}, 错误: {e}")
+            return
+        if watch:
+            for d in subdirs:
+                try:
+                    self._inotify.add_watch(d)
+                except OSError as e:
+                    logger.warning(f"{e}")
+        for path in files:
+            if path in self._pending or not self._wanted(path):
+                continue
+            try:
+                fp = file_fingerprint(path)
+            except OSError:
+                continue
+            if not self.state.is_current(path, fp):
+                self._pending[path] = [fp, now]
+
+    def _handle_events(self, events, now):
+        for path, mask in events:
+            if path is None:
+                # 事件队列溢出，可能漏掉了文件，整体重新扫描
+                logger.warning("inotify 事件队列溢出，重新扫描监视目录")
+                for d in self.dirs:
+                    self._scan(d, now)
+            elif mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    self._scan(path, now, watch=True)
+            else:
+                self._touch(path, now)
+
+    def _check_pending(self, now):
+        """提交已经写完（指纹在 settle 秒内未变）的文件。"""
+        for path, entry in list(self._pending.items()):
+            try:
+                fp = file_fingerprint(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            if fp != entry[0]:
+                entry[0], entry[1] = fp, now
+                continue
+            if now - entry[1] < self.settle:
+                continue
+            with self._lock:
+                if path in self._running:
+                    continue  # 上一次转换还没结束，结束后再处理
+                del self._pending[path]
+                if self.state.is_current(path, fp):
+                    continue
+                self._running.add(path)
+            self._start(path, fp)
+
+    def _start(self, path, fp):
+        kind = self.kind or detect_kind(path)
+
+        def on_done(result):
+            if result is not None:
+                self.state.record(path, fp, result)
+            with self._lock:
+                self._running.discard(path)
+
+        logger.info(f"监视到新文件: {path}")
+        self.submit(path, kind, on_done)
+
+    def run(self, stop_event=None):
+        """
+        阻塞运行，直到 stop_event 被设置（或 KeyboardInterrupt）。
+        启动时先扫描一遍目录，处理上次退出后新增或修改的文件。
+        """
+        stop_event = stop_event or threading.Event()
+        logger.info(f"开始监视（{self.mode}）: {', '.join(self.dirs)}")
+        now = time.monotonic()
+        for d in self.dirs:
+            self._scan(d, now, watch=self._inotify is not None)
+        last_scan = now
+        try:
+            while not stop_event.is_set():
+                if self._inotify:
+                    events = self._inotify.read(_TICK)
+                    self._handle_events(events, time.monotonic())
+                else:
+                    stop_event.wait(_TICK)
+                    if time.monotonic() - last_scan >= self.poll_interval:
+                        last_scan = time.monotonic()
+                        for d in self.dirs:
+                            self._scan(d, last_scan)
+                self._check_pending(time.monotonic())
+        finally:
+            if self._inotify:
+                self._inotify.close()
+                self._inotify = None
+            logger.info("停止监视")
+
+
+def watch_folders(dirs, output_dir, kind=None, image_format='jpeg', audio_format='mp3', recursive=False,
+                  max_workers=None, io_workers=None, audio_only=False, stream_copy=None, video_format=None,
+                  callback=None, cache=None, image_quality='full', max_size=None, memory_limit=None,
+                  settle=DEFAULT_SETTLE, poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=True,
+                  state_path=None, stop_event=None, scheduler=None, video_encode=None, image_ops=None,
+                  image_outputs=None, segment_workers=None, probe=None, audio_encode=None, video_frames=None,
+                  frame_output=None):
+    """
+    持续监视 dirs，新文件写完后自动转换到 output_dir，直到 stop_event 被设置。
+    转换参数与 convert_files 相同；callback(result) 在每个文件转换完成时调用。
+      - output_dir 必须指定（输出放回原目录时新生成的文件会被当作新输入）；
+        位于监视目录中的输出目录会被自动忽略。
+      - settle: 文件大小和修改时间保持不变多少秒后才开始转换。
+      - poll_interval: 轮询模式下重新扫描目录的间隔（秒）。
+      - state_path: 状态索引文件，默认与转换缓存放在同一目录。
+      - probe: ProbeIndex，给出时新文件先只读文件头探测（见 convert_files）。
+    """
+    if not output_dir:
+        raise ValueError("监视模式需要指定输出目录")
+    missing = [d for d in dirs if not os.path.isdir(d)]
+    if missing:
+        raise ValueError(f"监视目录不存在: {', '.join(missing)}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    own_scheduler = scheduler is None
+    if own_scheduler:
+        scheduler = JobScheduler(cpu_workers=max_workers, io_workers=io_workers)
+    # 未结束的任务；不用 JobGroup，避免长时间运行时任务列表无限增长
+    live = set()
+    live_lock = threading.Lock()
+
+    def submit(path, k, on_done):
+        def done(job):
+            with live_lock:
+                live.discard(job)
+            if job.state == 'cancelled':
+                on_done(None)
+                return
+            result = job_result(job, k)
+            on_done(result)
+            if callback:
+                callback(result)
+        info = probe.probe(path, k) if probe is not None else None
+        if k == 'image':
+            job = scheduler.submit_image(path, image_format, output_dir, cache=cache, callback=done, info=info,
+                                         quality=image_quality, max_size=max_size, memory_limit=memory_limit,
+                                         ops=image_ops, outputs=image_outputs)
+        elif k == 'video' and video_frames:
+            job = scheduler.submit_frames(path, output_dir, video_frames, frame_output or image_format, cache=cache,
+                                          callback=done, info=info)
+        elif k == 'video':
+            job = scheduler.submit_video(path, output_dir, audio_only, audio_format, video_format,
+                                         stream_copy, cache=cache, callback=done, video_encode=video_encode,
+                                         segment_workers=segment_workers, info=info)
+        else:
+            job = scheduler.submit_audio(path, audio_format, output_dir, cache=cache, callback=done, info=info,
+                                         audio_encode=audio_encode)
+        with live_lock:
+            if not job.finished:
+                live.add(job)
+
+    with WatchState(state_path) as state:
+        watcher = FolderWatcher(dirs, submit, state, kind=kind, recursive=recursive, settle=settle,
+                                poll_interval=poll_interval, exclude=[output_dir], use_inotify=use_inotify)
+        try:
+            watcher.run(stop_event)
+        finally:
+            # 排队中的任务取消，正在执行的任务完成后再关闭状态索引
+            with live_lock:
+                jobs = list(live)
+            for job in jobs:
+                job.cancel()
+            for job in jobs:
+                job.wait()
+            if own_scheduler:
+                scheduler.shutdown()
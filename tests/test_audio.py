@@ -0,0 +1,149 @@
+"""音频编码参数的解析和响度测量（门限响度、峰值、归一化增益）。"""
+import math
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from media_converter.audio import (resolve_audio_encode, is_default_audio, audio_encode_args, LoudnessMeter,
+                                   normalize_gain, transcode_audio, DEFAULT_LOUDNESS, PEAK_CEILING)
+from media_converter.ffmpeg_tools import run_ffmpeg
+
+RATE = 8000
+
+
+def _sine(amplitude, seconds, channels=1, freq=440.0):
+    t = np.arange(int(RATE * seconds)) / RATE
+    wave = (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+    return np.repeat(wave[:, None], channels, axis=1)
+
+
+def _loudness(frames, channels=1, chunk=None):
+    meter = LoudnessMeter(RATE, channels)
+    chunk = chunk or len(frames)
+    for start in range(0, len(frames), chunk):
+        meter.add(frames[start:start + chunk])
+    return meter
+
+
+# ------------------ resolve_audio_encode ------------------ #
+
+def test_defaults():
+    settings = resolve_audio_encode(None)
+    assert settings == {'bitrate': None, 'sample_rate': None, 'channels': None, 'normalize': None}
+    assert is_default_audio(settings)
+
+
+def test_normalizes_values():
+    settings = resolve_audio_encode({'bitrate': ' 192K ', 'sample_rate': '48000', 'channels': '1',
+                                     'normalize': True})
+    assert settings == {'bitrate': '192k', 'sample_rate': 48000, 'channels': 1, 'normalize': DEFAULT_LOUDNESS}
+    assert not is_default_audio(settings)
+    assert resolve_audio_encode({'normalize': False})['normalize'] is None
+    assert resolve_audio_encode({'normalize': '-23'})['normalize'] == -23.0
+
+
+@pytest.mark.parametrize('audio_encode, message', [
+    ({'volume': 2}, '未知的音频参数: volume'),
+    ({'bitrate': 'fast'}, '音频码率格式错误'),
+    ({'sample_rate': 'cd'}, '音频参数错误'),
+    ({'sample_rate': 4000}, '采样率应在'),
+    ({'channels': 0}, '声道数应在'),
+    ({'channels': 9}, '声道数应在'),
+    ({'normalize': 3}, '目标响度应在'),
+    ({'normalize': -80}, '目标响度应在'),
+])
+def test_invalid(audio_encode, message):
+    with pytest.raises(ValueError, match=message):
+        resolve_audio_encode(audio_encode)
+
+
+def test_encode_args():
+    settings = resolve_audio_encode({'bitrate': '128k', 'sample_rate': 44100, 'channels': 2})
+    assert audio_encode_args(settings, 'mp3') == ['-c:a', 'libmp3lame', '-b:a', '128k', '-ar', '44100', '-ac', '2']
+    # 无损格式忽略码率
+    assert audio_encode_args(settings, 'FLAC') == ['-c:a', 'flac', '-ar', '44100', '-ac', '2']
+
+
+# ------------------ LoudnessMeter ------------------ #
+
+def test_full_scale_sine():
+    # 正弦波的均方值为 A²/2，满幅单声道约 -3.01 dB；各声道相加，立体声约 0 dB
+    assert _loudness(_sine(1.0, 3)).loudness() == pytest.approx(10 * math.log10(0.5), abs=0.01)
+    assert _loudness(_sine(1.0, 3, channels=2), channels=2).loudness() == pytest.approx(0.0, abs=0.01)
+
+
+def test_peak():
+    meter = _loudness(_sine(0.5, 1))
+    assert meter.peak == pytest.approx(0.5, abs=1e-3)
+
+
+def test_streaming_matches_single_chunk():
+    frames = _sine(0.3, 5.37)
+    whole = _loudness(frames).loudness()
+    # 块长度与 100ms 子块不对齐，剩余的帧拼到下一块
+    assert _loudness(frames, chunk=333).loudness() == pytest.approx(whole, abs=1e-6)
+
+
+def test_silence_and_below_absolute_gate():
+    assert _loudness(np.zeros((RATE * 2, 1), dtype=np.float32)).loudness() is None
+    assert _loudness(_sine(1e-4, 2)).loudness() is None   # 约 -83 dB，低于 -70 dB 的绝对门限
+    assert LoudnessMeter(RATE, 1).loudness() is None
+
+
+def test_relative_gate_ignores_quiet_passages():
+    # 10 秒 -9 dB 的内容加 10 秒 -49 dB 的底噪：底噪低于相对门限，不拉低测得的响度
+    loud, quiet = _sine(0.5, 10), _sine(0.005, 10)
+    expected = 10 * math.log10(0.5 ** 2 / 2)
+    assert _loudness(np.concatenate((loud, quiet))).loudness() == pytest.approx(expected, abs=0.1)
+    # 只有绝对门限时（两段都高于 -70 dB）整体平均会低约 3 dB
+    ungated = 10 * math.log10((0.5 ** 2 / 2 + 0.005 ** 2 / 2) / 2)
+    assert expected - ungated > 2.9
+
+
+def test_short_clip_uses_single_block():
+    # 不足 400ms 时整段作为一块
+    assert _loudness(_sine(1.0, 0.25)).loudness() == pytest.approx(10 * math.log10(0.5), abs=0.05)
+
+
+# ------------------ normalize_gain ------------------ #
+
+def test_gain_reaches_target():
+    assert normalize_gain(-30.0, 0.1, -16.0) == pytest.approx(14.0)
+
+
+def test_gain_limited_by_peak_ceiling():
+    # 峰值 0.5（约 -6 dBFS）最多只能提升到 -1 dBFS
+    assert normalize_gain(-30.0, 0.5, -16.0) == pytest.approx(PEAK_CEILING - 20 * math.log10(0.5))
+
+
+def test_gain_for_silence():
+    assert normalize_gain(None, 0.0, -16.0) == 0.0
+    assert normalize_gain(-20.0, 0.0, -16.0) == 0.0
+
+
+# ------------------ 损坏的输入 ------------------ #
+
+def _corrupt_mp3(tmp_path):
+    """10 分钟的低码率 MP3，每隔 300 字节改坏一个字节：解码时 stderr 输出远超管道缓冲区（64 KB）的错误。"""
+    clean = str(tmp_path / 'clean.mp3')
+    run_ffmpeg(['-f', 'lavfi', '-i', 'sine=f=440:d=600', '-ac', '1', '-ar', '8000', '-b:a', '8k', clean])
+    data = bytearray(open(clean, 'rb').read())
+    rng = random.Random(1)
+    for i in range(2000, len(data), 300):
+        data[i] = rng.randrange(256)
+    bad = tmp_path / 'bad.mp3'
+    bad.write_bytes(bytes(data))
+    return str(bad)
+
+
+def test_normalize_corrupt_input_does_not_hang(tmp_path):
+    src, out = _corrupt_mp3(tmp_path), str(tmp_path / 'out.mp3')
+    outcome = []
+    worker = threading.Thread(target=lambda: outcome.append(
+        transcode_audio(src, out, 'mp3', resolve_audio_encode({'normalize': True}))), daemon=True)
+    worker.start()
+    worker.join(60)
+    assert not worker.is_alive(), "解码进程阻塞在写 stderr 上"
+    assert outcome and (tmp_path / 'out.mp3').stat().st_size > 0
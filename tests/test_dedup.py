@@ -0,0 +1,100 @@
+"""按内容去重的分组（find_duplicates / split_duplicates）和输出文件名对应。"""
+import os
+
+import pytest
+
+from media_converter.cache import ConversionCache
+from media_converter.jobs import ConversionResult
+from media_converter.dedup import (PARTIAL_BYTES, find_duplicates, split_duplicates, duplicate_output,
+                                  replicate_result)
+
+
+def _write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.fixture
+def files(tmp_path):
+    """小文件两组重复；大文件开头结尾相同、只有中间不同（部分哈希相同，完整哈希不同）。"""
+    big = os.urandom(3 * PARTIAL_BYTES)
+    changed = big[:PARTIAL_BYTES + 10] + bytes([big[PARTIAL_BYTES + 10] ^ 1]) + big[PARTIAL_BYTES + 11:]
+    return {
+        'a': _write(tmp_path, 'a.jpg', b'same content'),
+        'b': _write(tmp_path, 'b.jpg', b'other bytes!'),   # 与 a 大小相同、内容不同
+        'c': _write(tmp_path, 'c.jpg', b'same content'),
+        'd': _write(tmp_path, 'd.jpg', b'x'),
+        'e': _write(tmp_path, 'e.jpg', b'x'),
+        'big1': _write(tmp_path, 'big1.mp4', big),
+        'big2': _write(tmp_path, 'big2.mp4', changed),
+        'big3': _write(tmp_path, 'big3.mp4', big),
+    }
+
+
+def test_groups_by_full_content(files):
+    f = files
+    groups = find_duplicates([f['e'], f['a'], f['b'], f['big1'], f['c'], f['big2'], f['d'], f['big3']])
+    # 组内、组间都按输入中第一次出现的位置排序
+    assert groups == [[f['e'], f['d']], [f['a'], f['c']], [f['big1'], f['big3']]]
+
+
+def test_split_keeps_first_of_each_group(files):
+    f = files
+    paths = [f['a'], f['b'], f['c'], f['d'], f['e']]
+    todo, copies = split_duplicates(paths)
+    assert todo == [f['a'], f['b'], f['d']]
+    assert copies == {f['a']: [f['c']], f['d']: [f['e']]}
+
+
+def test_no_duplicates(files):
+    f = files
+    assert split_duplicates([f['a'], f['b'], f['big1'], f['big2']]) == ([f['a'], f['b'], f['big1'], f['big2']], {})
+
+
+def test_unreadable_files_are_left_alone(files, tmp_path):
+    f = files
+    missing = str(tmp_path / 'missing.jpg')
+    todo, copies = split_duplicates([missing, f['a'], f['c']])
+    assert todo == [missing, f['a']]
+    assert copies == {f['a']: [f['c']]}
+
+
+def test_uses_cache_hashes(files, tmp_path):
+    f = files
+    with ConversionCache(str(tmp_path / 'cache.db')) as cache:
+        groups = find_duplicates([f['big1'], f['big2'], f['big3']], cache)
+        assert groups == [[f['big1'], f['big3']]]
+        # 完整哈希写入了缓存的哈希记录，之后查询缓存时不必再计算
+        rows = cache._db.execute("SELECT path FROM file_hash").fetchall()
+        assert {p for (p,) in rows} == {os.path.abspath(f[k]) for k in ('big1', 'big2', 'big3')}
+
+
+def test_duplicate_output_names():
+    out = os.path.join('out', 'IMG_001_1600.webp')
+    assert duplicate_output('cards/IMG_001.CR2', out, 'backup/IMG_001 (1).CR2') == \
+        os.path.join('backup', 'IMG_001 (1)_1600.webp')
+    assert duplicate_output('cards/IMG_001.CR2', out, 'backup/copy.CR2', 'out') == \
+        os.path.join('out', 'copy_1600.webp')
+    with pytest.raises(ValueError):
+        duplicate_output('cards/IMG_001.CR2', 'out/other.jpeg', 'backup/copy.CR2')
+
+
+def test_replicate_links_outputs(tmp_path):
+    src = _write(tmp_path, 'a.wav', b'pcm')
+    dup = _write(tmp_path, 'b.wav', b'pcm')
+    out = _write(tmp_path, 'a.mp3', b'mp3 data')
+    result = replicate_result(ConversionResult(src, 'audio', [out]), dup)
+    assert result.ok and result.outputs == [str(tmp_path / 'b.mp3')]
+    assert os.path.samefile(out, result.outputs[0])
+
+
+def test_replicate_never_replaces_the_duplicate_input(tmp_path):
+    # 输入已是目标格式、未指定输出目录时输出就是输入本身，重复文件自己就是它的"输出"
+    keep = _write(tmp_path, 'x.mp3', b'same')
+    dup = _write(tmp_path, 'y.mp3', b'same')
+    inode = os.stat(dup).st_ino
+    result = replicate_result(ConversionResult(keep, 'audio', [keep]), dup)
+    assert result.ok and result.outputs == [dup]
+    assert os.stat(dup).st_ino == inode and os.stat(dup).st_nlink == 1
+    assert os.stat(keep).st_nlink == 1
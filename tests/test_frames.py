@@ -0,0 +1,125 @@
+"""抽帧方式的解析、时间点计算和联系表拼接。"""
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from media_converter.ffmpeg_tools import run_ffmpeg
+from media_converter.frames import (resolve_frames, sample_times, stream_frames, ContactSheet,
+                                    DEFAULT_FRAME_COUNT, SEQUENTIAL_INTERVAL, SHEET_GAP, SHEET_MAX_TILES)
+
+
+# ------------------ resolve_frames ------------------ #
+
+@pytest.mark.parametrize('frames, expected', [
+    ('count', {'mode': 'count', 'value': DEFAULT_FRAME_COUNT, 'sheet': None}),
+    (' COUNT:24 ', {'mode': 'count', 'value': 24, 'sheet': None}),
+    ('interval:2.5', {'mode': 'interval', 'value': 2.5, 'sheet': None}),
+    ('keyframes', {'mode': 'keyframes', 'value': None, 'sheet': None}),
+    ('keyframes:200', {'mode': 'keyframes', 'value': 200, 'sheet': None}),
+    ({'mode': 'count', 'value': '6', 'sheet': True}, {'mode': 'count', 'value': 6, 'sheet': 0}),
+    ({'mode': 'interval', 'value': 10, 'sheet': 4}, {'mode': 'interval', 'value': 10.0, 'sheet': 4}),
+    ({'mode': 'keyframes', 'sheet': False}, {'mode': 'keyframes', 'value': None, 'sheet': None}),
+])
+def test_resolve(frames, expected):
+    assert resolve_frames(frames) == expected
+
+
+@pytest.mark.parametrize('frames, message', [
+    ('thumbnails', '不支持的抽帧方式'),
+    ('', '不支持的抽帧方式'),
+    ('interval', '抽帧参数错误'),
+    ('interval:0', '抽帧参数错误'),
+    ('count:0', '抽帧参数错误'),
+    ('count:many', '抽帧参数错误'),
+    ('keyframes:-1', '抽帧参数错误'),
+    ({'mode': 'count', 'sheet': -2}, '抽帧参数错误'),
+    ({'mode': 'count', 'every': 3}, '未知的抽帧参数: every'),
+])
+def test_resolve_invalid(frames, message):
+    with pytest.raises(ValueError, match=message):
+        resolve_frames(frames)
+
+
+# ------------------ sample_times ------------------ #
+
+def test_count_takes_segment_midpoints():
+    assert sample_times(resolve_frames('count:4'), 100.0) == [12.5, 37.5, 62.5, 87.5]
+
+
+def test_interval_times():
+    assert sample_times(resolve_frames('interval:10'), 35.0) == [0, 10, 20, 30]
+    assert sample_times(resolve_frames('interval:10'), 30.0) == [0, 10, 20]
+
+
+def test_sequential_modes_return_none():
+    assert sample_times(resolve_frames('keyframes'), 100.0) is None
+    assert sample_times(resolve_frames(f'interval:{SEQUENTIAL_INTERVAL / 2}'), 100.0) is None
+
+
+def test_unknown_duration():
+    with pytest.raises(ValueError, match='无法获取视频时长'):
+        sample_times(resolve_frames('count:4'), None)
+
+
+# ------------------ ContactSheet ------------------ #
+
+def _frame(value, h=90, w=160):
+    return np.full((h, w, 3), value, dtype=np.uint8)
+
+
+def test_sheet_layout_in_frame_order():
+    sheet = ContactSheet(columns=2)
+    for i in (2, 0, 1):   # 并行抽帧时可能乱序到达
+        sheet.add(i, _frame(10 * (i + 1)))
+    image = sheet.build()
+    tile_h, tile_w = 90, 160
+    assert image.shape == (2 * (tile_h + SHEET_GAP) + SHEET_GAP, 2 * (tile_w + SHEET_GAP) + SHEET_GAP, 3)
+    assert image[SHEET_GAP, SHEET_GAP, 0] == 10
+    assert image[SHEET_GAP, 2 * SHEET_GAP + tile_w, 0] == 20
+    assert image[2 * SHEET_GAP + tile_h, SHEET_GAP, 0] == 30
+
+
+def test_sheet_auto_columns_is_roughly_square():
+    sheet = ContactSheet()
+    for i in range(9):
+        sheet.add(i, _frame(i, 100, 100))
+    image = sheet.build()
+    assert image.shape[0] == image.shape[1]
+
+
+def test_sheet_thins_out_when_full():
+    sheet = ContactSheet()
+    for i in range(SHEET_MAX_TILES * 3):
+        sheet.add(i, _frame(i % 256, 8, 8))
+    assert len(sheet._tiles) <= SHEET_MAX_TILES
+    # 保留的帧间隔相同，覆盖整段视频
+    kept = sorted(sheet._tiles)
+    assert len({b - a for a, b in zip(kept, kept[1:])}) == 1
+    assert kept[0] == 0 and kept[-1] >= SHEET_MAX_TILES * 3 - 4
+
+
+def test_empty_sheet():
+    assert ContactSheet().build() is None
+
+
+# ------------------ 损坏的输入 ------------------ #
+
+def test_corrupt_video_does_not_hang(tmp_path):
+    # 5 分钟的 MPEG-1 小视频，每隔 300 字节改坏一个字节：解码错误远超管道缓冲区（64 KB）
+    clean = str(tmp_path / 'clean.avi')
+    run_ffmpeg(['-f', 'lavfi', '-i', 'testsrc=s=64x64:r=25:d=300', '-c:v', 'mpeg1video', '-q:v', '5', clean])
+    data = bytearray(open(clean, 'rb').read())
+    rng = random.Random(1)
+    for i in range(8000, len(data), 300):
+        data[i] = rng.randrange(256)
+    bad = tmp_path / 'bad.avi'
+    bad.write_bytes(bytes(data))
+    frames = []
+    worker = threading.Thread(target=lambda: frames.extend(
+        stream_frames(str(bad), resolve_frames('interval:1'))), daemon=True)
+    worker.start()
+    worker.join(60)
+    assert not worker.is_alive(), "解码进程阻塞在写 stderr 上"
+    assert frames
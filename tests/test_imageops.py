@@ -0,0 +1,40 @@
+"""图片操作链的解析（parse_ops / format_ops）。"""
+import pytest
+
+from media_converter.imageops import parse_ops, format_ops
+
+
+def test_parse_all_operations():
+    ops = parse_ops(['crop=10,20,300,200', 'resize=1600', 'resize=640x480', 'srgb=Adobe_RGB',
+                     '8bit', 'strip_alpha', 'strip_alpha=#102030'])
+    assert ops == [('crop', (10, 20, 300, 200)), ('resize', (1600,)), ('resize', (640, 480)),
+                   ('srgb', ('adobe_rgb',)), ('8bit', ()), ('strip_alpha', (255, 255, 255)),
+                   ('strip_alpha', (0x10, 0x20, 0x30))]
+
+
+def test_semicolon_string_and_blanks():
+    assert parse_ops(' resize=800 ; ;8bit ') == [('resize', (800,)), ('8bit', ())]
+    assert parse_ops(None) == []
+    assert parse_ops('') == []
+
+
+@pytest.mark.parametrize('spec', [
+    'crop=1,2,3', 'crop=0,0,0,10', 'crop=a,b,c,d', 'resize=0', 'resize=10x0', 'resize=big',
+    'srgb=cmyk', '8bit=1', 'strip_alpha=fff', 'strip_alpha=zzzzzz',
+])
+def test_invalid_arguments(spec):
+    with pytest.raises(ValueError, match='图片操作参数错误'):
+        parse_ops([spec])
+
+
+def test_unknown_operation():
+    with pytest.raises(ValueError, match='未知的图片操作: blur'):
+        parse_ops('blur=3')
+
+
+def test_format_round_trip():
+    specs = ['crop=10,20,300,200', 'resize=1600', 'resize=640x480', 'srgb=display_p3', '8bit',
+             'strip_alpha=102030']
+    ops = parse_ops(specs)
+    assert format_ops(ops) == specs
+    assert parse_ops(format_ops(ops)) == ops
@@ -0,0 +1,97 @@
+"""批次清单：中断后的加载、剩余任务判断和 resume_batch 继续执行。"""
+import os
+import json
+import wave
+
+from media_converter.jobs import ConversionResult
+from media_converter.manifest import BatchManifest, find_unfinished, resume_batch
+
+
+def _write_wav(path, frames=4410):
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(44100)
+        w.writeframes(b'\x00\x10' * frames)
+
+
+def _interrupted_batch(tmp_path):
+    """模拟中途退出的批次：a 已成功，b 失败，c 未执行，最后一行只写了一半。"""
+    out_dir = tmp_path / 'out'
+    out_dir.mkdir()
+    inputs = []
+    for name in ('a', 'b', 'c'):
+        path = str(tmp_path / f'{name}.wav')
+        _write_wav(path)
+        inputs.append(path)
+    done = out_dir / 'a.flac'
+    done.write_bytes(b'flac')
+    path = str(tmp_path / 'batch.jsonl')
+    options = {'kind': 'audio', 'audio_format': 'flac', 'output_dir': str(out_dir)}
+    with BatchManifest.open(path, options, [(p, 'audio') for p in inputs]) as manifest:
+        manifest.record(ConversionResult(inputs[0], 'audio', [str(done)]))
+        manifest.record(ConversionResult(inputs[1], 'audio', error="解码失败"))
+    with open(path, 'a', encoding='utf-8') as fp:
+        fp.write('{"type": "result", "input": ')
+    return path, inputs, out_dir
+
+
+def test_load_skips_torn_last_line(tmp_path):
+    path, inputs, _out_dir = _interrupted_batch(tmp_path)
+    manifest = BatchManifest.load(path)
+    assert manifest.options['audio_format'] == 'flac'
+    assert [p for p, _k in manifest.jobs] == [os.path.abspath(p) for p in inputs]
+    assert manifest.is_done(inputs[0])
+    assert [p for p, _k in manifest.remaining()] == [os.path.abspath(p) for p in inputs[1:]]
+    assert not manifest.finished
+
+
+def test_missing_output_is_redone(tmp_path):
+    path, inputs, out_dir = _interrupted_batch(tmp_path)
+    os.remove(out_dir / 'a.flac')
+    manifest = BatchManifest.load(path)
+    assert not manifest.is_done(inputs[0])
+    assert len(manifest.remaining()) == 3
+
+
+def test_open_existing_appends_new_jobs(tmp_path):
+    path, inputs, _out_dir = _interrupted_batch(tmp_path)
+    extra = str(tmp_path / 'd.wav')
+    _write_wav(extra)
+    with BatchManifest.open(path, {}, [(inputs[0], 'audio'), (extra, 'audio')]) as manifest:
+        assert len(manifest.jobs) == 4
+    manifest = BatchManifest.load(path)
+    assert manifest.jobs[-1] == (os.path.abspath(extra), 'audio')
+    # 重新打开时不覆盖创建时记录的参数
+    assert manifest.options['audio_format'] == 'flac'
+
+
+def test_not_a_manifest(tmp_path):
+    path = tmp_path / 'other.jsonl'
+    path.write_text(json.dumps({'type': 'result'}) + '\n', encoding='utf-8')
+    try:
+        BatchManifest.load(str(path))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("应当抛出 ValueError")
+
+
+def test_find_unfinished(tmp_path):
+    path, _inputs, _out_dir = _interrupted_batch(tmp_path)
+    finished = str(tmp_path / 'finished.jsonl')
+    BatchManifest.open(finished, {}, []).close()
+    assert [m.path for m in find_unfinished(str(tmp_path))] == [path]
+
+
+def test_resume_runs_only_remaining(tmp_path):
+    path, inputs, out_dir = _interrupted_batch(tmp_path)
+    results = resume_batch(path)
+    assert sorted(r.input_path for r in results) == sorted(os.path.abspath(p) for p in inputs[1:])
+    assert all(r.ok for r in results), [r.error for r in results]
+    assert (out_dir / 'b.flac').exists() and (out_dir / 'c.flac').exists()
+    # 已完成的 a 没有重做（输出仍是之前的占位内容）
+    assert (out_dir / 'a.flac').read_bytes() == b'flac'
+    manifest = BatchManifest.load(path)
+    assert manifest.finished
+    assert resume_batch(path) == []
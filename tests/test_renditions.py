@@ -0,0 +1,61 @@
+"""多份输出参数的解析（parse_outputs / format_outputs）。"""
+import imageio
+import numpy as np
+import pytest
+from PIL import Image
+
+from media_converter.converters import convert_image
+from media_converter.renditions import parse_outputs, format_outputs
+
+
+def test_string_specs():
+    assert parse_outputs('jpeg; webp:1600:q80 ;png:256:_thumb') == [
+        {'format': 'jpeg', 'max_size': None, 'quality': None, 'suffix': '', 'ext': 'jpeg'},
+        {'format': 'webp', 'max_size': 1600, 'quality': 80, 'suffix': '_1600', 'ext': 'webp'},
+        {'format': 'png', 'max_size': 256, 'quality': None, 'suffix': '_thumb', 'ext': 'png'},
+    ]
+
+
+def test_dict_specs_and_aliases():
+    # 别名只在编码时换成对应格式，扩展名保留调用者的写法
+    assert parse_outputs([{'format': 'JPG', 'max_size': 0, 'quality': 90}]) == [
+        {'format': 'jpeg', 'max_size': None, 'quality': 90, 'suffix': '', 'ext': 'jpg'}]
+    assert parse_outputs('tif:512')[0] == {'format': 'tiff', 'max_size': 512, 'quality': None,
+                                          'suffix': '_512', 'ext': 'tif'}
+    assert parse_outputs([{'format': 'png', 'max_size': 512, 'suffix': '_s'}])[0]['suffix'] == '_s'
+
+
+def test_quality_prefix_is_case_insensitive():
+    assert parse_outputs(['jpeg:Q75'])[0]['quality'] == 75
+
+
+@pytest.mark.parametrize('specs, message', [
+    (['heic'], '不支持的输出格式'),
+    (['png:q80'], '不能设置编码质量'),
+    (['jpeg:q0'], '编码质量应在'),
+    (['jpeg:q101'], '编码质量应在'),
+    ([{'format': 'jpeg', 'max_size': -5}], '长边像素必须大于 0'),
+    ([], '至少需要一份输出'),
+    (' ; ', '至少需要一份输出'),
+    (None, '至少需要一份输出'),
+])
+def test_invalid_specs(specs, message):
+    with pytest.raises(ValueError, match=message):
+        parse_outputs(specs)
+
+
+def test_format_round_trip():
+    specs = ['jpeg', 'webp:1600:q80', 'png:256:_thumb', 'jpeg:q70:_small']
+    assert format_outputs(specs) == ['jpeg', 'webp:1600:q80:_1600', 'png:256:_thumb', 'jpeg:q70:_small']
+    assert parse_outputs(format_outputs(specs)) == parse_outputs(specs)
+    assert format_outputs(['jpg:q90', 'tif']) == ['jpg:q90', 'tif']
+
+
+@pytest.mark.parametrize('fmt, encoded', [('jpg', 'JPEG'), ('tif', 'TIFF')])
+def test_convert_image_keeps_alias_extension(tmp_path, fmt, encoded):
+    src = str(tmp_path / 'a.png')
+    imageio.imsave(src, np.zeros((8, 8, 3), dtype=np.uint8))
+    out = convert_image(src, fmt)
+    assert out == str(tmp_path / f'a.{fmt}')
+    with Image.open(out) as img:
+        assert img.format == encoded
@@ -0,0 +1,120 @@
+"""CPU 通道按 weight 占用并发名额的调度（JobScheduler 的排队、名额上限和线程分配）。"""
+import os
+import time
+import threading
+
+import pytest
+
+from media_converter.common import cpu_threads
+from media_converter.scheduler import JobScheduler
+
+
+class Blocker:
+    """占住 CPU 通道名额的任务：开始时记录可用线程数，直到 release() 才结束。"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self._release = threading.Event()
+        self.threads = None
+
+    def __call__(self):
+        self.threads = cpu_threads()
+        self.started.set()
+        self._release.wait(10)
+
+    def release(self):
+        self._release.set()
+
+
+def _until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待调度超时"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = JobScheduler(cpu_workers=4)
+    yield scheduler
+    scheduler.shutdown(cancel_pending=True)
+
+
+def _submit(scheduler, weight=1):
+    blocker = Blocker()
+    return blocker, scheduler.submit(blocker, weight=weight)
+
+
+def test_weighted_job_waits_for_free_slots(scheduler):
+    light = [_submit(scheduler) for _ in range(3)]
+    _until(lambda: all(b.started.is_set() for b, _job in light))
+    heavy, heavy_job = _submit(scheduler, weight=2)
+    late, late_job = _submit(scheduler)
+    time.sleep(0.1)
+    # 只剩 1 个名额：两个名额的任务排队，后提交的轻任务也不能插队
+    assert heavy_job.state == 'queued' and late_job.state == 'queued'
+    assert scheduler.running('cpu') == 3
+    light[0][0].release()
+    assert heavy.started.wait(5)
+    assert heavy_job.slots == 2 and scheduler.running('cpu') == 4
+    assert late_job.state == 'queued'
+    for blocker, _job in light[1:]:
+        blocker.release()
+    assert late.started.wait(5)
+    for blocker in (heavy, late):
+        blocker.release()
+    scheduler.wait_idle()
+    assert scheduler.running('cpu') == 0
+
+
+def test_weight_is_capped_at_lane_limit(scheduler):
+    blocker, job = _submit(scheduler, weight=16)
+    assert blocker.started.wait(5)
+    assert job.slots == 4 and scheduler.running('cpu') == 4
+    blocker.release()
+    job.wait(5)
+    assert scheduler.running('cpu') == 0
+
+
+def test_cpu_share_follows_slots(scheduler, monkeypatch):
+    # 8 核、并发 4：每个名额 2 个线程
+    monkeypatch.setattr(os, 'cpu_count', lambda: 8)
+    jobs = [_submit(scheduler, weight=w) for w in (1, 3)]
+    for blocker, _job in jobs:
+        assert blocker.started.wait(5)
+    assert [b.threads for b, _job in jobs] == [2, 6]
+    for blocker, _job in jobs:
+        blocker.release()
+    scheduler.wait_idle()
+    assert cpu_threads() is None
+
+
+def test_set_limits_applies_to_queued_jobs(scheduler):
+    scheduler.set_limits(cpu_workers=1)
+    first, _ = _submit(scheduler)
+    assert first.started.wait(5)
+    queued = [_submit(scheduler) for _ in range(2)]
+    heavy, heavy_job = _submit(scheduler, weight=3)
+    time.sleep(0.1)
+    assert scheduler.pending('cpu') == 3
+    # 调高上限后排队中的任务立即开始，多名额的任务按新的上限计算名额
+    scheduler.set_limits(cpu_workers=6)
+    for blocker, _job in queued:
+        assert blocker.started.wait(5)
+    assert heavy.started.wait(5)
+    assert heavy_job.slots == 3 and scheduler.running('cpu') == 6
+    for blocker in (first, heavy, *(b for b, _job in queued)):
+        blocker.release()
+    scheduler.wait_idle()
+
+
+def test_lowered_limit_caps_queued_weight(scheduler):
+    first, _ = _submit(scheduler, weight=4)
+    assert first.started.wait(5)
+    heavy, heavy_job = _submit(scheduler, weight=4)
+    scheduler.set_limits(cpu_workers=2)
+    first.release()
+    assert heavy.started.wait(5)
+    assert heavy_job.slots == 2
+    heavy.release()
+    scheduler.wait_idle()